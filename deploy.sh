@@ -31,8 +31,11 @@ echo "🧹 Stopping and removing old container if it exists..."
 docker rm -f "$CONTAINER_NAME" 2>/dev/null || true
 
 echo "🚀 Starting new container: $CONTAINER_NAME on port $PORT"
+mkdir -p "$(pwd)/cache/$CONTAINER_NAME"
+
 docker run -d \
   --env-file "$ENV_FILE" \
+  -v "$(pwd)/cache/$CONTAINER_NAME:/app/cache" \
   -p "$PORT:$PORT" \
   --name "$CONTAINER_NAME" \
   "$IMAGE_NAME" \
@@ -0,0 +1,74 @@
+"""
+Backfills the integer month ordinal (date_ord = year*12 + month) for chunks that
+were loaded before the field existed, then builds its scalar index.
+
+The retrieval service filters the date window with a single
+`date_ord >= a and date_ord <= b` range on this field, so run this once against
+an existing collection before deploying that change:
+
+    python backfill_date_ord.py --collection <name>
+
+Safe to re-run: only rows whose date_ord is still null are touched.
+"""
+import argparse
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+from milvus_utils import (
+    DATE_ORD_FIELD,
+    date_to_ordinal,
+    ensure_date_ord_field,
+    ensure_scalar_index,
+    get_milvus_client,
+)
+
+
+def backfill_date_ord(milvus_client, collection_name: str, batch_size: int = 1000) -> dict:
+    ensure_date_ord_field(milvus_client, collection_name)
+
+    iterator = milvus_client.query_iterator(
+        collection_name=collection_name,
+        batch_size=batch_size,
+        filter=f"{DATE_ORD_FIELD} is null",
+        output_fields=["id", "date"],
+    )
+    updated = unparseable = 0
+    while True:
+        batch = iterator.next()
+        if not batch:
+            iterator.close()
+            break
+        rows = []
+        for row in batch:
+            ordinal = date_to_ordinal(row.get("date"))
+            if ordinal is None:
+                unparseable += 1
+                continue
+            rows.append({"id": row["id"], DATE_ORD_FIELD: ordinal})
+        if rows:
+            # partial_update only rewrites date_ord; vectors and text stay untouched
+            milvus_client.upsert(collection_name=collection_name, data=rows, partial_update=True)
+            updated += len(rows)
+        logging.info(f"Backfilled {updated} chunks so far ({unparseable} with unparseable dates)")
+
+    ensure_scalar_index(milvus_client, collection_name, DATE_ORD_FIELD)
+    return {"updated": updated, "unparseable": unparseable}
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default=os.getenv("CPI_V5_COLLECTION_NAME"))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = get_milvus_client(uri=os.getenv("MILVUS_ENDPOINT"), token=os.getenv("MILVUS_TOKEN"))
+    start = time.time()
+    result = backfill_date_ord(client, args.collection, args.batch_size)
+    print(f"Backfilled {result['updated']} chunks in {time.time() - start:.1f}s, "
+          f"{result['unparseable']} left null because their date could not be parsed")
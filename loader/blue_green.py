@@ -0,0 +1,215 @@
+"""
+Zero-downtime rebuilds: the retrieval service searches an alias (the name in its
+CPI_V5_COLLECTION_NAME), and each rebuild goes into a fresh versioned collection
+<alias>_vYYYYMMDDHHMMSS that the alias is only repointed to once it is loaded,
+fully indexed and answering probe searches.
+
+    python blue_green.py rebuild documents.jsonl [--alias NAME] [--keep 3]
+    python blue_green.py rollback [--alias NAME]
+    python blue_green.py promote <collection> [--alias NAME]
+    python blue_green.py status [--alias NAME]
+
+rebuild keeps the newest --keep versions (never fewer than the live one and the
+one before it, so rollback always has a target) and drops older ones. The alias
+name must not also be a collection: rename a legacy collection before the first
+rebuild.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from ingest import ENCODE_BATCH_SIZE, get_encoder, notify_retrieval, read_documents, run_ingestion
+from manifest import Manifest
+from milvus_utils import (
+    COMPRESSED_FIELDS,
+    EMBEDDING_DIM,
+    collection_compression,
+    compress_vectors,
+    create_collection,
+    get_milvus_client,
+    resolve_collection,
+)
+from parsing import PARSE_WORKERS
+
+KEEP_VERSIONS = int(os.getenv("BLUE_GREEN_KEEP_VERSIONS", 3))
+INDEX_TIMEOUT_SECONDS = float(os.getenv("BLUE_GREEN_INDEX_TIMEOUT_SECONDS", 3600))
+PROBE_QUERIES = [
+    "What was the CPI inflation rate in the latest month?",
+    "Consumer food price index year on year change",
+    "RBI repo rate decision in the monetary policy statement",
+    "GDP growth estimate for the last quarter",
+    "Wholesale price index fuel and power inflation",
+]
+
+
+def version_prefix(alias: str) -> str:
+    return f"{alias}_v"
+
+
+def list_versions(milvus_client, alias: str):
+    """Versioned collections of the alias, oldest first (the timestamp suffix sorts)."""
+    prefix = version_prefix(alias)
+    return sorted(name for name in milvus_client.list_collections() if name.startswith(prefix))
+
+
+def current_version(milvus_client, alias: str):
+    target = resolve_collection(milvus_client, alias)
+    return None if target == alias else target
+
+
+def wait_for_index(milvus_client, collection_name: str, timeout: float = INDEX_TIMEOUT_SECONDS):
+    milvus_client.flush(collection_name)
+    deadline = time.monotonic() + timeout
+    for index_name in milvus_client.list_indexes(collection_name):
+        while True:
+            description = milvus_client.describe_index(collection_name, index_name)
+            if not description.get("pending_index_rows"):
+                break
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Index {index_name} of {collection_name} still has "
+                                   f"{description['pending_index_rows']} rows pending")
+            time.sleep(5)
+
+
+def warm(milvus_client, collection_name: str, probes=PROBE_QUERIES, rounds: int = 3) -> dict:
+    """
+    Runs the probe questions through the same grouped search the retrieval service
+    does, so segments and index files are loaded before traffic arrives. Fails if
+    a probe comes back empty. On a compressed collection the probes go to the
+    compressed index and read back the memory-mapped float vectors, as rescoring does.
+    """
+    milvus_client.load_collection(collection_name)
+    encoded = get_encoder().encode(probes, batch_size=ENCODE_BATCH_SIZE)
+    compression = collection_compression(milvus_client, collection_name)
+    if compression == "none":
+        vectors = [vector.tolist() for vector in encoded]
+        search = {"anns_field": "vector", "search_params": {"metric_type": "COSINE"},
+                  "output_fields": ["reference", "date"]}
+    else:
+        vectors = compress_vectors(encoded, compression)
+        search = {"anns_field": COMPRESSED_FIELDS[compression],
+                  "search_params": {"metric_type": "COSINE" if compression == "int8" else "HAMMING"},
+                  "output_fields": ["reference", "date", "vector"]}
+    latencies = []
+    for _ in range(rounds):
+        for probe, vector in zip(probes, vectors):
+            start = time.perf_counter()
+            results = milvus_client.search(
+                collection_name=collection_name,
+                data=[vector],
+                limit=50,
+                group_by_field="reference",
+                group_size=4,
+                strict_group_size=False,
+                **search,
+            )
+            latencies.append(time.perf_counter() - start)
+            if not results or not results[0]:
+                raise RuntimeError(f"Probe search returned nothing on {collection_name}: {probe!r}")
+    latencies.sort()
+    return {"probes": len(latencies), "p50_seconds": latencies[len(latencies) // 2], "max_seconds": latencies[-1]}
+
+
+def promote(milvus_client, alias: str, collection_name: str):
+    """Atomically repoints the alias (creating it the first time)."""
+    if milvus_client.has_collection(alias) and current_version(milvus_client, alias) is None:
+        raise RuntimeError(f"{alias} is a collection, not an alias; rename it before switching to versioned rebuilds")
+    previous = current_version(milvus_client, alias)
+    if previous is None:
+        milvus_client.create_alias(collection_name=collection_name, alias=alias)
+    else:
+        milvus_client.alter_alias(collection_name=collection_name, alias=alias)
+    logging.info(f"Alias {alias}: {previous} -> {collection_name}")
+    # The whole corpus may have changed, so drop every cached response
+    notify_retrieval()
+    return previous
+
+
+def rollback(milvus_client, alias: str):
+    """Points the alias back at the version before the live one."""
+    versions = list_versions(milvus_client, alias)
+    live = current_version(milvus_client, alias)
+    older = [name for name in versions if name < live] if live else []
+    if not older:
+        raise RuntimeError(f"No version older than {live} to roll back to")
+    promote(milvus_client, alias, older[-1])
+    return older[-1]
+
+
+def _drop_version(milvus_client, collection_name: str):
+    milvus_client.drop_collection(collection_name)
+    manifest_path = Manifest.for_collection(collection_name).path
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+
+def prune_versions(milvus_client, alias: str, keep: int = KEEP_VERSIONS):
+    """Drops versions beyond the newest keep, never the live one or the one before it."""
+    versions = list_versions(milvus_client, alias)
+    live = current_version(milvus_client, alias)
+    protected = set(versions[-max(1, keep):])
+    if live in versions:
+        live_index = versions.index(live)
+        protected.update(versions[max(0, live_index - 1):live_index + 1])
+    dropped = []
+    for name in versions:
+        if name not in protected:
+            _drop_version(milvus_client, name)
+            dropped.append(name)
+    if dropped:
+        logging.info(f"Dropped old versions of {alias}: {dropped}")
+    return dropped
+
+
+def rebuild(milvus_client, alias: str, documents_path: str, keep: int = KEEP_VERSIONS,
+            workers: int = PARSE_WORKERS) -> dict:
+    """
+    Builds, indexes and warms a new version from documents_path, then swaps the
+    alias to it. Any failure before the swap leaves the live version untouched
+    (the half-built collection is dropped).
+    """
+    collection_name = f"{version_prefix(alias)}{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    create_collection(milvus_client, collection_name, EMBEDDING_DIM, drop_old=False)
+    try:
+        ingestion = run_ingestion(read_documents(documents_path), milvus_client, collection_name,
+                                  workers=workers, manifest=Manifest.for_collection(collection_name))
+        wait_for_index(milvus_client, collection_name)
+        warmup = warm(milvus_client, collection_name)
+    except BaseException:
+        logging.exception(f"Rebuild into {collection_name} failed; {alias} was not changed")
+        _drop_version(milvus_client, collection_name)
+        raise
+    previous = promote(milvus_client, alias, collection_name)
+    dropped = prune_versions(milvus_client, alias, keep)
+    return {"collection": collection_name, "previous": previous, "dropped": dropped,
+            "ingestion": ingestion, "warmup": warmup}
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["rebuild", "rollback", "promote", "status"])
+    parser.add_argument("target", nargs="?", help="documents JSONL for rebuild, collection for promote")
+    parser.add_argument("--alias", default=os.getenv("CPI_V5_COLLECTION_NAME"))
+    parser.add_argument("--keep", type=int, default=KEEP_VERSIONS)
+    parser.add_argument("--workers", type=int, default=PARSE_WORKERS, help="Parse/chunk processes")
+    args = parser.parse_args()
+
+    client = get_milvus_client(uri=os.getenv("MILVUS_ENDPOINT"), token=os.getenv("MILVUS_TOKEN"))
+    if args.command == "rebuild":
+        result = rebuild(client, args.alias, args.target, args.keep, args.workers)
+    elif args.command == "rollback":
+        result = {"live": rollback(client, args.alias)}
+    elif args.command == "promote":
+        promote(client, args.alias, args.target)
+        result = {"live": args.target}
+    else:
+        result = {"live": current_version(client, args.alias), "versions": list_versions(client, args.alias)}
+    print(json.dumps(result, indent=2, default=str))
@@ -0,0 +1,403 @@
+"""
+Bulk ingestion: documents -> chunks -> batched all-mpnet-base-v2 encode -> batched Milvus insert.
+
+Each stage runs on its own thread and hands work to the next through a bounded
+queue, so a slow encoder or a slow Milvus applies backpressure instead of
+buffering the whole corpus in memory.
+
+Input documents are dicts (one JSON object per line for the CLI):
+
+    {"source": "cpi_may_2025.pdf", "reference": "CPI Press Release May 2025",
+     "date": "May 2025", "pages": ["page 1 text", "page 2 text", ...]}
+
+"text" may be given instead of "pages" for single-page documents, or "path" to
+a PDF/text file, which is then parsed in the loader (see parsing.py).
+
+Runs are incremental: a per-collection manifest (see manifest.py) remembers each
+source's fingerprint and chunk hashes, so unchanged documents are skipped before
+parsing, only new or changed chunks are embedded and inserted, stale chunks of
+changed documents are deleted and, with --prune, so are sources that disappeared
+from the input.
+
+    python ingest.py documents.jsonl [--collection NAME] [--create] [--workers N] [--prune]
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from functools import lru_cache
+
+from manifest import Manifest, document_fingerprint, document_source
+from milvus_utils import (
+    COMPRESSED_FIELDS,
+    DATE_ORD_FIELD,
+    EMBEDDING_DIM,
+    collection_compression,
+    compress_vectors,
+    create_collection,
+    ensure_partitions,
+    get_milvus_client,
+    partition_name,
+    resolve_collection,
+)
+from parsing import CHUNK_OVERLAP_WORDS, CHUNK_WORDS, PARSE_WORKERS, ParallelChunker, chunk_document, iter_chunked
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+
+ENCODE_BATCH_SIZE = int(os.getenv("INGEST_ENCODE_BATCH_SIZE", 64))
+INSERT_BATCH_SIZE = int(os.getenv("INGEST_INSERT_BATCH_SIZE", 512))
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 8))  # batches buffered between stages
+
+_DONE = object()
+
+
+@lru_cache(maxsize=None)
+def get_encoder():
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+
+
+def read_documents(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class IngestStats:
+    def __init__(self):
+        self.parsed = 0  # only counted by the chunk stage
+        self.failed = 0
+        self.unchanged = 0
+        self.chunks = 0
+        self.skipped_chunks = 0
+        self.inserted = 0
+        self.deleted = 0
+        self.removed_sources = 0
+        self.encoder_calls = 0
+        self.encode_seconds = 0.0
+        self.insert_seconds = 0.0
+        self.start = time.perf_counter()
+        self.end = None
+        self.months = set()
+
+    @property
+    def documents(self) -> int:
+        return self.parsed + self.unchanged
+
+    def as_dict(self) -> dict:
+        elapsed = (self.end or time.perf_counter()) - self.start
+        return {
+            "documents": self.documents,
+            "failed": self.failed,
+            "unchanged": self.unchanged,
+            "chunks": self.chunks,
+            "skipped_chunks": self.skipped_chunks,
+            "inserted": self.inserted,
+            "deleted": self.deleted,
+            "removed_sources": self.removed_sources,
+            "encoder_calls": self.encoder_calls,
+            "seconds": elapsed,
+            "docs_per_sec": self.documents / elapsed if elapsed else 0.0,
+            "chunks_per_sec": self.inserted / elapsed if elapsed else 0.0,
+            "encode_seconds": self.encode_seconds,
+            "insert_seconds": self.insert_seconds,
+            "months": sorted(self.months),
+        }
+
+
+def _put(q: queue.Queue, item, stop: threading.Event):
+    # Blocks while the queue is full (backpressure) but gives up once another stage failed
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _string_list(values) -> str:
+    # JSON string literals are valid Milvus filter string literals
+    return json.dumps(sorted(values))
+
+
+def run_ingestion(documents, milvus_client, collection_name: str, encoder=None,
+                  encode_batch_size: int = ENCODE_BATCH_SIZE, insert_batch_size: int = INSERT_BATCH_SIZE,
+                  queue_size: int = QUEUE_SIZE, chunker=chunk_document, workers: int = 1,
+                  manifest: Manifest = None, prune_missing: bool = False) -> dict:
+    """
+    Streams documents through chunking, encoding and insertion and returns
+    throughput figures. With workers > 1 parsing and chunking run in a process
+    pool. Documents that fail to parse are logged and skipped; any other failure
+    stops all stages and is re-raised.
+
+    With a manifest the run is incremental and idempotent: unchanged sources are
+    skipped, chunks whose content_hash is already loaded are not re-embedded, and
+    rows of a changed source that are not part of its new chunk set are deleted
+    once all its new chunks are inserted, so searches keep finding the document
+    meanwhile (this also clears leftovers of an interrupted run). prune_missing deletes manifest sources absent from documents, so only
+    set it when documents is the whole corpus. The manifest is saved on success.
+    """
+    stats = IngestStats()
+    stop = threading.Event()
+    errors = []
+    to_encode = queue.Queue(maxsize=queue_size)
+    to_insert = queue.Queue(maxsize=queue_size)
+    salt = f"{CHUNK_WORDS}/{CHUNK_OVERLAP_WORDS}"
+    seen_sources = set()
+    fingerprints = {}
+    updates = {}
+    stale_lock = threading.Lock()
+    stale_rows = {}  # source -> [new chunks not inserted yet, ids of the rows they replace]
+    compression = collection_compression(milvus_client, collection_name)
+
+    def changed_documents():
+        for document in documents:
+            source = document_source(document)
+            seen_sources.add(source)
+            if manifest is None:
+                yield document
+                continue
+            try:
+                fingerprint = document_fingerprint(document, salt)
+            except OSError:
+                fingerprint = None  # Unreadable; let parsing report it
+            if fingerprint is not None and manifest.is_unchanged(source, fingerprint):
+                stats.unchanged += 1
+                continue
+            fingerprints[source] = fingerprint
+            yield document
+
+    def drop_stale_chunks(source, chunks):
+        # Keeps the rows already holding one of the new chunks; the rest of the source is
+        # deleted by retire_stale_rows once the new chunks are inserted
+        hashes = {chunk["content_hash"] for chunk in chunks}
+        kept = manifest.chunk_hashes(source) & hashes
+        rows = milvus_client.query(collection_name=collection_name, filter=f"source == {json.dumps(source)}",
+                                   output_fields=["content_hash"])
+        stale, seen = [], set()
+        for row in rows:
+            if row.get("content_hash") in kept and row["content_hash"] not in seen:
+                seen.add(row["content_hash"])
+            else:
+                stale.append(row["id"])
+        updates[source] = (fingerprints[source], hashes, chunks[0]["date"] if chunks else "")
+        new_chunks = {}
+        for chunk in chunks:
+            if chunk["content_hash"] not in kept:
+                new_chunks.setdefault(chunk["content_hash"], chunk)
+        stats.skipped_chunks += len(chunks) - len(new_chunks)
+        with stale_lock:
+            stale_rows[source] = [len(new_chunks), stale]
+        return list(new_chunks.values())
+
+    def chunk_stage():
+        try:
+            batch = []
+            if workers > 1:
+                chunked = ParallelChunker(workers, chunker=chunker).imap(changed_documents())
+            else:
+                chunked = iter_chunked(changed_documents(), chunker)
+            for document, chunks, error in chunked:
+                stats.parsed += 1
+                if error is not None:
+                    stats.failed += 1
+                    logging.error(f"Skipping {document.get('path') or document.get('source')}: {error!r}")
+                    continue
+                if chunks and chunks[0]["date"]:
+                    stats.months.add(chunks[0]["date"])
+                if manifest is not None:
+                    chunks = drop_stale_chunks(document_source(document), chunks)
+                for chunk in chunks:
+                    batch.append(chunk)
+                    if len(batch) >= encode_batch_size:
+                        if not _put(to_encode, batch, stop):
+                            return
+                        batch = []
+            if batch:
+                _put(to_encode, batch, stop)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(to_encode, _DONE, stop)
+
+    def encode_stage():
+        model = encoder
+        try:
+            while True:
+                batch = _get(to_encode, stop)
+                if batch is _DONE:
+                    break
+                # Loaded on first use, so a run with nothing new never loads the model
+                model = model or get_encoder()
+                start = time.perf_counter()
+                stats.encoder_calls += 1
+                vectors = model.encode([chunk["content"] for chunk in batch], batch_size=encode_batch_size)
+                stats.encode_seconds += time.perf_counter() - start
+                for chunk, vector in zip(batch, vectors):
+                    chunk["vector"] = vector.tolist()
+                if compression != "none":
+                    for chunk, compressed in zip(batch, compress_vectors(vectors, compression)):
+                        chunk[COMPRESSED_FIELDS[compression]] = compressed
+                stats.chunks += len(batch)
+                if not _put(to_insert, batch, stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(to_insert, _DONE, stop)
+
+    threads = [threading.Thread(target=chunk_stage, name="ingest-chunk", daemon=True),
+               threading.Thread(target=encode_stage, name="ingest-encode", daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    # Insert stage runs on the calling thread
+    pending = []
+    known_partitions = set()
+
+    def retire_stale_rows():
+        # Deletes the replaced rows of every source whose new chunks are all inserted
+        with stale_lock:
+            for chunk in pending:
+                if chunk["source"] in stale_rows:
+                    stale_rows[chunk["source"]][0] -= 1
+            done = [source for source, (remaining, _) in stale_rows.items() if remaining <= 0]
+            ids = [row_id for source in done for row_id in stale_rows.pop(source)[1]]
+        if ids:
+            milvus_client.delete(collection_name=collection_name, ids=ids)
+            stats.deleted += len(ids)
+
+    def flush():
+        start = time.perf_counter()
+        by_partition = {}
+        for chunk in pending:
+            by_partition.setdefault(partition_name(chunk[DATE_ORD_FIELD]), []).append(chunk)
+        ensure_partitions(milvus_client, collection_name, by_partition, known_partitions)
+        for name, rows in by_partition.items():
+            milvus_client.insert(collection_name=collection_name, data=rows, partition_name=name)
+        stats.insert_seconds += time.perf_counter() - start
+        stats.inserted += len(pending)
+        logging.info(f"Inserted {stats.inserted} chunks from {stats.documents} documents")
+        retire_stale_rows()
+        pending.clear()
+
+    try:
+        while True:
+            batch = _get(to_insert, stop)
+            if batch is _DONE:
+                break
+            pending.extend(batch)
+            if len(pending) >= insert_batch_size:
+                flush()
+        if pending and not errors:
+            flush()
+        if not errors:
+            retire_stale_rows()  # Sources whose chunks were all kept
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+
+    for thread in threads:
+        thread.join()
+    if errors:
+        stats.end = time.perf_counter()
+        raise errors[0]
+
+    if manifest is not None:
+        for source, (fingerprint, hashes, date) in updates.items():
+            if fingerprint is not None:
+                manifest.record(source, fingerprint, hashes, date)
+        missing = set(manifest.entries) - seen_sources
+        if prune_missing and missing:
+            milvus_client.delete(collection_name=collection_name, filter=f"source in {_string_list(missing)}")
+            for source in missing:
+                stats.deleted += len(manifest.chunk_hashes(source))
+                if manifest.date(source):
+                    stats.months.add(manifest.date(source))
+                manifest.forget(source)
+            stats.removed_sources = len(missing)
+            logging.info(f"Removed {len(missing)} sources no longer in the corpus")
+        manifest.save()
+    stats.end = time.perf_counter()
+
+    result = stats.as_dict()
+    logging.info(f"Ingestion finished: {result['documents']} docs ({result['unchanged']} unchanged, {result['failed']} failed), "
+                 f"{result['inserted']} chunks inserted, {result['deleted']} deleted in {result['seconds']:.1f}s "
+                 f"({result['docs_per_sec']:.2f} docs/s, {result['chunks_per_sec']:.1f} chunks/s)")
+    return result
+
+
+def ensure_collection(milvus_client, collection_name: str, create: bool = False, manifest: Manifest = None):
+    if create or not milvus_client.has_collection(collection_name):
+        create_collection(milvus_client, collection_name, EMBEDDING_DIM, drop_old=create)
+        if manifest is not None:
+            # A new collection holds none of what the manifest remembers
+            manifest.clear()
+
+
+def notify_retrieval(months=None):
+    """
+    Asks the retrieval service to drop cached responses for the ingested months,
+    or everything when months is None (e.g. after an alias swap).
+    """
+    url = os.getenv("RETRIEVAL_CACHE_INVALIDATE_URL")
+    if not url or (months is not None and not months):
+        return
+    request = urllib.request.Request(
+        url,
+        data=json.dumps({"months": sorted(months or [])}).encode("utf-8"),
+        headers={"Content-Type": "application/json", "access_token": os.getenv("ACQ_API_KEY", "")},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            logging.info(f"Retrieval cache invalidation: {response.read().decode('utf-8')}")
+    except Exception as e:
+        logging.warning(f"Could not invalidate the retrieval cache at {url}: {e}")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("documents", help="JSONL file, one document per line")
+    parser.add_argument("--collection", default=os.getenv("CPI_V5_COLLECTION_NAME"),
+                        help="Collection, or alias of the collection, to load into")
+    parser.add_argument("--create", action="store_true", help="Drop and recreate the collection first")
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    parser.add_argument("--insert-batch-size", type=int, default=INSERT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=PARSE_WORKERS, help="Parse/chunk processes")
+    parser.add_argument("--prune", action="store_true", help="Delete sources that are no longer in the input")
+    args = parser.parse_args()
+
+    client = get_milvus_client(uri=os.getenv("MILVUS_ENDPOINT"), token=os.getenv("MILVUS_TOKEN"))
+    # Manifests belong to the concrete collection, not to an alias that may be repointed
+    collection_name = resolve_collection(client, args.collection)
+    manifest = Manifest.for_collection(collection_name)
+    ensure_collection(client, collection_name, args.create, manifest)
+    result = run_ingestion(read_documents(args.documents), client, collection_name,
+                           encode_batch_size=args.encode_batch_size, insert_batch_size=args.insert_batch_size,
+                           workers=args.workers, manifest=manifest, prune_missing=args.prune)
+    notify_retrieval(result["months"])
+    print(json.dumps(result, indent=2))
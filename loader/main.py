@@ -1,8 +1,29 @@
 # main.py
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security.api_key import APIKeyHeader
+from pydantic import BaseModel
+from typing import List, Optional
+from dotenv import load_dotenv
 import uvicorn
+import logging
 import os
+import threading
+
+load_dotenv()
+
+from ingest import ensure_collection, notify_retrieval, run_ingestion
+from manifest import Manifest
+from milvus_utils import get_milvus_client, resolve_collection
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+API_KEY_NAME = "access_token"
+api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=True)
+
+# Ingestion runs one at a time so they never race on a collection's manifest
+ingest_lock = threading.Lock()
 
 # Initialize the FastAPI application
 app = FastAPI(
@@ -11,6 +32,24 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# API Key verification dependency
+async def verify_api_key(api_key: str = Depends(api_key_header)):
+    if api_key != os.getenv("ACQ_API_KEY"):
+        logging.warning(f"Unauthorized API access attempt with key: {api_key[:4]}****")
+        raise HTTPException(status_code=403, detail="Invalid API Key")
+    return api_key
+
+class Document(BaseModel):
+    source: str
+    reference: Optional[str] = None
+    date: str
+    pages: Optional[List[str]] = None
+    text: Optional[str] = None
+
+class IngestRequest(BaseModel):
+    documents: List[Document]
+    collection: Optional[str] = None
+
 @app.get("/", summary="Root endpoint", response_description="A welcome message")
 async def read_root():
     """
@@ -40,4 +79,29 @@ async def get_info():
         "app_version": app.version,
         "environment_variable_example": example_env_var,
         "message": "This is a test endpoint to show environment variable access."
-    }
\ No newline at end of file
+    }
+
+@app.post("/ingest", summary="Ingest documents", dependencies=[Depends(verify_api_key)])
+async def ingest(request: IngestRequest):
+    """
+    Chunks, encodes and inserts the documents into the collection (created if
+    missing), then asks the retrieval service to drop cached responses for the
+    ingested months. Unchanged documents are skipped and changed ones replace
+    their previous chunks. Returns the throughput figures of the run.
+    """
+    collection_name = request.collection or os.getenv("CPI_V5_COLLECTION_NAME")
+    if not collection_name:
+        raise HTTPException(status_code=400, detail="No collection given and CPI_V5_COLLECTION_NAME is not set")
+    documents = [document.dict(exclude_none=True) for document in request.documents]
+
+    def run():
+        client = get_milvus_client(uri=os.getenv("MILVUS_ENDPOINT"), token=os.getenv("MILVUS_TOKEN"))
+        with ingest_lock:
+            target = resolve_collection(client, collection_name)
+            manifest = Manifest.for_collection(target)
+            ensure_collection(client, target, manifest=manifest)
+            result = run_ingestion(documents, client, target, manifest=manifest)
+        notify_retrieval(result["months"])
+        return result
+
+    return await run_in_threadpool(run)
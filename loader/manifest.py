@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+
+# Local record of what is already in a collection, so re-runs of the loader only
+# embed and insert what changed. One JSON file per collection:
+#
+#     {"<source>": {"fingerprint": "<sha256 of the document>", "date": "May 2025",
+#                   "chunks": ["<content_hash>", ...]}}
+#
+# The chunk hashes are the content_hash values stored on the rows themselves.
+
+MANIFEST_DIR = os.getenv("INGEST_MANIFEST_DIR", "cache/manifests")
+
+
+def document_source(document: dict) -> str:
+    return document.get("source") or os.path.basename(document["path"])
+
+
+def document_fingerprint(document: dict, salt: str = "") -> str:
+    """
+    sha256 over the document's metadata and text (or file bytes for "path"
+    documents). salt carries settings that change the chunks, e.g. chunk size.
+    """
+    digest = hashlib.sha256(json.dumps([salt, document], sort_keys=True, default=str).encode("utf-8"))
+    if "path" in document:
+        with open(document["path"], "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    @classmethod
+    def for_collection(cls, collection_name: str, directory: str = MANIFEST_DIR):
+        return cls(os.path.join(directory, f"{collection_name}.json"))
+
+    def is_unchanged(self, source: str, fingerprint: str) -> bool:
+        entry = self.entries.get(source)
+        return entry is not None and entry["fingerprint"] == fingerprint
+
+    def chunk_hashes(self, source: str) -> set:
+        entry = self.entries.get(source)
+        return set(entry["chunks"]) if entry else set()
+
+    def date(self, source: str) -> str:
+        return self.entries.get(source, {}).get("date", "")
+
+    def record(self, source: str, fingerprint: str, chunk_hashes, date: str = ""):
+        self.entries[source] = {"fingerprint": fingerprint, "date": date, "chunks": sorted(set(chunk_hashes))}
+
+    def forget(self, source: str):
+        self.entries.pop(source, None)
+
+    def clear(self):
+        self.entries = {}
+
+    def save(self):
+        # Write-then-rename so an interrupted run never leaves a truncated manifest
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
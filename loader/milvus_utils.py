@@ -0,0 +1,180 @@
+import os
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+from pymilvus import MilvusClient, DataType, MilvusException
+
+# Loader-side Milvus helpers. The loader image is built from ./loader only. This
+# module owns the collection layout (schema and indexes); the retrieval service only
+# searches the collections it creates.
+
+DATE_ORD_FIELD = "date_ord"
+EMBEDDING_DIM = 768  # all-mpnet-base-v2
+
+# Chunks are laid out in one partition per month of their date (m_YYYYMM) so
+# date-window searches only touch the months they cover. Undated chunks and rows
+# of collections loaded before partitioning live in _default.
+PARTITION_PREFIX = "m_"
+DEFAULT_PARTITION = "_default"
+
+# VECTOR_COMPRESSION=int8 or binary adds a compressed copy of each embedding that
+# carries the ANN index; the float vector field is then memory-mapped and only
+# read back by the retrieval service to rescore candidates. Applies to collections
+# created from now on; ingestion follows whatever schema the target collection has.
+VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none")
+COMPRESSED_FIELDS = {"int8": "vector_int8", "binary": "vector_bin"}
+BIN_IVF_NLIST = 1024
+
+
+@lru_cache(maxsize=None)
+def get_milvus_client(uri: str, token: str = None) -> MilvusClient:
+    client = MilvusClient(uri=uri, token=token)
+    client.using_database("tata_db")  # Switch to tata_db
+    return client
+
+
+def build_schema(dim: int, compression: str = VECTOR_COMPRESSION):
+    """
+    Chunk schema read by get_search_results. Fields are declared explicitly so
+    reference can be grouped on and date_ord can carry a scalar index; the dynamic
+    field stays enabled for collections loaded with the old quick-setup layout.
+    """
+    schema = MilvusClient.create_schema(auto_id=True, enable_dynamic_field=True)
+    schema.add_field("id", DataType.INT64, is_primary=True)
+    if compression == "none":
+        schema.add_field("vector", DataType.FLOAT_VECTOR, dim=dim)
+    else:
+        schema.add_field("vector", DataType.FLOAT_VECTOR, dim=dim, mmap_enabled=True)
+    if compression == "int8":
+        schema.add_field(COMPRESSED_FIELDS["int8"], DataType.INT8_VECTOR, dim=dim)
+    elif compression == "binary":
+        schema.add_field(COMPRESSED_FIELDS["binary"], DataType.BINARY_VECTOR, dim=dim)
+    schema.add_field("source", DataType.VARCHAR, max_length=1024)
+    schema.add_field("page", DataType.INT64)
+    schema.add_field("content", DataType.VARCHAR, max_length=65535)
+    schema.add_field("reference", DataType.VARCHAR, max_length=1024)
+    schema.add_field("date", DataType.VARCHAR, max_length=32)
+    schema.add_field(DATE_ORD_FIELD, DataType.INT64, nullable=True)
+    schema.add_field("content_hash", DataType.VARCHAR, max_length=64, nullable=True)
+    return schema
+
+
+def build_index_params(milvus_client: MilvusClient, compression: str = VECTOR_COMPRESSION):
+    index_params = milvus_client.prepare_index_params()
+    if compression == "none":
+        index_params.add_index(field_name="vector", index_type="HNSW", metric_type="COSINE",
+                               params={"M": 16, "efConstruction": 200})
+    else:
+        index_params.add_index(field_name="vector", index_type="FLAT", metric_type="COSINE")
+    if compression == "int8":
+        index_params.add_index(field_name=COMPRESSED_FIELDS["int8"], index_type="HNSW", metric_type="COSINE",
+                               params={"M": 16, "efConstruction": 200})
+    elif compression == "binary":
+        index_params.add_index(field_name=COMPRESSED_FIELDS["binary"], index_type="BIN_IVF_FLAT",
+                               metric_type="HAMMING", params={"nlist": BIN_IVF_NLIST})
+    index_params.add_index(field_name=DATE_ORD_FIELD, index_type="STL_SORT", index_name=DATE_ORD_FIELD)
+    return index_params
+
+
+def create_collection(
+    milvus_client: MilvusClient, collection_name: str, dim: int = EMBEDDING_DIM, drop_old: bool = True,
+    compression: str = VECTOR_COMPRESSION,
+):
+    if milvus_client.has_collection(collection_name) and drop_old:
+        milvus_client.drop_collection(collection_name)
+    if milvus_client.has_collection(collection_name):
+        raise RuntimeError(
+            f"Collection {collection_name} already exists. Set drop_old=True to create a new one instead."
+        )
+    return milvus_client.create_collection(
+        collection_name=collection_name,
+        schema=build_schema(dim, compression),
+        index_params=build_index_params(milvus_client, compression),
+        consistency_level="Strong",
+    )
+
+
+def resolve_collection(milvus_client: MilvusClient, name: str) -> str:
+    """Collection an alias points to; name itself when it is not an alias."""
+    try:
+        return milvus_client.describe_alias(name)["collection_name"]
+    except MilvusException:
+        return name
+
+
+def date_to_ordinal(date_str):
+    """Integer month ordinal (year*12+month) of a 'Month YYYY' date; None if unparseable."""
+    try:
+        date_obj = datetime.strptime(date_str.strip(), "%B %Y")
+    except (ValueError, AttributeError):
+        return None
+    return date_obj.year * 12 + date_obj.month
+
+
+def partition_name(date_ord) -> str:
+    if date_ord is None:
+        return DEFAULT_PARTITION
+    year, month = divmod(date_ord - 1, 12)
+    return f"{PARTITION_PREFIX}{year:04d}{month + 1:02d}"
+
+
+def ensure_partitions(milvus_client: MilvusClient, collection_name: str, partition_names, known: set = None):
+    """Creates (and loads) the missing month partitions. known caches names seen before."""
+    known = known if known is not None else set()
+    missing = [name for name in partition_names if name not in known]
+    if missing:
+        known.update(milvus_client.list_partitions(collection_name))
+        missing = [name for name in missing if name not in known]
+    for name in missing:
+        milvus_client.create_partition(collection_name, name)
+        known.add(name)
+    if missing:
+        milvus_client.load_partitions(collection_name, missing)
+    return known
+
+
+def has_field(milvus_client: MilvusClient, collection_name: str, field_name: str) -> bool:
+    description = milvus_client.describe_collection(collection_name)
+    return any(field["name"] == field_name for field in description["fields"])
+
+
+def collection_compression(milvus_client: MilvusClient, collection_name: str) -> str:
+    """Which compressed vector field, if any, the collection was created with."""
+    description = milvus_client.describe_collection(collection_name)
+    names = {field["name"] for field in description["fields"]}
+    return next((compression for compression, field in COMPRESSED_FIELDS.items() if field in names), "none")
+
+
+def compress_vectors(vectors, compression: str) -> list:
+    """
+    Values for the compressed vector field: int8 scales each vector by its largest
+    component (cosine ignores the scale), binary packs the sign bits 8 per byte.
+    retrieval's compress_vectors encodes the queries the same way.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if compression == "int8":
+        scale = 127.0 / np.maximum(np.abs(vectors).max(axis=1, keepdims=True), 1e-12)
+        return list(np.rint(vectors * scale).astype(np.int8))
+    if compression == "binary":
+        return [row.tobytes() for row in np.packbits(vectors > 0, axis=1)]
+    raise ValueError(f"Unknown vector compression {compression!r}")
+
+
+def ensure_date_ord_field(milvus_client: MilvusClient, collection_name: str):
+    """Adds date_ord as a nullable INT64 schema field so it can carry a scalar index."""
+    if not has_field(milvus_client, collection_name, DATE_ORD_FIELD):
+        milvus_client.add_collection_field(
+            collection_name=collection_name,
+            field_name=DATE_ORD_FIELD,
+            data_type=DataType.INT64,
+            nullable=True,
+        )
+
+
+def ensure_scalar_index(milvus_client: MilvusClient, collection_name: str, field_name: str, index_type: str = "STL_SORT"):
+    if field_name in milvus_client.list_indexes(collection_name, field_name=field_name):
+        return
+    index_params = milvus_client.prepare_index_params()
+    index_params.add_index(field_name=field_name, index_type=index_type, index_name=field_name)
+    milvus_client.create_index(collection_name, index_params)
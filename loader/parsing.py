@@ -0,0 +1,232 @@
+"""
+Document parsing and chunking, serially or fanned out across a process pool.
+
+A document either carries its text ("pages" or "text") or points at a file
+("path": a PDF, or a text file whose pages are separated by form feeds). Parsing
+PDFs is CPU-bound, so ParallelChunker runs parse + chunk in worker processes and
+streams the chunks back in document order. Each worker is recycled after
+max_tasks_per_child documents and can optionally be given a memory cap
+(INGEST_PARSE_WORKER_MAX_MEMORY_MB); a document that crashes its worker (or runs
+it out of memory) is reported as failed without failing the batch.
+
+    python parsing.py bench [DIR_OF_PDFS] [--workers 1,2,4,8]
+"""
+import hashlib
+import json
+import logging
+import os
+import resource
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from manifest import document_source
+from milvus_utils import DATE_ORD_FIELD, date_to_ordinal
+
+CHUNK_WORDS = int(os.getenv("INGEST_CHUNK_WORDS", 250))
+CHUNK_OVERLAP_WORDS = int(os.getenv("INGEST_CHUNK_OVERLAP_WORDS", 40))
+PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", os.cpu_count() or 1))
+# Off by default. When set, caps RLIMIT_DATA (heap and other private writable
+# memory) rather than RLIMIT_AS, which also counts shared libraries and the
+# address space reserved for thread arenas and trips long before memory runs out.
+PARSE_WORKER_MAX_MEMORY_MB = int(os.getenv("INGEST_PARSE_WORKER_MAX_MEMORY_MB", 0))
+PARSE_WORKER_MAX_TASKS = int(os.getenv("INGEST_PARSE_WORKER_MAX_TASKS", 200))
+
+
+def read_pages(path: str):
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+
+        return [page.extract_text() or "" for page in PdfReader(path).pages]
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read().split("\f")
+
+
+def chunk_text(text: str, chunk_words: int = CHUNK_WORDS, overlap_words: int = CHUNK_OVERLAP_WORDS):
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap_words)
+    return [" ".join(words[i:i + chunk_words]) for i in range(0, max(1, len(words) - overlap_words), step)]
+
+
+def chunk_hash(source: str, page: int, content: str, reference: str, date: str) -> str:
+    """Stable id of a chunk, stored as content_hash so re-runs can skip what is already loaded."""
+    return hashlib.sha256(json.dumps([source, page, content, reference, date]).encode("utf-8")).hexdigest()
+
+
+def chunk_document(document: dict):
+    """Page-level chunks carrying the fields get_search_results reads, plus content_hash."""
+    pages = document.get("pages")
+    if pages is None:
+        pages = read_pages(document["path"]) if "path" in document else [document.get("text", "")]
+    source = document_source(document)
+    reference = document.get("reference", source)
+    date = document.get("date", "")
+    date_ord = date_to_ordinal(date)
+    chunks = []
+    for page_number, page_text in enumerate(pages, start=1):
+        for content in chunk_text(page_text or ""):
+            chunks.append({
+                "source": source,
+                "page": page_number,
+                "content": content,
+                "reference": reference,
+                "date": date,
+                DATE_ORD_FIELD: date_ord,
+                "content_hash": chunk_hash(source, page_number, content, reference, date),
+            })
+    return chunks
+
+
+def iter_chunked(documents, chunker=chunk_document):
+    """Serial counterpart of ParallelChunker.imap: yields (document, chunks, error)."""
+    for document in documents:
+        try:
+            yield document, chunker(document), None
+        except Exception as e:
+            yield document, [], e
+
+
+def _limit_worker_memory(max_memory_mb: int):
+    if max_memory_mb:
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+
+
+class ParallelChunker:
+    """
+    Runs a chunker over documents in a process pool.
+
+    imap keeps at most max_in_flight documents submitted ahead of the one being
+    yielded, so results stream back in input order with bounded memory. When a
+    worker dies, the pool is rebuilt and the documents that were in flight are
+    retried one at a time, so only the document that kills a worker again is
+    reported as failed.
+    """
+
+    def __init__(self, workers: int = PARSE_WORKERS, chunker=chunk_document,
+                 max_memory_mb: int = PARSE_WORKER_MAX_MEMORY_MB, max_tasks_per_child: int = PARSE_WORKER_MAX_TASKS,
+                 max_in_flight: int = None):
+        self.workers = max(1, workers)
+        self.chunker = chunker
+        self.max_memory_mb = max_memory_mb
+        self.max_tasks_per_child = max_tasks_per_child
+        self.max_in_flight = max_in_flight or 4 * self.workers
+        self.pool = None
+        self.restarts = 0
+        self.failed = 0
+
+    def _start(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        # max_tasks_per_child needs a non-fork start method; spawn is the default then
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_limit_worker_memory,
+            initargs=(self.max_memory_mb,),
+            max_tasks_per_child=self.max_tasks_per_child or None,
+        )
+
+    def _isolated(self, document):
+        # Re-runs one document on its own after a pool crash
+        try:
+            return self.pool.submit(self.chunker, document).result(), None
+        except BrokenProcessPool as e:
+            self.restarts += 1
+            self._start()
+            return [], e
+        except Exception as e:
+            return [], e
+
+    def imap(self, documents):
+        self._start()
+        in_flight = deque()
+        documents = iter(documents)
+        try:
+            exhausted = False
+            while in_flight or not exhausted:
+                while not exhausted and len(in_flight) < self.max_in_flight:
+                    try:
+                        document = next(documents)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    in_flight.append((document, self.pool.submit(self.chunker, document)))
+                if not in_flight:
+                    break
+
+                document, future = in_flight.popleft()
+                try:
+                    chunks, error = future.result(), None
+                except BrokenProcessPool:
+                    # Every pending future died with the pool; retry them one by one
+                    logging.warning(f"Parse worker crashed, restarting the pool and retrying {len(in_flight) + 1} documents")
+                    self.restarts += 1
+                    self._start()
+                    retry = [document] + [d for d, _ in in_flight]
+                    in_flight.clear()
+                    for document in retry:
+                        chunks, error = self._isolated(document)
+                        if error is not None:
+                            self.failed += 1
+                        yield document, chunks, error
+                    continue
+                except Exception as e:
+                    chunks, error = [], e
+                if error is not None:
+                    self.failed += 1
+                yield document, chunks, error
+        finally:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+_VOCABULARY = ("inflation index consumer price food fuel rural urban repo rate bulletin survey "
+               "growth quarter fiscal deficit monsoon output").split()
+
+
+def _synthetic_pages(seed: int, pages: int = 40, words_per_page: int = 600):
+    return [" ".join(_VOCABULARY[(seed + p * 7 + w) % len(_VOCABULARY)] for w in range(words_per_page))
+            for p in range(pages)]
+
+
+def _parse_and_count(document):
+    # Benchmark task: parse + chunk in the worker, only the chunk count crosses back
+    if "synthetic" in document:
+        document = {**document, "pages": _synthetic_pages(document["synthetic"])}
+    return len(chunk_document(document))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("directory", nargs="?", help="Directory of PDFs; a synthetic corpus is used when omitted")
+    parser.add_argument("--workers", default=",".join(str(w) for w in (1, 2, 4, 8) if w <= (os.cpu_count() or 1)) or "1")
+    parser.add_argument("--documents", type=int, default=200, help="Size of the synthetic corpus")
+    args = parser.parse_args()
+
+    if args.directory:
+        corpus = [{"path": os.path.join(args.directory, name), "date": ""}
+                  for name in sorted(os.listdir(args.directory)) if name.lower().endswith(".pdf")]
+    else:
+        # Workers generate the pages from the seed, like they would read a file from a path
+        corpus = [{"source": f"synthetic_{i}.txt", "date": "May 2025", "synthetic": i} for i in range(args.documents)]
+
+    print(f"{len(corpus)} documents, {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'seconds':>9} {'docs/s':>9} {'speedup':>8}")
+    baseline = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        start = time.perf_counter()
+        if workers == 1:
+            results = list(iter_chunked(corpus, _parse_and_count))
+        else:
+            results = list(ParallelChunker(workers, chunker=_parse_and_count).imap(corpus))
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        failed = sum(1 for _, _, error in results if error is not None)
+        print(f"{workers:>8} {elapsed:>9.2f} {len(corpus) / elapsed:>9.1f} {baseline / elapsed:>7.2f}x"
+              + (f"  ({failed} failed)" if failed else ""))
@@ -0,0 +1,68 @@
+"""
+Moves chunks of a collection loaded before month partitioning out of _default
+into their m_YYYYMM partition, so date-window searches can skip them.
+
+The retrieval service keeps searching _default alongside the window's month
+partitions, so it returns correct results before, during and after the move:
+
+    python repartition.py --collection <name>
+
+Each batch is inserted into its month partitions before it is deleted from
+_default, so an interrupted run can leave duplicates but never loses a chunk;
+re-running finishes the move. Run backfill_date_ord.py first: chunks whose
+date_ord is null stay in _default.
+"""
+import argparse
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+from milvus_utils import DATE_ORD_FIELD, DEFAULT_PARTITION, ensure_partitions, get_milvus_client, partition_name
+
+
+def repartition(milvus_client, collection_name: str, batch_size: int = 500) -> dict:
+    iterator = milvus_client.query_iterator(
+        collection_name=collection_name,
+        batch_size=batch_size,
+        filter=f"{DATE_ORD_FIELD} is not null",
+        output_fields=["*"],
+        partition_names=[DEFAULT_PARTITION],
+    )
+    known_partitions = set()
+    moved = 0
+    while True:
+        batch = iterator.next()
+        if not batch:
+            iterator.close()
+            break
+        by_partition = {}
+        for row in batch:
+            row = dict(row)
+            row.pop("id")  # auto_id: the copy gets a new primary key
+            by_partition.setdefault(partition_name(row[DATE_ORD_FIELD]), []).append(row)
+        ensure_partitions(milvus_client, collection_name, by_partition, known_partitions)
+        for name, rows in by_partition.items():
+            milvus_client.insert(collection_name=collection_name, data=rows, partition_name=name)
+        milvus_client.delete(collection_name=collection_name, ids=[row["id"] for row in batch],
+                             partition_name=DEFAULT_PARTITION)
+        moved += len(batch)
+        logging.info(f"Moved {moved} chunks into {len(known_partitions - {DEFAULT_PARTITION})} month partitions")
+    return {"moved": moved, "partitions": sorted(known_partitions - {DEFAULT_PARTITION})}
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default=os.getenv("CPI_V5_COLLECTION_NAME"))
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    client = get_milvus_client(uri=os.getenv("MILVUS_ENDPOINT"), token=os.getenv("MILVUS_TOKEN"))
+    start = time.time()
+    result = repartition(client, args.collection, args.batch_size)
+    print(f"Moved {result['moved']} chunks into {len(result['partitions'])} month partitions "
+          f"in {time.time() - start:.1f}s")
@@ -0,0 +1,147 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+
+from metrics import Histogram, LATENCY_BUCKETS
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds how many requests run the retrieval path at once.
+
+    Up to max_concurrency requests run; the rest wait in one FIFO queue per key,
+    and a freed slot goes to the keys in round-robin order, so a caller sending a
+    burst only delays its own requests. A request is turned away immediately,
+    with a Retry-After estimate, when:
+
+    - its key already has max_queue_per_key requests waiting (429),
+    - max_queue requests are waiting in total (503),
+    - the expected wait (requests ahead / max_concurrency x mean service time)
+      exceeds max_queue_wait_seconds (503),
+
+    and gives up with 503 if it is still queued after max_queue_wait_seconds.
+    Rejecting up front keeps the queue short enough that every admitted request
+    finishes within the budget, instead of all of them timing out.
+
+    Not thread-safe: acquire and release are called from the event loop.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, max_queue_per_key: int,
+                 max_queue_wait_seconds: float, service_time_smoothing: float = 0.1):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_key = max_queue_per_key
+        self.max_queue_wait = max_queue_wait_seconds
+        self.smoothing = service_time_smoothing
+
+        self.running = 0
+        self.queued = 0
+        self.queues = OrderedDict()  # key -> deque of waiter futures, in round-robin order
+        self.service_time = None  # moving average of seconds a request holds its slot
+
+        self.counters = {"admitted": 0, "waited": 0, "rejected_key_limit": 0, "rejected_queue_full": 0,
+                         "rejected_wait_budget": 0, "timed_out": 0}
+        self.queue_wait = Histogram(LATENCY_BUCKETS)
+
+    def expected_wait(self, ahead: int) -> float:
+        if self.service_time is None:
+            return 0.0
+        return (ahead + 1) / self.max_concurrency * self.service_time
+
+    def _reject(self, status_code: int, counter: str, reason: str, wait: float = None):
+        self.counters[counter] += 1
+        wait = self.expected_wait(self.queued) if wait is None else wait
+        raise AdmissionRejected(status_code, reason, max(1, math.ceil(wait)))
+
+    async def acquire(self, key: str) -> float:
+        """Waits for a slot. Returns the seconds spent queued; raises AdmissionRejected."""
+        if self.running < self.max_concurrency and not self.queued:
+            self.running += 1
+            self.counters["admitted"] += 1
+            self.queue_wait.observe(0.0)
+            return 0.0
+
+        queue = self.queues.get(key)
+        if queue is not None and len(queue) >= self.max_queue_per_key:
+            self._reject(429, "rejected_key_limit", f"Too many queued requests for this client ({len(queue)})")
+        if self.queued >= self.max_queue:
+            self._reject(503, "rejected_queue_full", f"Server busy: {self.queued} requests queued")
+        wait = self.expected_wait(self.queued)
+        if wait > self.max_queue_wait:
+            self._reject(503, "rejected_wait_budget", f"Server busy: expected wait {wait:.1f}s", wait)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.queues.setdefault(key, deque()).append(future)
+        self.queued += 1
+        self.counters["waited"] += 1
+        start = time.perf_counter()
+        timer = loop.call_later(self.max_queue_wait, self._expire, key, future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release()  # Granted just as the caller went away: pass the slot on
+            else:
+                self._remove(key, future)
+            raise
+        finally:
+            timer.cancel()
+        waited = time.perf_counter() - start
+        self.counters["admitted"] += 1
+        self.queue_wait.observe(waited)
+        return waited
+
+    def _remove(self, key: str, future):
+        queue = self.queues.get(key)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self.queued -= 1
+            if not queue:
+                del self.queues[key]
+
+    def _expire(self, key: str, future):
+        if future.done():
+            return
+        self._remove(key, future)
+        self.counters["timed_out"] += 1
+        future.set_exception(AdmissionRejected(
+            503, f"Server busy: not admitted within {self.max_queue_wait:.0f}s", max(1, math.ceil(self.max_queue_wait))))
+
+    def release(self, service_seconds: float = None):
+        """Frees a slot, handing it straight to the next waiting key if there is one."""
+        if service_seconds is not None:
+            self.service_time = service_seconds if self.service_time is None else (
+                self.smoothing * service_seconds + (1 - self.smoothing) * self.service_time)
+        while self.queues:
+            key, queue = next(iter(self.queues.items()))
+            future = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self.queues.move_to_end(key)
+            else:
+                del self.queues[key]
+            if not future.done():
+                future.set_result(None)  # The slot moves to the waiter; running is unchanged
+                return
+        self.running -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "queued": self.queued,
+            "queued_keys": len(self.queues),
+            "service_seconds": self.service_time or 0.0,
+            **self.counters,
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+        }
@@ -0,0 +1,215 @@
+"""
+Recall vs latency of the Milvus search settings (ef, limit, group_size).
+
+Replays a query set against a local Milvus stand-in loaded from a snapshot of
+the production collection, and compares every setting with brute-force exact
+cosine search over the same snapshot, grouped by reference the way
+get_search_results groups.
+
+    # 1. Snapshot the vectors, references and date ordinals of a collection
+    python ann_benchmark.py export --collection <name> --out snapshot.npz
+
+    # 2. Replay questions (JSONL with "question" and optionally "date_range":
+    #    [start_ord, end_ord]) against a local Milvus, e.g. the standalone
+    #    docker image on localhost:19530
+    python ann_benchmark.py run snapshot.npz queries.jsonl --uri http://localhost:19530 \\
+        --ef 16,32,64,128,256 --limit 50 --group-size 4
+
+Milvus Lite (a ./file.db URI) always searches FLAT, so it is only useful to check
+the harness itself, not to measure HNSW recall.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+from pymilvus import DataType, MilvusClient
+
+from milvus_utils_crossencoder_v5 import (
+    HNSW_EF_CONSTRUCTION,
+    HNSW_M,
+    SEARCH_EF,
+    SEARCH_GROUP_SIZE,
+    SEARCH_LIMIT,
+    get_milvus_client,
+)
+
+BENCH_COLLECTION = "ann_benchmark"
+NO_DATE = -1  # date_ord of chunks without a parseable date in the snapshot
+
+
+def export_snapshot(milvus_client, collection_name: str, path: str, batch_size: int = 1000) -> int:
+    iterator = milvus_client.query_iterator(
+        collection_name=collection_name,
+        batch_size=batch_size,
+        output_fields=["id", "vector", "reference", "date_ord"],
+    )
+    ids, vectors, references, date_ords = [], [], [], []
+    while True:
+        batch = iterator.next()
+        if not batch:
+            iterator.close()
+            break
+        for row in batch:
+            ids.append(row["id"])
+            vectors.append(row["vector"])
+            references.append(row.get("reference") or "")
+            date_ords.append(NO_DATE if row.get("date_ord") is None else row["date_ord"])
+    np.savez(path, ids=np.asarray(ids, dtype=np.int64), vectors=np.asarray(vectors, dtype=np.float32),
+             references=np.asarray(references, dtype=str), date_ords=np.asarray(date_ords, dtype=np.int64))
+    return len(ids)
+
+
+def load_snapshot(path: str) -> dict:
+    snapshot = dict(np.load(path))
+    vectors = snapshot["vectors"]
+    snapshot["normalized"] = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return snapshot
+
+
+def load_bench_collection(milvus_client, snapshot: dict, collection_name: str = BENCH_COLLECTION, batch_size: int = 1000):
+    """(Re)creates the benchmark collection from the snapshot with the production HNSW build parameters."""
+    if milvus_client.has_collection(collection_name):
+        milvus_client.drop_collection(collection_name)
+    schema = MilvusClient.create_schema(auto_id=False)
+    schema.add_field("id", DataType.INT64, is_primary=True)
+    schema.add_field("vector", DataType.FLOAT_VECTOR, dim=snapshot["vectors"].shape[1])
+    schema.add_field("reference", DataType.VARCHAR, max_length=1024)
+    schema.add_field("date_ord", DataType.INT64)
+    index_params = milvus_client.prepare_index_params()
+    index_params.add_index(field_name="vector", index_type="HNSW", metric_type="COSINE",
+                           params={"M": HNSW_M, "efConstruction": HNSW_EF_CONSTRUCTION})
+    milvus_client.create_collection(collection_name=collection_name, schema=schema, index_params=index_params,
+                                    consistency_level="Strong")
+    for start in range(0, len(snapshot["ids"]), batch_size):
+        end = start + batch_size
+        milvus_client.insert(collection_name=collection_name, data=[
+            {"id": int(i), "vector": v.tolist(), "reference": str(r), "date_ord": int(d)}
+            for i, v, r, d in zip(snapshot["ids"][start:end], snapshot["vectors"][start:end],
+                                  snapshot["references"][start:end], snapshot["date_ords"][start:end])
+        ])
+    milvus_client.flush(collection_name)
+    milvus_client.load_collection(collection_name)
+
+
+def exact_grouped_search(snapshot: dict, query_vector, limit: int, group_size: int, date_range=None):
+    """
+    Brute-force counterpart of the grouped Milvus search: the best limit references
+    by their best hit, each with up to group_size hits. Returns the set of ids.
+    """
+    query = np.asarray(query_vector, dtype=np.float32)
+    scores = snapshot["normalized"] @ (query / max(np.linalg.norm(query), 1e-12))
+    if date_range is not None:
+        date_ords = snapshot["date_ords"]
+        scores = np.where((date_ords >= date_range[0]) & (date_ords <= date_range[1]), scores, -np.inf)
+    groups = {}
+    for index in np.argsort(-scores, kind="stable"):
+        if scores[index] == -np.inf:
+            break
+        reference = snapshot["references"][index]
+        hits = groups.get(reference)
+        if hits is None:
+            if len(groups) == limit:
+                continue
+            hits = groups[reference] = []
+        if len(hits) < group_size:
+            hits.append(int(snapshot["ids"][index]))
+    return {hit for hits in groups.values() for hit in hits}
+
+
+def percentile(values, q: float) -> float:
+    return float(np.percentile(np.asarray(values), q)) if values else 0.0
+
+
+def run_benchmark(milvus_client, snapshot: dict, queries, settings, collection_name: str = BENCH_COLLECTION,
+                  repeats: int = 3):
+    """
+    queries: list of (vector, date_range or None). settings: list of (ef, limit, group_size).
+    Returns one row per setting with mean recall and p50/p99 search latency in ms.
+    """
+    rows = []
+    for ef, limit, group_size in settings:
+        truths = [exact_grouped_search(snapshot, vector, limit, group_size, date_range) for vector, date_range in queries]
+        recalls, latencies = [], []
+        for _ in range(repeats):
+            for (vector, date_range), truth in zip(queries, truths):
+                date_filter = f"date_ord >= {date_range[0]} and date_ord <= {date_range[1]}" if date_range else None
+                start = time.perf_counter()
+                results = milvus_client.search(
+                    collection_name=collection_name,
+                    data=[list(map(float, vector))],
+                    limit=limit,
+                    search_params={"metric_type": "COSINE", "params": {"ef": max(ef, limit)}},
+                    output_fields=["reference"],
+                    group_by_field="reference",
+                    group_size=group_size,
+                    strict_group_size=False,
+                    filter=date_filter,
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+                found = {hit["id"] for hit in results[0]}
+                recalls.append(len(found & truth) / len(truth) if truth else 1.0)
+        rows.append({
+            "ef": ef, "limit": limit, "group_size": group_size,
+            "recall": float(np.mean(recalls)),
+            "min_recall": float(np.min(recalls)),
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99),
+        })
+    return rows
+
+
+def read_queries(path: str):
+    from encoder import get_sentence_transformer
+
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    vectors = get_sentence_transformer().encode([record["question"] for record in records])
+    return [(vector, record.get("date_range")) for vector, record in zip(vectors, records)]
+
+
+def _int_list(value: str):
+    return [int(v) for v in value.split(",")]
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Snapshot a collection to .npz")
+    export.add_argument("--collection", default=os.getenv("CPI_V5_COLLECTION_NAME"))
+    export.add_argument("--out", required=True)
+    run = subparsers.add_parser("run", help="Replay queries and report recall and latency per setting")
+    run.add_argument("snapshot")
+    run.add_argument("queries")
+    run.add_argument("--uri", default=os.getenv("MILVUS_BENCH_URI", "http://localhost:19530"))
+    run.add_argument("--ef", type=_int_list, default=[SEARCH_EF])
+    run.add_argument("--limit", type=_int_list, default=[SEARCH_LIMIT])
+    run.add_argument("--group-size", type=_int_list, default=[SEARCH_GROUP_SIZE])
+    run.add_argument("--repeats", type=int, default=3)
+    run.add_argument("--skip-load", action="store_true", help="Reuse the benchmark collection from a previous run")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        client = get_milvus_client(uri=os.getenv("MILVUS_ENDPOINT"), token=os.getenv("MILVUS_TOKEN"))
+        count = export_snapshot(client, args.collection, args.out)
+        print(f"Exported {count} chunks of {args.collection} to {args.out}")
+    else:
+        snapshot = load_snapshot(args.snapshot)
+        bench_client = MilvusClient(uri=args.uri)
+        if not args.skip_load:
+            load_bench_collection(bench_client, snapshot)
+        queries = read_queries(args.queries)
+        settings = [(ef, limit, group_size) for limit in args.limit for group_size in args.group_size for ef in args.ef]
+        rows = run_benchmark(bench_client, snapshot, queries, settings, repeats=args.repeats)
+        print(f"{len(queries)} queries over {len(snapshot['ids'])} chunks")
+        print(f"{'ef':>6} {'limit':>6} {'group':>6} {'recall':>8} {'min':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for row in rows:
+            print(f"{row['ef']:>6} {row['limit']:>6} {row['group_size']:>6} {row['recall']:>8.4f} "
+                  f"{row['min_recall']:>8.4f} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f}")
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Histogram, SIZE_BUCKETS, LATENCY_BUCKETS
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent requests and runs them through
+    batch_fn together.
+
+    A batch is dispatched once its total weight reaches max_batch_size or the
+    oldest item has waited max_wait_ms, whichever comes first. batch_fn takes a
+    list of items and returns a list of results in the same order; it runs on a
+    single worker thread so the model is never called concurrently, and the
+    next batch fills up while the current one is being computed.
+    """
+
+    def __init__(self, name: str, batch_fn, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 weight_fn=None):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.weight_fn = weight_fn or (lambda item: 1)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"batch-{name}")
+
+        self.queue = None
+        self.loop = None
+        self.worker = None
+
+        self.batch_sizes = Histogram(SIZE_BUCKETS)
+        self.queue_wait = Histogram(LATENCY_BUCKETS)
+        self.compute_time = Histogram(LATENCY_BUCKETS)
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop or self.worker is None or self.worker.done():
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            self.worker = loop.create_task(self._run())
+
+    async def submit(self, item):
+        self._ensure_worker()
+        future = self.loop.create_future()
+        self.queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        first = await self.queue.get()
+        batch = [first]
+        weight = self.weight_fn(first[0])
+        deadline = self.loop.time() + self.max_wait
+        while weight < self.max_batch_size:
+            if self.queue.empty():
+                timeout = deadline - self.loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                entry = self.queue.get_nowait()
+            batch.append(entry)
+            weight += self.weight_fn(entry[0])
+        return batch, weight
+
+    async def _run(self):
+        while True:
+            batch, weight = await self._collect()
+            dispatched = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait.observe(dispatched - enqueued)
+            self.batch_sizes.observe(weight)
+
+            try:
+                results = await self.loop.run_in_executor(self.executor, self.batch_fn, [item for item, _, _ in batch])
+            except Exception as e:
+                logging.error(f"Batch {self.name} of {len(batch)} items failed: {e}", exc_info=True)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.compute_time.observe(time.perf_counter() - dispatched)
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "pending": self.queue.qsize() if self.queue is not None else 0,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "compute_seconds": self.compute_time.snapshot(),
+        }
+
+
+def split_results(flat, lengths):
+    """Splits a flat list of per-pair results back into one list per submitted item."""
+    out = []
+    offset = 0
+    for length in lengths:
+        out.append(flat[offset:offset + length])
+        offset += length
+    return out
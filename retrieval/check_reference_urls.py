@@ -0,0 +1,177 @@
+import argparse
+import os
+import re
+import time
+
+from reference_urls import get_reference_url
+
+# Equivalence check and micro-benchmark for reference_urls.get_reference_url
+# against the original elif chain, kept verbatim below.
+#
+#   python check_reference_urls.py                  # every distinct reference in the collection
+#   python check_reference_urls.py --file refs.txt  # one reference per line
+
+
+def legacy_get_reference_url(ref: str) -> str:
+    if re.match(r"Inflation Expectations Survey of Households \w+ \d{4}", ref):
+        return "https://website.rbi.org.in/web/rbi/statistics/survey?category=24927098&categoryName=Inflation%20Expectations%20Survey%20of%20House-holds%20-%20Bi-monthly"
+    elif re.match(r"Monetary Policy Report \w+ \d{4}", ref):
+        return "https://website.rbi.org.in/web/rbi/publications/articles?category=24927873"
+    elif re.match(r"Minutes of the Monetary Policy Committee Meeting \w+ \d{4}", ref):
+        return "https://website.rbi.org.in/web/rbi/press-releases?q=%22Minutes+of+the+Monetary+Policy+Committee+Meeting%22"
+    elif re.match(r"CPI Press Release \w+ \d{4}", ref):
+        return "https://www.mospi.gov.in/archive/press-release?field_press_release_category_tid=120"
+    elif re.match(r"Economic Survey \d{4} ?- ?\d{4}", ref):
+        return "https://www.indiabudget.gov.in/economicsurvey/allpes.php"
+    elif re.match(r"IIP Press Release \w+ \d{4}", ref):
+        return "https://www.mospi.gov.in/archive/press-release?field_press_release_category_tid=121"
+    elif re.match(r"Monthly Economic Report \w+ \d{4}", ref):
+         return "https://dea.gov.in/monthly-economic-report-table"
+    elif re.match(r"RBI Bulletin \w+ \d{4}", ref):
+         return "https://rbi.org.in/Scripts/BS_ViewBulletin.aspx"
+    elif re.match(r"RBI State Finances \w+ \d{4}", ref):
+         return "https://rbi.org.in/Scripts/AnnualPublications.aspx?head=State%20Finances%20:%20A%20Study%20of%20Budgets"
+    elif re.match(r"RBI Handbook of Statistics On Indian States \w+ \d{4}", ref):
+         return "https://rbi.org.in/Scripts/AnnualPublications.aspx?head=Handbook+of+Statistics+on+Indian+States"
+    elif re.match(r"RBI Publications - Annual \d{4}", ref):
+         return "https://rbi.org.in/Scripts/Publications.aspx?publication=Annual"
+    elif re.match(r"RBI Publications - Half Yearly \w+ \d{4}", ref):
+         return "https://rbi.org.in/Scripts/Publications.aspx?publication=HalfYearly"
+    elif re.match(r"RBI Publications - Monthly \w+ \d{4}", ref):
+         return "https://rbi.org.in/Scripts/Publications.aspx?publication=Monthly"
+    elif 'Survey of Professional Forecasters on Macroeconomic Indicators' in ref:
+        return "https://rbi.org.in/Scripts/Publications.aspx?publication=BiMonthly"
+    elif re.match(r"RBI Publications Biennial \w+ \d{4}", ref):
+        return "https://rbi.org.in/Scripts/Publications.aspx?publication=Biennial"
+    elif re.match(r"Sources of Variation in India’s Foreign Exchange Reserves RBI Publications - Quaterly \w+ \w+ \d{4}", ref):
+        return "https://rbi.org.in/Scripts/Publications.aspx?publication=Quarterly"
+    elif re.match(r".+ - RBI Notifications \w+ \d{1,2}, \d{4}", ref):
+        return "https://rbi.org.in/Scripts/NotificationUser.aspx"
+    elif re.match(r"RBI - Occasional Papers - Vol\. \d{2}, No\. ?\d(?:,|:)? ?[A-Za-z]+ \d{1,2}, \d{4}", ref):
+        return "https://rbi.org.in/Scripts/HalfYearlyPublications.aspx?head=Occasional+Papers"
+    elif re.match(r"RBI WPS \(DEPR\): \d{2}/\d{4}: .+", ref):
+        return "https://rbi.org.in/Scripts/PublicationsView.aspx?head=Working%20Papers"
+    elif re.match(r"Measuring Productivity at the Industry Level – The India KLEMS Database \w+ \d{1,2}, \d{4}", ref):
+        return "https://rbi.org.in/Scripts/KLEMS.aspx"
+    elif re.match(r"RBI Publications - Weekly \d{1,2} \w+ \d{4}", ref):
+        return "https://rbi.org.in/Scripts/Publications.aspx?publication=Weekly"
+    elif re.match(r"RBI Publications - Reports .+ \d{1,2} \w+ \d{4}", ref):
+        return "https://rbi.org.in/Scripts/Publications.aspx?publication=Reports"
+    elif re.match(r"RBI Speeches - .+", ref):
+        return "https://rbi.org.in/Scripts/BS_ViewSpeeches.aspx"
+    elif re.match(r'DRG Study No\. \d{1,3}: .+ \w+ \d{1,2}, \d{4}', ref):
+        return "https://rbi.org.in/Scripts/Occas_DRG_Studies.aspx"
+    elif re.match(r".+ Press Release \w+ \d{1,2}, \d{4}", ref):
+        return "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"
+    elif re.match(r"Lending and Deposit Rates of Scheduled Commercial Banks – \w+ \d{4}", ref):
+        return "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"
+    elif re.match(r"Monthly Data on India’s International Trade in Services.+", ref):
+        return "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"
+    elif re.match(r"Scheduled Banks’ Statement of Position in India as on .+", ref):
+        return "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"
+    elif re.match(r"Sectoral Deployment of Bank Credit – \w+ \d{4}", ref):
+        return "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"
+    elif re.match(r"(THE\s+)?[A-Z][A-Za-z ’()\-]+(Act|Code), \d{4}", ref) or re.match(r".+Act, \d{4}", ref):
+        return "https://rbi.org.in/Scripts/Act.aspx"
+    elif re.match(r'.*Scheme, \d{4}$', ref):
+        return 'https://rbi.org.in/Scripts/Schemes.aspx'
+    elif re.match(r'.*Regulations, \d{4}$', ref):
+        return 'https://rbi.org.in/Scripts/Regulations.aspx'
+    elif re.match(r'.*Rules, \d{4}$', ref):
+        return 'https://rbi.org.in/Scripts/Rules.aspx'
+    # RBI Governor Speeches / Interviews / Press Conferences / Fireside Chats
+    elif re.match(r"(Edited\s+)?Transcript of the Reserve Bank of India’s Post-Monetary Policy Press Conference: \w+ \d{1,2}, \d{4}", ref, re.IGNORECASE):
+        return "https://rbi.org.in/Scripts/BS_SpeechesView.aspx"
+
+    elif re.match(r"Edited transcript of Reserve Bank of India’s Governor Press Conference with Media: \w+ \d{1,2}, \d{4}", ref, re.IGNORECASE):
+        return "https://rbi.org.in/Scripts/BS_SpeechesView.aspx"
+
+    elif re.match(r"(Fireside chat|Panel Discussion) with Governor.*on \w+ \d{1,2}, \d{4}", ref, re.IGNORECASE):
+        return "https://rbi.org.in/Scripts/BS_SpeechesView.aspx"
+
+    elif re.match(r"Interview of Governor.*on \w+ \d{1,2}, \d{4}", ref, re.IGNORECASE):
+        return "https://rbi.org.in/Scripts/BS_SpeechesView.aspx"
+
+    elif re.match(r"Master Direction(s)?( –| -)? .+", ref, re.IGNORECASE):
+        return "https://rbi.org.in/Scripts/BS_ViewMasterDirections.aspx"
+
+    elif re.match(r".*(Draft|draft|DRAFT).*(Circular|Direction|Guideline|Framework|Regulation|Instruction).* \w+ \d{1,2}, \d{4}", ref):
+        return "https://rbi.org.in/Scripts/DraftNotificationsGuildelines.aspx"
+    elif re.match(r"Master Circular(s)?( –|-)? (on )?.+ \w+ \d{1,2}, \d{4}", ref, re.IGNORECASE):
+        return "https://rbi.org.in/Scripts/BS_ViewMasterCirculardetails.aspx"
+    elif re.match(r".+ -? ?PIB \d{1,2} \w+ \d{4}", ref, re.IGNORECASE):
+        return "https://pib.gov.in/PressReleseDetail.aspx?PRID=2089308&reg=3&lang=1"
+    elif re.match(r"MSME ANNUAL REPORT( \d{4}-\d{2})?$", ref, re.IGNORECASE):
+        return "https://www.msme.gov.in/relatedlinks/annual-report-ministry-micro-small-and-medium-enterprises"
+    elif re.match(r"Ministry Wise Procurement \d{4}-\d{2}", ref):
+        return "https://sambandh.msme.gov.in/MinistryWisesReport.aspx"
+    elif re.match(r"RBI Report On Trend And Progress Of Banking In India \d{4}-\d{2}", ref):
+        return "https://www.rbi.org.in/Scripts/AnnualPublications.aspx?head=Trend+and+Progress+of+Banking+in+India"
+    elif re.match(r"\d+-Year GST Statistical Report", ref, re.IGNORECASE):
+        return "https://tutorial.gst.gov.in/offlineutilities/gst_statistics/6YearReport.pdf"
+    elif re.match(r"India Budget \d{4}-\d{4}", ref, re.IGNORECASE):
+        return "https://www.indiabudget.gov.in/doc/Budget_Speech.pdf"
+    elif re.match(r"Udyog Aadhar Registeration \d{4}-\d{4}", ref, re.IGNORECASE):
+        return "https://www.dcmsme.gov.in/uampublication.aspx"
+    elif re.match(r"Udyog Aadhar Registeration \w+ \d{4}", ref, re.IGNORECASE):
+        return "https://www.dcmsme.gov.in/uampublication.aspx"
+    elif re.match(r"MALAYSIA DEVELOPMENT EXPERIENCE SME \w+ \d{4}", ref, re.IGNORECASE):
+        return "https://documents1.worldbank.org/curated/en/504361583989615623/pdf/Malaysia-s-Experience-with-the-Small-and-Medium-Sized-Enterprises-Masterplan-Lessons-Learned.pdf"
+    elif re.match(r"Malaysian SME Program Efficiency Review \w+ \d{4}", ref, re.IGNORECASE):
+        return "https://documents1.worldbank.org/curated/en/099255003152238688/pdf/P17014606709a70f50856d0799328fb7040.pdf"
+    else:
+        return "Unknown Url"  # Default empty if no match
+
+
+def fetch_distinct_references(collection_name):
+    from dotenv import load_dotenv
+    from milvus_utils_crossencoder_v5 import get_milvus_client
+
+    load_dotenv()
+    client = get_milvus_client(uri=os.getenv("MILVUS_ENDPOINT"), token=os.getenv("MILVUS_TOKEN"))
+    iterator = client.query_iterator(collection_name=collection_name, batch_size=1000, filter="", output_fields=["reference"])
+    references = set()
+    while True:
+        batch = iterator.next()
+        if not batch:
+            iterator.close()
+            break
+        references.update(row["reference"] for row in batch if row.get("reference") is not None)
+    return sorted(references)
+
+
+def bench(fn, references, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for ref in references:
+            fn(ref)
+    return (time.perf_counter() - start) / (repeat * len(references))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", help="File with one reference per line instead of querying Milvus")
+    parser.add_argument("--collection", default=os.getenv("CPI_V5_COLLECTION_NAME"))
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file) as f:
+            references = sorted({line.rstrip("\n") for line in f if line.strip()})
+    else:
+        references = fetch_distinct_references(args.collection)
+
+    mismatches = [(ref, legacy_get_reference_url(ref), get_reference_url(ref))
+                  for ref in references if legacy_get_reference_url(ref) != get_reference_url(ref)]
+    for ref, old, new in mismatches:
+        print(f"MISMATCH {ref!r}: legacy={old} new={new}")
+    print(f"{len(references)} distinct references, {len(mismatches)} mismatches")
+
+    legacy_time = bench(legacy_get_reference_url, references, args.repeat)
+    uncached_time = bench(get_reference_url.__wrapped__, references, args.repeat)
+    get_reference_url.cache_clear()
+    cached_time = bench(get_reference_url, references, args.repeat)
+    print(f"legacy chain:      {legacy_time * 1e6:8.2f} us/ref")
+    print(f"rule table:        {uncached_time * 1e6:8.2f} us/ref")
+    print(f"rule table + memo: {cached_time * 1e6:8.2f} us/ref")
+    raise SystemExit(1 if mismatches else 0)
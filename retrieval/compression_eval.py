@@ -0,0 +1,255 @@
+"""
+Memory footprint, QPS and top-5 overlap of the vector compression levels
+(VECTOR_COMPRESSION=none, int8, binary), to pick one with data.
+
+Uses the same snapshot and query files as ann_benchmark.py. Each level gets its
+own benchmark collection on a local Milvus, built with the production index
+parameters, and the queries go through search_many, so int8 and binary are
+measured with the coarse search plus exact rescoring the service would run.
+Every level is compared with the float (none) collection:
+
+    python compression_eval.py run snapshot.npz queries.jsonl --uri http://localhost:19530 \\
+        --levels none,int8,binary --oversample 2,3,5
+
+--offline replays the same comparison in numpy (brute-force coarse search on
+the quantized vectors, then rescoring), which needs no Milvus and checks how
+much the quantization alone costs; its QPS is numpy's, not Milvus's.
+
+Memory is estimated from the index layouts (vector codes plus HNSW level-0
+links or IVF ids per chunk); the rescoring copy of the float vectors is
+memory-mapped and reported separately as disk.
+"""
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+from pymilvus import DataType, MilvusClient
+
+import milvus_utils_crossencoder_v5 as milvus_utils
+from ann_benchmark import _int_list, load_snapshot, percentile, read_queries
+from milvus_utils_crossencoder_v5 import (
+    COMPRESSED_FIELDS,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_M,
+    SEARCH_GROUP_SIZE,
+    SEARCH_LIMIT,
+    compress_vectors,
+    search_many,
+)
+
+LEVELS = ["none", "int8", "binary"]
+TOP_K = 5
+BIN_IVF_NLIST = 1024
+
+
+def bench_collection(level: str) -> str:
+    return f"compression_eval_{level}"
+
+
+def memory_estimate(level: str, dim: int, rows: int) -> dict:
+    graph = 2 * HNSW_M * 4  # HNSW level-0 neighbour ids
+    resident = {"none": dim * 4 + graph, "int8": dim + graph, "binary": dim // 8 + 8}[level]
+    disk = 0 if level == "none" else dim * 4
+    return {"resident_bytes_per_chunk": resident, "resident_mb": resident * rows / 2**20,
+            "mmap_mb": disk * rows / 2**20}
+
+
+def load_level(milvus_client, snapshot: dict, level: str, batch_size: int = 1000):
+    """(Re)creates the level's benchmark collection: snapshot ids, production vector fields and indexes."""
+    collection_name = bench_collection(level)
+    if milvus_client.has_collection(collection_name):
+        milvus_client.drop_collection(collection_name)
+    dim = snapshot["vectors"].shape[1]
+    schema = MilvusClient.create_schema(auto_id=False)
+    schema.add_field("id", DataType.INT64, is_primary=True)
+    schema.add_field("vector", DataType.FLOAT_VECTOR, dim=dim, mmap_enabled=level != "none")
+    if level == "int8":
+        schema.add_field(COMPRESSED_FIELDS[level], DataType.INT8_VECTOR, dim=dim)
+    elif level == "binary":
+        schema.add_field(COMPRESSED_FIELDS[level], DataType.BINARY_VECTOR, dim=dim)
+    schema.add_field("reference", DataType.VARCHAR, max_length=1024)
+    schema.add_field("date_ord", DataType.INT64)
+    # The indexes loader/milvus_utils.build_index_params creates for the level
+    index_params = milvus_client.prepare_index_params()
+    if level == "none":
+        index_params.add_index(field_name="vector", index_type="HNSW", metric_type="COSINE",
+                               params={"M": HNSW_M, "efConstruction": HNSW_EF_CONSTRUCTION})
+    else:
+        index_params.add_index(field_name="vector", index_type="FLAT", metric_type="COSINE")
+    if level == "int8":
+        index_params.add_index(field_name=COMPRESSED_FIELDS[level], index_type="HNSW", metric_type="COSINE",
+                               params={"M": HNSW_M, "efConstruction": HNSW_EF_CONSTRUCTION})
+    elif level == "binary":
+        index_params.add_index(field_name=COMPRESSED_FIELDS[level], index_type="BIN_IVF_FLAT",
+                               metric_type="HAMMING", params={"nlist": BIN_IVF_NLIST})
+    index_params.add_index(field_name="date_ord", index_type="STL_SORT", index_name="date_ord")
+    milvus_client.create_collection(collection_name=collection_name, schema=schema, index_params=index_params,
+                                    consistency_level="Strong")
+    for start in range(0, len(snapshot["ids"]), batch_size):
+        end = start + batch_size
+        vectors = snapshot["vectors"][start:end]
+        rows = [{"id": int(i), "vector": v.tolist(), "reference": str(r), "date_ord": int(d)}
+                for i, v, r, d in zip(snapshot["ids"][start:end], vectors,
+                                      snapshot["references"][start:end], snapshot["date_ords"][start:end])]
+        if level != "none":
+            for row, compressed in zip(rows, compress_vectors(vectors, level)):
+                row[COMPRESSED_FIELDS[level]] = compressed
+        milvus_client.insert(collection_name=collection_name, data=rows)
+    milvus_client.flush(collection_name)
+    milvus_client.load_collection(collection_name)
+
+
+def milvus_search(milvus_client, level: str, limit: int, group_size: int):
+    def search(vector, date_range):
+        date_filter = f"date_ord >= {date_range[0]} and date_ord <= {date_range[1]}" if date_range else None
+        hits = search_many(milvus_client, bench_collection(level), [vector], ["reference"], date_filter,
+                           limit=limit, group_size=group_size, compression=level)[0]
+        return [(hit["id"], hit["distance"]) for hit in hits]
+    return search
+
+
+def grouped(scores, references, limit: int, group_size: int):
+    """Indices of the best limit references by their best score, up to group_size each, best first."""
+    groups = {}
+    for index in np.argsort(-scores, kind="stable"):
+        if scores[index] == -np.inf:
+            break
+        group = groups.get(references[index])
+        if group is None:
+            if len(groups) == limit:
+                continue
+            group = groups[references[index]] = []
+        if len(group) < group_size:
+            group.append(index)
+    return [index for group in groups.values() for index in group]
+
+
+def offline_search(snapshot: dict, level: str, limit: int, group_size: int):
+    """numpy stand-in for search_many on the level: coarse scores on the codes, then exact rescoring."""
+    normalized, references, ids, date_ords = (snapshot["normalized"], snapshot["references"],
+                                             snapshot["ids"], snapshot["date_ords"])
+    if level == "int8":
+        codes = np.asarray(compress_vectors(normalized, level), dtype=np.float32)
+        codes /= np.maximum(np.linalg.norm(codes, axis=1, keepdims=True), 1e-12)
+    elif level == "binary":
+        codes = np.where(normalized > 0, 1.0, -1.0).astype(np.float32)  # dot product = dim - 2 x hamming
+
+    def search(vector, date_range):
+        query = np.asarray(vector, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        if date_range is not None:
+            mask = (date_ords >= date_range[0]) & (date_ords <= date_range[1])
+        else:
+            mask = np.ones(len(ids), dtype=bool)
+        exact = np.where(mask, normalized @ query, -np.inf)
+        if level == "none":
+            return [(int(ids[i]), float(exact[i])) for i in grouped(exact, references, limit, group_size)]
+        if level == "int8":
+            coarse_query = np.asarray(compress_vectors(query[None], level), dtype=np.float32)[0]
+        else:
+            coarse_query = np.where(query > 0, 1.0, -1.0).astype(np.float32)
+        coarse = np.where(mask, codes @ coarse_query, -np.inf)
+        oversample = milvus_utils.RESCORE_OVERSAMPLE
+        candidates = np.asarray(grouped(coarse, references, max(limit, int(limit * oversample)),
+                                        max(group_size, int(group_size * oversample))), dtype=np.int64)
+        rescored = np.full(len(ids), -np.inf, dtype=np.float32)
+        rescored[candidates] = exact[candidates]
+        return [(int(ids[i]), float(rescored[i])) for i in grouped(rescored, references, limit, group_size)]
+    return search
+
+
+def top_ids(hits, k: int = TOP_K) -> set:
+    return {hit_id for hit_id, _ in sorted(hits, key=lambda hit: -hit[1])[:k]}
+
+
+def evaluate(search_fn, queries, baseline, repeats: int = 1) -> dict:
+    """Latency and QPS of search_fn over the queries, and its overlap with the baseline hits."""
+    latencies, overlaps, recalls = [], [], []
+    for _ in range(repeats):
+        for (vector, date_range), truth in zip(queries, baseline):
+            start = time.perf_counter()
+            hits = search_fn(vector, date_range)
+            latencies.append(time.perf_counter() - start)
+            if truth:
+                overlaps.append(len(top_ids(hits) & top_ids(truth)) / min(TOP_K, len(truth)))
+                recalls.append(len({hit_id for hit_id, _ in hits} & {hit_id for hit_id, _ in truth}) / len(truth))
+    return {
+        "qps": len(latencies) / sum(latencies) if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "top5_overlap": float(np.mean(overlaps)) if overlaps else 1.0,
+        "min_top5_overlap": float(np.min(overlaps)) if overlaps else 1.0,
+        "candidate_recall": float(np.mean(recalls)) if recalls else 1.0,
+    }
+
+
+def run_evaluation(snapshot: dict, queries, levels, oversamples, limit: int, group_size: int,
+                   milvus_client=None, repeats: int = 1):
+    """One row per (level, oversample); oversample only applies to the compressed levels."""
+    def searcher(level):
+        if milvus_client is None:
+            return offline_search(snapshot, level, limit, group_size)
+        return milvus_search(milvus_client, level, limit, group_size)
+
+    baseline_search = searcher("none")
+    baseline = [baseline_search(vector, date_range) for vector, date_range in queries]
+    dim = snapshot["vectors"].shape[1]
+    rows = []
+    for level in levels:
+        for oversample in ([None] if level == "none" else oversamples):
+            if oversample is not None:
+                milvus_utils.RESCORE_OVERSAMPLE = oversample
+            search_fn = baseline_search if level == "none" else searcher(level)
+            rows.append({"level": level, "oversample": oversample,
+                         **memory_estimate(level, dim, len(snapshot["ids"])),
+                         **evaluate(search_fn, queries, baseline, repeats)})
+    return rows
+
+
+def _float_list(value: str):
+    return [float(v) for v in value.split(",")]
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run = subparsers.add_parser("run", help="Compare the compression levels on a snapshot")
+    run.add_argument("snapshot")
+    run.add_argument("queries")
+    run.add_argument("--uri", default=os.getenv("MILVUS_BENCH_URI", "http://localhost:19530"))
+    run.add_argument("--offline", action="store_true", help="Simulate the levels in numpy instead of Milvus")
+    run.add_argument("--levels", default=",".join(LEVELS))
+    run.add_argument("--oversample", type=_float_list, default=[milvus_utils.RESCORE_OVERSAMPLE])
+    run.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    run.add_argument("--group-size", type=int, default=SEARCH_GROUP_SIZE)
+    run.add_argument("--repeats", type=int, default=3)
+    run.add_argument("--skip-load", action="store_true", help="Reuse the benchmark collections from a previous run")
+    args = parser.parse_args()
+
+    snapshot = load_snapshot(args.snapshot)
+    levels = args.levels.split(",")
+    bench_client = None
+    if not args.offline:
+        bench_client = MilvusClient(uri=args.uri)
+        if not args.skip_load:
+            for level in dict.fromkeys(["none", *levels]):
+                load_level(bench_client, snapshot, level)
+    queries = read_queries(args.queries)
+    rows = run_evaluation(snapshot, queries, levels, args.oversample, args.limit, args.group_size,
+                          bench_client, args.repeats)
+    print(f"{len(queries)} queries over {len(snapshot['ids'])} chunks, limit {args.limit}, group size {args.group_size}"
+          f"{' (offline)' if args.offline else ''}")
+    print(f"{'level':>7} {'over':>5} {'B/chunk':>8} {'RAM MB':>9} {'mmap MB':>9} {'QPS':>8} {'p50 ms':>8} "
+          f"{'p99 ms':>8} {'top5':>7} {'min':>7} {'recall':>7}")
+    for row in rows:
+        oversample = "-" if row["oversample"] is None else f"{row['oversample']:g}"
+        print(f"{row['level']:>7} {oversample:>5} {row['resident_bytes_per_chunk']:>8} {row['resident_mb']:>9.1f} "
+              f"{row['mmap_mb']:>9.1f} {row['qps']:>8.1f} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+              f"{row['top5_overlap']:>7.3f} {row['min_top5_overlap']:>7.3f} {row['candidate_recall']:>7.3f}")
@@ -1,13 +1,41 @@
+import asyncio
+import json
 import logging
+import threading
+from contextlib import asynccontextmanager, contextmanager
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security.api_key import APIKeyHeader
-from pydantic import BaseModel
-from encoder import emb_text, model
-from milvus_utils_crossencoder_v5 import get_milvus_client, get_search_results
-import os
+from pydantic import BaseModel, Field
+from typing import Optional
 from dotenv import load_dotenv
+# Load environment variables before the local modules below read their configuration
+load_dotenv()
+from encoder import aemb_text, embed_batcher, embedding_cache
+from batching import MicroBatcher, split_results
+from inference_backend import CROSS_ENCODER_NAME, load_model
+from date_extractor import extract_date_range, date_to_ordinal, month_ordinal
+from reference_urls import get_reference_url
+from rerank_scoring import reachable_mask, select_results, split_date_filter
+from response_cache import ResponseCache
+from gemini_client import get_genai_client, llm_cache, memoized_llm_call
+from milvus_utils_crossencoder_v5 import (
+    clear_partition_cache,
+    collection_compression,
+    estimate_payload_bytes,
+    fetch_by_ids,
+    get_milvus_client,
+    search_many,
+    window_partitions,
+)
+from admission import AdmissionController, AdmissionRejected
+from deadline import CostEstimate, Deadline
+from local_index import LocalIndex
+from metrics import BYTES_BUCKETS, LATENCY_BUCKETS, SIZE_BUCKETS, Histogram, PrometheusText, StageTimer
+import os
 from sentence_transformers import CrossEncoder
 from dateutil.relativedelta import relativedelta
 from textwrap import dedent
@@ -18,8 +46,6 @@ import time
 from time import strftime, gmtime
 import re
 from typing import List, Dict
-# Load environment variables
-load_dotenv()
 
 # API Key and Security
 API_KEY = os.getenv("ACQ_API_KEY")
@@ -36,11 +62,136 @@ MILVUS_ENDPOINT = os.getenv("MILVUS_ENDPOINT")
 MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
 TOP_N_RESULTS = 5  # Configurable number of search results
 
+# Response cache in front of /search-topN
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 2048)),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 6 * 3600)),
+    similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0.95)),  # <= 0 disables the near-duplicate tier
+)
+
+# Two-phase retrieval: the ANN search only returns ids, distances and dates; the
+# chunk text and metadata are fetched by id for candidates inside the date windows
+TWO_PHASE_RETRIEVAL = os.getenv("TWO_PHASE_RETRIEVAL", "true").lower() == "true"
+SEARCH_FIELDS = ["id", "date", "date_ord"] if TWO_PHASE_RETRIEVAL else ["content", "source", "id", "page", "reference", "date", "date_ord"]
+FETCH_FIELDS = ["content", "source", "page", "reference"]
+retrieval_metrics = {
+    "search_payload_bytes": Histogram(BYTES_BUCKETS),
+    "fetch_payload_bytes": Histogram(BYTES_BUCKETS),
+    "search_seconds": Histogram(LATENCY_BUCKETS),
+    "fetch_seconds": Histogram(LATENCY_BUCKETS),
+    "candidates": Histogram(SIZE_BUCKETS),
+    "fetched": Histogram(SIZE_BUCKETS),
+    "chunk_attempts": Histogram(SIZE_BUCKETS),  # date windows tried before results were found
+    "relaxed_candidates": Histogram(SIZE_BUCKETS),  # hits only the relaxed window searches found
+}
+
+# Per-stage latency of every request (Gemini calls, embed, search, fetch,
+# cross-encode, rerank, reference URLs), requests in flight and end-to-end
+# latency per endpoint. Exposed on /stats and, for Prometheus, on /metrics.
+stage_timer = StageTimer()
+ENDPOINTS = ["search", "batch", "answer", "answer_stream"]
+in_flight = {endpoint: 0 for endpoint in ENDPOINTS}
+request_seconds = {endpoint: Histogram(LATENCY_BUCKETS) for endpoint in ENDPOINTS}
+
+@contextmanager
+def request_trace(endpoint):
+    """Counts the request in flight and logs where its time went."""
+    in_flight[endpoint] += 1
+    start = time.perf_counter()
+    with stage_timer.trace() as trace:
+        try:
+            yield trace
+        finally:
+            in_flight[endpoint] -= 1
+            elapsed = time.perf_counter() - start
+            request_seconds[endpoint].observe(elapsed)
+            logging.info(f"{endpoint} request took {elapsed:.4f}s: "
+                         + ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in trace.items()))
+
+# Admission control: at most ADMISSION_MAX_CONCURRENCY requests run retrieval at
+# once, the rest queue fairly per caller (API key and client address) and are
+# shed with 429/503 and Retry-After once their wait would exceed the budget
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+admission = AdmissionController(
+    max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", 16)),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", 64)),
+    max_queue_per_key=int(os.getenv("ADMISSION_MAX_QUEUE_PER_KEY", 16)),
+    max_queue_wait_seconds=float(os.getenv("ADMISSION_MAX_QUEUE_WAIT_SECONDS", 10)),
+)
+
+@asynccontextmanager
+async def admitted(request: Request, api_key: str):
+    """Holds an admission slot while the block runs; rejections become 429/503 with Retry-After."""
+    if not ADMISSION_ENABLED:
+        yield
+        return
+    try:
+        waited = await admission.acquire(f"{api_key}:{request.client.host}")
+    except AdmissionRejected as e:
+        logging.warning(f"Rejected request from {request.client.host}: {e.reason}")
+        raise HTTPException(status_code=e.status_code, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+    stage_timer.observe("admission_wait", waited)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        admission.release(time.perf_counter() - start)
+
+# Every request gets REQUEST_DEADLINE_SECONDS from arrival. Preprocessing that
+# runs past PREPROCESS_BUDGET_SHARE of it falls back to the raw question and the
+# default dates, and when the cross-encoder cannot score every candidate in the
+# time left it scores only the closest ones by vector distance. Responses list
+# the degradations applied and are not cached.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 8))
+PREPROCESS_BUDGET_SHARE = float(os.getenv("PREPROCESS_BUDGET_SHARE", 0.4))
+RERANK_MIN_CANDIDATES = int(os.getenv("RERANK_MIN_CANDIDATES", 10))
+RERANK_RESERVE_SECONDS = float(os.getenv("RERANK_RESERVE_SECONDS", 0.1))  # left for what follows the cross-encoder
+MILVUS_MIN_TIMEOUT_SECONDS = float(os.getenv("MILVUS_MIN_TIMEOUT_SECONDS", 1))
+cross_encode_cost = CostEstimate(float(os.getenv("CROSS_ENCODER_SECONDS_PER_PAIR", 0.002)))
+DEGRADATIONS = ["raw_query", "default_dates", "rerank_prefix"]
+degradation_counts = {name: 0 for name in DEGRADATIONS}
+
+def record_degradations(degradations):
+    for name in degradations:
+        degradation_counts[name] += 1
+    if degradations:
+        logging.warning(f"Request degraded to meet its deadline: {degradations}")
+
+# Gemini calls are blocking, so they run on a dedicated pool instead of the event loop
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "64"))
+llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="gemini")
+
 print(f'MILVUS_ENDPOINT = {MILVUS_ENDPOINT}')
-cross_encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2", device="cpu")
+cross_encoder = load_model(CrossEncoder, CROSS_ENCODER_NAME)  # INFERENCE_BACKEND=torch|onnx
+
+# Cross-encoder pairs from concurrent requests are scored in one predict call
+CROSS_ENCODER_PREDICT_BATCH_SIZE = int(os.getenv("CROSS_ENCODER_PREDICT_BATCH_SIZE", 64))
+
+def predict_pair_lists(pair_lists):
+    flat = [pair for pairs in pair_lists for pair in pairs]
+    scores = cross_encoder.predict(flat, batch_size=CROSS_ENCODER_PREDICT_BATCH_SIZE)
+    return split_results(scores, [len(pairs) for pairs in pair_lists])
+
+cross_batcher = MicroBatcher(
+    "cross_encoder",
+    predict_pair_lists,
+    max_batch_size=int(os.getenv("CROSS_ENCODER_BATCH_MAX_PAIRS", 512)),
+    max_wait_ms=float(os.getenv("CROSS_ENCODER_BATCH_MAX_WAIT_MS", 5)),
+    weight_fn=len,
+)
 
-# Milvus client
-milvus_client = get_milvus_client(uri=MILVUS_ENDPOINT, token=MILVUS_TOKEN)
+# Milvus client, or with SEARCH_BACKEND=local the in-process memory-mapped
+# replica exported by local_index.py (same search/get interface). The replica
+# keeps the float vectors only, so it always searches uncompressed; Milvus
+# searches follow the compression of the collection the alias points to.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "milvus")
+if SEARCH_BACKEND == "local":
+    milvus_client = LocalIndex(os.getenv("LOCAL_INDEX_DIR", "cache/local_index"))
+    SEARCH_COMPRESSION = "none"
+else:
+    milvus_client = get_milvus_client(uri=MILVUS_ENDPOINT, token=MILVUS_TOKEN)
+    SEARCH_COMPRESSION = None
 
 # Logging setup
 logging.basicConfig(
@@ -60,9 +211,21 @@ async def verify_api_key(api_key: str = Depends(api_key_header)):
 # Input model
 class Question(BaseModel):
     question: str
+    # Per-request Milvus search overrides; unset fields use the MILVUS_SEARCH_* defaults
+    ef: Optional[int] = Field(None, ge=1, le=4096)
+    limit: Optional[int] = Field(None, ge=1, le=1024)
+    group_size: Optional[int] = Field(None, ge=1, le=64)
 
+    def search_overrides(self) -> dict:
+        return {name: value for name, value in (("ef", self.ef), ("limit", self.limit), ("group_size", self.group_size))
+                if value is not None}
+
+class CacheInvalidation(BaseModel):
+    months: List[str] = []  # 'Month YYYY' dates that were (re)ingested; empty clears the whole cache
+
+@memoized_llm_call("clarify_query", version=1)
 def clarify_query(query):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
+    client = get_genai_client()
     curdate = strftime("%Y-%m", gmtime())
     google_search_tool = Tool(
         google_search = GoogleSearch()
@@ -130,8 +293,9 @@ def clarify_query(query):
     return response.text
 """
 
+@memoized_llm_call("fetch_date", version=1)
 def fetch_date(query):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
+    client = get_genai_client()
     curdate = strftime("%Y-%m", gmtime())
     response = client.models.generate_content(
         model="gemini-2.0-flash",
@@ -157,8 +321,9 @@ def fetch_date(query):
     query_date = response.text.strip()
     return query_date
 
+@memoized_llm_call("fetch_min_date", version=1)
 def fetch_min_date(query):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
+    client = get_genai_client()
     curdate = strftime("%Y-%m", gmtime())
     response = client.models.generate_content(
         model="gemini-2.0-flash",
@@ -205,40 +370,79 @@ def months_since(date_str, query_date='today'):
         print(f'Error parsing date: {e}')
         return 999
 
-def build_range_around_date(center_date_str, months_before, months_after, field_name="date"):
+def build_range_around_date(center_date_str, months_before, months_after, field_name="date_ord"):
     """
     Given a center date string like 'March 2024' and two integers (months_before, months_after),
     builds a Milvus filter expression for that range.
 
-    Assumes Milvus stores dates in the format 'Month YYYY' (e.g., 'March 2024').
+    Dates are matched on the integer month ordinal (year*12+month) the loader stores
+    next to the 'Month YYYY' string, so the window is a single range expression.
+    Returns the filter along with the center, start and end ordinals.
     """
-    if center_date_str == 'today':
-        center_date_str = datetime.today().strftime("%B %Y")
-    try:
-        center_date = datetime.strptime(center_date_str, "%B %Y")
-    except:
-        center_date_str = datetime.today().strftime("%B %Y")
-        center_date = datetime.strptime(center_date_str, "%B %Y")
+    today = datetime.today()
+    center = date_to_ordinal(center_date_str) or month_ordinal(today.year, today.month)
+    start, end = center - months_before, center + months_after
 
-    # Calculate start and end of the range
-    start_date = center_date - relativedelta(months=months_before)
-    end_date = center_date + relativedelta(months=months_after)
+    filter_expr = f"{field_name} >= {start} and {field_name} <= {end}"
+    return {"filter": filter_expr, "center": center, "start": start, "end": end}
+
+async def run_llm(fn, *args):
+    loop = asyncio.get_running_loop()
+    with stage_timer.span(f"gemini_{fn.__name__}"):
+        return await loop.run_in_executor(llm_executor, fn, *args)
+
+async def preprocess_query(query, deadline=None, degradations=None):
+    """
+    Clarifies the query and pulls its date range without blocking the event loop.
+    The max and min date lookups only depend on the clarified query, so they are
+    issued concurrently, and skipped entirely when the rule-based extractor can
+    resolve the dates locally.
+
+    With a deadline, whatever is not done once PREPROCESS_BUDGET_SHARE of it is
+    spent falls back: the raw query for the clarified one ("raw_query"), 'today'
+    and a 24 month window for the dates ("default_dates"). The fallbacks taken
+    are appended to degradations.
+
+    Returns (llm_query, query_date, window_size).
+    """
+    degradations = [] if degradations is None else degradations
 
-    # Generate the list of months
-    current = start_date
-    months = []
-    while current <= end_date:
-        months.append(current.strftime("%B %Y"))
-        current += relativedelta(months=1)
+    def time_left():
+        return None if deadline is None else deadline.until(PREPROCESS_BUDGET_SHARE)
 
-    # Build the filter expression
-    filters = [f'{field_name} == "{m}"' for m in months]
-    filter_expr = " or ".join(filters)
+    try:
+        llm_query = (await asyncio.wait_for(run_llm(clarify_query, query), time_left())).strip()
+    except asyncio.TimeoutError:
+        llm_query = query
+        degradations.append("raw_query")
 
-    return {"filter": filter_expr}
+    try:
+        extracted = extract_date_range(llm_query)
+        if extracted is not None:
+            query_min_date, query_date = extracted
+            logging.info("Dates resolved by rule-based extractor")
+        else:
+            try:
+                query_date, query_min_date = await asyncio.wait_for(asyncio.gather(
+                    run_llm(fetch_date, llm_query),
+                    run_llm(fetch_min_date, llm_query),
+                ), time_left())
+            except asyncio.TimeoutError:
+                degradations.append("default_dates")
+                raise
+            query_date = query_date.strip()
+            query_min_date = query_min_date.strip()
+        query_duration = abs(months_since(query_min_date,query_date))
+        window_size = max(24,6 + min(18, query_duration))
+        logging.info(f"Query min date: {query_min_date}, max date: {query_date}, Query duration is {query_duration}")
+    except:
+        query_date = 'today'
+        window_size = 24
+    return llm_query, query_date, window_size
 
+@memoized_llm_call("generalize_query", version=1)
 def generalize_query(query):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
+    client = get_genai_client()
     response = client.models.generate_content(
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
@@ -257,7 +461,7 @@ def generalize_query(query):
     return response.text
 
 def suggest_answer(query, excerpts):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
+    client = get_genai_client()
     response = client.models.generate_content(
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
@@ -291,123 +495,8 @@ def suggest_answer(query, excerpts):
     )
     return response.text
 
-def get_reference_url(ref: str) -> str:
-    if re.match(r"Inflation Expectations Survey of Households \w+ \d{4}", ref):
-        return "https://website.rbi.org.in/web/rbi/statistics/survey?category=24927098&categoryName=Inflation%20Expectations%20Survey%20of%20House-holds%20-%20Bi-monthly"
-    elif re.match(r"Monetary Policy Report \w+ \d{4}", ref):
-        return "https://website.rbi.org.in/web/rbi/publications/articles?category=24927873"
-    elif re.match(r"Minutes of the Monetary Policy Committee Meeting \w+ \d{4}", ref):
-        return "https://website.rbi.org.in/web/rbi/press-releases?q=%22Minutes+of+the+Monetary+Policy+Committee+Meeting%22"
-    elif re.match(r"CPI Press Release \w+ \d{4}", ref):
-        return "https://www.mospi.gov.in/archive/press-release?field_press_release_category_tid=120"
-    elif re.match(r"Economic Survey \d{4} ?- ?\d{4}", ref):
-        return "https://www.indiabudget.gov.in/economicsurvey/allpes.php"
-    elif re.match(r"IIP Press Release \w+ \d{4}", ref):
-        return "https://www.mospi.gov.in/archive/press-release?field_press_release_category_tid=121"
-    elif re.match(r"Monthly Economic Report \w+ \d{4}", ref):
-         return "https://dea.gov.in/monthly-economic-report-table"
-    elif re.match(r"RBI Bulletin \w+ \d{4}", ref):
-         return "https://rbi.org.in/Scripts/BS_ViewBulletin.aspx"
-    elif re.match(r"RBI State Finances \w+ \d{4}", ref):
-         return "https://rbi.org.in/Scripts/AnnualPublications.aspx?head=State%20Finances%20:%20A%20Study%20of%20Budgets"
-    elif re.match(r"RBI Handbook of Statistics On Indian States \w+ \d{4}", ref):
-         return "https://rbi.org.in/Scripts/AnnualPublications.aspx?head=Handbook+of+Statistics+on+Indian+States"
-    elif re.match(r"RBI Publications - Annual \d{4}", ref):
-         return "https://rbi.org.in/Scripts/Publications.aspx?publication=Annual"
-    elif re.match(r"RBI Publications - Half Yearly \w+ \d{4}", ref):
-         return "https://rbi.org.in/Scripts/Publications.aspx?publication=HalfYearly"
-    elif re.match(r"RBI Publications - Monthly \w+ \d{4}", ref):
-         return "https://rbi.org.in/Scripts/Publications.aspx?publication=Monthly"
-    elif 'Survey of Professional Forecasters on Macroeconomic Indicators' in ref:
-        return "https://rbi.org.in/Scripts/Publications.aspx?publication=BiMonthly"
-    elif re.match(r"RBI Publications Biennial \w+ \d{4}", ref):
-        return "https://rbi.org.in/Scripts/Publications.aspx?publication=Biennial"
-    elif re.match(r"Sources of Variation in India’s Foreign Exchange Reserves RBI Publications - Quaterly \w+ \w+ \d{4}", ref):
-        return "https://rbi.org.in/Scripts/Publications.aspx?publication=Quarterly"
-    elif re.match(r".+ - RBI Notifications \w+ \d{1,2}, \d{4}", ref):
-        return "https://rbi.org.in/Scripts/NotificationUser.aspx"
-    elif re.match(r"RBI - Occasional Papers - Vol\. \d{2}, No\. ?\d(?:,|:)? ?[A-Za-z]+ \d{1,2}, \d{4}", ref):
-        return "https://rbi.org.in/Scripts/HalfYearlyPublications.aspx?head=Occasional+Papers"
-    elif re.match(r"RBI WPS \(DEPR\): \d{2}/\d{4}: .+", ref):
-        return "https://rbi.org.in/Scripts/PublicationsView.aspx?head=Working%20Papers"
-    elif re.match(r"Measuring Productivity at the Industry Level – The India KLEMS Database \w+ \d{1,2}, \d{4}", ref):
-        return "https://rbi.org.in/Scripts/KLEMS.aspx"
-    elif re.match(r"RBI Publications - Weekly \d{1,2} \w+ \d{4}", ref):
-        return "https://rbi.org.in/Scripts/Publications.aspx?publication=Weekly"
-    elif re.match(r"RBI Publications - Reports .+ \d{1,2} \w+ \d{4}", ref):
-        return "https://rbi.org.in/Scripts/Publications.aspx?publication=Reports"
-    elif re.match(r"RBI Speeches - .+", ref):
-        return "https://rbi.org.in/Scripts/BS_ViewSpeeches.aspx"
-    elif re.match(r'DRG Study No\. \d{1,3}: .+ \w+ \d{1,2}, \d{4}', ref):
-        return "https://rbi.org.in/Scripts/Occas_DRG_Studies.aspx"
-    elif re.match(r".+ Press Release \w+ \d{1,2}, \d{4}", ref):
-        return "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"
-    elif re.match(r"Lending and Deposit Rates of Scheduled Commercial Banks – \w+ \d{4}", ref):
-        return "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"
-    elif re.match(r"Monthly Data on India’s International Trade in Services.+", ref):
-        return "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"
-    elif re.match(r"Scheduled Banks’ Statement of Position in India as on .+", ref):
-        return "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"
-    elif re.match(r"Sectoral Deployment of Bank Credit – \w+ \d{4}", ref):
-        return "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"
-    elif re.match(r"(THE\s+)?[A-Z][A-Za-z ’()\-]+(Act|Code), \d{4}", ref) or re.match(r".+Act, \d{4}", ref):
-        return "https://rbi.org.in/Scripts/Act.aspx"
-    elif re.match(r'.*Scheme, \d{4}$', ref):
-        return 'https://rbi.org.in/Scripts/Schemes.aspx'
-    elif re.match(r'.*Regulations, \d{4}$', ref):
-        return 'https://rbi.org.in/Scripts/Regulations.aspx'
-    elif re.match(r'.*Rules, \d{4}$', ref):
-        return 'https://rbi.org.in/Scripts/Rules.aspx'
-    # RBI Governor Speeches / Interviews / Press Conferences / Fireside Chats
-    elif re.match(r"(Edited\s+)?Transcript of the Reserve Bank of India’s Post-Monetary Policy Press Conference: \w+ \d{1,2}, \d{4}", ref, re.IGNORECASE):
-        return "https://rbi.org.in/Scripts/BS_SpeechesView.aspx"
-
-    elif re.match(r"Edited transcript of Reserve Bank of India’s Governor Press Conference with Media: \w+ \d{1,2}, \d{4}", ref, re.IGNORECASE):
-        return "https://rbi.org.in/Scripts/BS_SpeechesView.aspx"
-
-    elif re.match(r"(Fireside chat|Panel Discussion) with Governor.*on \w+ \d{1,2}, \d{4}", ref, re.IGNORECASE):
-        return "https://rbi.org.in/Scripts/BS_SpeechesView.aspx"
-
-    elif re.match(r"Interview of Governor.*on \w+ \d{1,2}, \d{4}", ref, re.IGNORECASE):
-        return "https://rbi.org.in/Scripts/BS_SpeechesView.aspx"
-
-    elif re.match(r"Master Direction(s)?( –| -)? .+", ref, re.IGNORECASE):
-        return "https://rbi.org.in/Scripts/BS_ViewMasterDirections.aspx"
-
-    elif re.match(r".*(Draft|draft|DRAFT).*(Circular|Direction|Guideline|Framework|Regulation|Instruction).* \w+ \d{1,2}, \d{4}", ref):
-        return "https://rbi.org.in/Scripts/DraftNotificationsGuildelines.aspx"
-    elif re.match(r"Master Circular(s)?( –|-)? (on )?.+ \w+ \d{1,2}, \d{4}", ref, re.IGNORECASE):
-        return "https://rbi.org.in/Scripts/BS_ViewMasterCirculardetails.aspx"
-    elif re.match(r".+ -? ?PIB \d{1,2} \w+ \d{4}", ref, re.IGNORECASE):
-        return "https://pib.gov.in/PressReleseDetail.aspx?PRID=2089308&reg=3&lang=1"
-    elif re.match(r"MSME ANNUAL REPORT( \d{4}-\d{2})?$", ref, re.IGNORECASE):
-        return "https://www.msme.gov.in/relatedlinks/annual-report-ministry-micro-small-and-medium-enterprises"
-    elif re.match(r"Ministry Wise Procurement \d{4}-\d{2}", ref):
-        return "https://sambandh.msme.gov.in/MinistryWisesReport.aspx"
-    elif re.match(r"RBI Report On Trend And Progress Of Banking In India \d{4}-\d{2}", ref):
-        return "https://www.rbi.org.in/Scripts/AnnualPublications.aspx?head=Trend+and+Progress+of+Banking+in+India"
-    elif re.match(r"\d+-Year GST Statistical Report", ref, re.IGNORECASE):
-        return "https://tutorial.gst.gov.in/offlineutilities/gst_statistics/6YearReport.pdf"
-    elif re.match(r"India Budget \d{4}-\d{4}", ref, re.IGNORECASE):
-        return "https://www.indiabudget.gov.in/doc/Budget_Speech.pdf"
-    elif re.match(r"Udyog Aadhar Registeration \d{4}-\d{4}", ref, re.IGNORECASE):
-        return "https://www.dcmsme.gov.in/uampublication.aspx"
-    elif re.match(r"Udyog Aadhar Registeration \w+ \d{4}", ref, re.IGNORECASE):
-        return "https://www.dcmsme.gov.in/uampublication.aspx"
-    elif re.match(r"MALAYSIA DEVELOPMENT EXPERIENCE SME \w+ \d{4}", ref, re.IGNORECASE):
-        return "https://documents1.worldbank.org/curated/en/504361583989615623/pdf/Malaysia-s-Experience-with-the-Small-and-Medium-Sized-Enterprises-Masterplan-Lessons-Learned.pdf"
-    elif re.match(r"Malaysian SME Program Efficiency Review \w+ \d{4}", ref, re.IGNORECASE):
-        return "https://documents1.worldbank.org/curated/en/099255003152238688/pdf/P17014606709a70f50856d0799328fb7040.pdf"
-    else:
-        return "Unknown Url"  # Default empty if no match
-
-def synthesize_with_gemini(
-    question: str,
-    unstructured_results: List[Dict]
-) -> str:
-    """
-    Synthesizes a final answer using Gemini-2.0-Flash based on unstructured sources.
-    """
+def synthesis_request(question: str, unstructured_results: List[Dict]):
+    """Gemini config and contents for synthesizing an answer from the reranked results."""
 
     # Format top results
     formatted_sources = ""
@@ -424,11 +513,8 @@ def synthesize_with_gemini(
         )
 
     # System instruction prompt without structured data logic
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        config=types.GenerateContentConfig(
-            system_instruction=dedent(f"""Based on the original question: {question}, and the following unstructured text data from various sources, synthesize a comprehensive and coherent answer. Integrate the information smoothly.
+    config = types.GenerateContentConfig(
+        system_instruction=dedent(f"""Based on the original question: {question}, and the following unstructured text data from various sources, synthesize a comprehensive and coherent answer. Integrate the information smoothly.
 
         **Formatting Instructions:**
         - Begin the final answer with this header: `## Insights from Ingested Data`
@@ -448,35 +534,334 @@ def synthesize_with_gemini(
         - If data is conflicting or ambiguous, acknowledge that transparently in the summary.
 
             """),
-            temperature=0.0,
-            ),
-        contents=formatted_sources
+        temperature=0.0,
+        )
+    return config, formatted_sources
+
+# Not memoized: the prompt carries the per-request results, so entries would
+# almost never be reused and would only grow the cache
+def synthesize_with_gemini(
+    question: str,
+    unstructured_results: List[Dict]
+) -> str:
+    """
+    Synthesizes a final answer using Gemini-2.0-Flash based on unstructured sources.
+    """
+    config, contents = synthesis_request(question, unstructured_results)
+    client = get_genai_client()
+    response = client.models.generate_content(
+        model="gemini-2.0-flash",
+        config=config,
+        contents=contents
     )
     return response.text
 
-
-# Search API Endpoint
-@app.post("/search-topN", dependencies=[Depends(verify_api_key)])
-async def search_topN_milvus(request: Request, question: Question):
+def stream_synthesis(question: str, unstructured_results: List[Dict], stop: threading.Event = None):
+    """
+    Streaming synthesize_with_gemini: yields the answer text as Gemini generates it.
+    Stops early once stop is set.
+    """
+    config, contents = synthesis_request(question, unstructured_results)
+    client = get_genai_client()
+    for chunk in client.models.generate_content_stream(model="gemini-2.0-flash", config=config, contents=contents):
+        if stop is not None and stop.is_set():
+            return
+        if chunk.text:
+            yield chunk.text
+
+
+@app.get("/stats", dependencies=[Depends(verify_api_key)])
+async def get_stats():
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "batching": {
+            "embed": embed_batcher.stats(),
+            "cross_encoder": cross_batcher.stats(),
+        },
+        "response_cache": response_cache.stats(),
+        "llm_calls": llm_cache.stats(),
+        "retrieval": {
+            "backend": SEARCH_BACKEND,
+            **({"local_index": milvus_client.snapshot.manifest} if SEARCH_BACKEND == "local" else {}),
+            "two_phase": TWO_PHASE_RETRIEVAL,
+            "vector_compression": SEARCH_COMPRESSION or collection_compression(milvus_client, CPI_V5_COLLECTION_NAME),
+            **{name: histogram.snapshot() for name, histogram in retrieval_metrics.items()},
+        },
+        "stages": stage_timer.snapshot(),
+        "admission": {"enabled": ADMISSION_ENABLED, **admission.stats()},
+        "degradations": dict(degradation_counts),
+        "requests": {
+            endpoint: {"in_flight": in_flight[endpoint], "latency_seconds": request_seconds[endpoint].snapshot()}
+            for endpoint in ENDPOINTS
+        },
+    }
+
+# No API key, so a stock Prometheus scrape job can read it. It only exposes
+# aggregate counters and latencies; keep the port off the public network.
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """/stats in the Prometheus text format."""
+    out = PrometheusText(prefix="retrieval_")
+    for stage, snapshot in stage_timer.snapshot().items():
+        out.histogram("stage_seconds", snapshot, {"stage": stage}, "Latency of each request stage")
+    for endpoint in ENDPOINTS:
+        out.sample("requests_in_flight", in_flight[endpoint], {"endpoint": endpoint},
+                   help_text="Requests being processed")
+        out.histogram("request_seconds", request_seconds[endpoint].snapshot(), {"endpoint": endpoint},
+                      "End-to-end request latency")
+    admission_stats = admission.stats()
+    out.sample("admission_running", admission_stats["running"], help_text="Requests holding an admission slot")
+    out.sample("admission_queue_depth", admission_stats["queued"], help_text="Requests waiting for a slot")
+    out.sample("admission_admitted_total", admission_stats["admitted"], kind="counter")
+    for reason in ["key_limit", "queue_full", "wait_budget"]:
+        out.sample("admission_rejected_total", admission_stats[f"rejected_{reason}"], {"reason": reason}, "counter",
+                   "Requests shed by admission control")
+    out.sample("admission_rejected_total", admission_stats["timed_out"], {"reason": "timed_out"}, "counter")
+    out.histogram("admission_queue_wait_seconds", admission_stats["queue_wait_seconds"])
+    for name in DEGRADATIONS:
+        out.sample("degradations_total", degradation_counts[name], {"kind": name}, "counter",
+                   "Requests that took a fallback to meet their deadline")
+    out.histogram("chunk_attempts", retrieval_metrics["chunk_attempts"].snapshot(),
+                  help_text="Date windows tried per query by the rerank relax loop")
+    for name in ["search_payload_bytes", "fetch_payload_bytes", "candidates", "relaxed_candidates", "fetched"]:
+        out.histogram(name, retrieval_metrics[name].snapshot())
+
+    for cache_name, stats in [("embedding", embedding_cache.stats()), ("response", response_cache.stats())]:
+        hits = stats["hits"] if "hits" in stats else stats["exact_hits"] + stats["near_hits"]
+        out.sample("cache_hits_total", hits, {"cache": cache_name}, "counter", "Cache hits")
+        out.sample("cache_misses_total", stats["misses"], {"cache": cache_name}, "counter", "Cache misses")
+        out.sample("cache_hit_ratio", stats["hit_ratio"], {"cache": cache_name}, help_text="Cache hit ratio")
+        out.sample("cache_entries", stats["entries"], {"cache": cache_name}, help_text="Cached entries")
+    for function, stats in llm_cache.stats().items():
+        labels = {"function": function}
+        for counter in ["hits", "misses", "coalesced", "errors"]:
+            out.sample(f"llm_calls_{counter}_total", stats[counter], labels, "counter")
+        out.sample("llm_calls_hit_ratio", stats["hit_ratio"], labels, help_text="Gemini call cache hit ratio")
+        out.histogram("llm_call_seconds", stats["latency_seconds"], labels, "Gemini call latency, cache hits included")
+    for batcher_name, batcher in [("embed", embed_batcher), ("cross_encoder", cross_batcher)]:
+        stats = batcher.stats()
+        labels = {"batcher": batcher_name}
+        out.sample("batcher_pending", stats["pending"], labels, help_text="Items waiting for a batch")
+        out.histogram("batcher_batch_size", stats["batch_size"], labels)
+        out.histogram("batcher_queue_wait_seconds", stats["queue_wait_seconds"], labels)
+        out.histogram("batcher_compute_seconds", stats["compute_seconds"], labels)
+    return PlainTextResponse(out.render(), media_type=PrometheusText.CONTENT_TYPE)
+
+@app.post("/cache/invalidate", dependencies=[Depends(verify_api_key)])
+async def invalidate_cache(invalidation: CacheInvalidation):
+    """
+    Called by the loader after ingesting documents for the given months. An empty
+    list (sent after a blue/green alias swap) drops every cached response, the
+    cached partition list and compression level, and rereads the local index
+    snapshot pointer.
+    """
+    if not invalidation.months:
+        clear_partition_cache()
+        if SEARCH_BACKEND == "local":
+            milvus_client.refresh(force=True)
+        return {"invalidated": response_cache.clear()}
+    ordinals = [date_to_ordinal(month) for month in invalidation.months]
+    unparseable = [month for month, ordinal in zip(invalidation.months, ordinals) if ordinal is None]
+    if unparseable:
+        raise HTTPException(status_code=422, detail=f"Expected 'Month YYYY' dates, got: {unparseable}")
+    removed = response_cache.invalidate_months(ordinals)
+    logging.info(f"Invalidated {removed} cached responses for months {invalidation.months}")
+    return {"invalidated": removed}
+
+def response_cache_usable(question):
+    # Responses searched with overridden parameters are neither served from nor stored in the cache
+    return RESPONSE_CACHE_ENABLED and not question.search_overrides()
+
+def question_date_window(question):
+    # The near-duplicate tier only matches questions whose explicit dates resolve to the same window
+    return extract_date_range(question.question)
+
+def cache_response(question, cache_month, question_vector, response, date_range):
+    if response_cache_usable(question):
+        response_cache.put(question.question, cache_month, question_vector, response, date_range["start"], date_range["end"],
+                           question_date_window(question))
+
+def query_date_range(query_date, window_size):
+    months_after = int(max(1,min(window_size,2)))
+    months_before = max(1,window_size - months_after)
+    return build_range_around_date(query_date, months_before, months_after)
+
+# The relax loop in select_top_results slides the date window towards older
+# documents. With RELAXED_WINDOW_SEARCH the date filter is split into disjoint
+# month ranges: the primary search (full limit) covers the initial window, and
+# each slice the loop can slide into, plus the rest of the filter, is searched
+# with a smaller limit, concurrently on milvus_executor. The loop then gets
+# candidates from those months instead of re-scoring the primary top hits.
+RELAXED_WINDOW_SEARCH = os.getenv("RELAXED_WINDOW_SEARCH", "true").lower() == "true"
+RELAXED_SEARCH_LIMIT = int(os.getenv("RELAXED_SEARCH_LIMIT", 10))
+milvus_executor = ThreadPoolExecutor(max_workers=int(os.getenv("MILVUS_SEARCH_WORKERS", 16)),
+                                     thread_name_prefix="milvus")
+
+def search_windows(date_range, window_size, limit=None):
+    """The date window's month ranges, primary first, as (filter, start_ord, end_ord, limit)."""
+    if not RELAXED_WINDOW_SEARCH:
+        return [(date_range["filter"], date_range["start"], date_range["end"], limit)]
+    ranges = split_date_filter(date_range["start"], date_range["end"], date_range["center"], window_size)
+    return [(f"date_ord >= {start} and date_ord <= {end}", start, end, limit if i == 0 else RELAXED_SEARCH_LIMIT)
+            for i, (start, end) in enumerate(ranges)]
+
+def search_window(query_vectors, window, overrides, timeout=None):
+    """One Milvus request for the query vectors under a window's filter and partitions."""
+    date_filter, start, end, limit = window
+    with stage_timer.span("partitions"):
+        partition_names = window_partitions(milvus_client, CPI_V5_COLLECTION_NAME, start, end)
+    return search_many(milvus_client, CPI_V5_COLLECTION_NAME, query_vectors, SEARCH_FIELDS, date_filter,
+                       partition_names, ef=overrides.get("ef"), limit=limit, group_size=overrides.get("group_size"),
+                       timeout=timeout, compression=SEARCH_COMPRESSION)
+
+def merge_hits(hit_lists):
+    """Union of the windows' hits, primary window first, each chunk once."""
+    seen = set()
+    merged = []
+    for hits in hit_lists:
+        for hit in hits:
+            if hit["id"] not in seen:
+                seen.add(hit["id"])
+                merged.append(hit)
+    return merged
+
+def prune_hits(hits, date_range, window_size):
+    """
+    Date ordinals of the hits and, in two-phase mode, only the hits some date window
+    can select. Returns (hits, doc_ords, rerank_window).
+    """
+    # Chunks written before the date_ord backfill fall back to parsing the date string
+    doc_ords = [hit["entity"].get("date_ord") or date_to_ordinal(hit["entity"]["date"]) for hit in hits]
+    if not TWO_PHASE_RETRIEVAL:
+        return list(hits), doc_ords, None
+    reachable, rerank_window = reachable_mask(doc_ords, date_range["center"], window_size)
+    return ([hit for hit, keep in zip(hits, reachable) if keep],
+            [doc_ord for doc_ord, keep in zip(doc_ords, reachable) if keep],
+            rerank_window)
+
+def fetch_entities(ids, timeout=None):
+    """Second phase: content and metadata of the surviving hits, in one get."""
+    fetch_start = time.time()
+    entities = fetch_by_ids(milvus_client, CPI_V5_COLLECTION_NAME, list(dict.fromkeys(ids)), FETCH_FIELDS, timeout)
+    fetch_time = time.time() - fetch_start
+    stage_timer.observe("fetch", fetch_time)
+    retrieval_metrics["fetch_seconds"].observe(fetch_time)
+    retrieval_metrics["fetch_payload_bytes"].observe(estimate_payload_bytes(entities.values()))
+    retrieval_metrics["fetched"].observe(len(entities))
+    logging.info(f"Fetched {len(entities)} candidates in {fetch_time:.4f} seconds")
+    return entities
+
+def build_candidates(hits, doc_ords, entities=None):
+    """Result dicts for the hits (merged with their fetched entities in two-phase mode) and their date ordinals."""
+    candidates = []
+    candidate_ords = []
+    for hit, doc_ord in zip(hits, doc_ords):
+        entity = hit["entity"]
+        if entities is not None:
+            if hit["id"] not in entities:
+                continue  # Deleted between the two phases
+            entity = {**entity, **entities[hit["id"]]}
+        candidates.append({
+            "content": entity["content"],
+            "distance": hit["distance"],
+            "source": entity["source"],
+            "page": entity["page"],
+            "reference": entity["reference"],
+            "date": entity["date"]
+        })
+        candidate_ords.append(doc_ord)
+    return candidates, candidate_ords
+
+def select_top_results(candidates, scores, doc_ords, date_range, window_size, rerank_window):
+    """Date-window penalty, cross_thresh filter and window relaxation, vectorized. Returns (results, selection)."""
+    selection = {"indices": [], "scores": [], "chunk_attempt": 0, "window": rerank_window}
+    if candidates:
+        with stage_timer.span("rerank"):
+            selection = select_results(scores, doc_ords, date_range["center"], window_size, window=rerank_window)
+    chunk_attempt = selection["chunk_attempt"]
+    retrieval_metrics["chunk_attempts"].observe(chunk_attempt)
+    if chunk_attempt > 1:
+        logging.warning(f"No valid results in the initial date window, relaxed {chunk_attempt - 1} time(s)")
+    logging.info("Deltas being used: " + str(selection["window"]))
+
+    results = []
+    with stage_timer.span("reference_urls"):
+        for index, score in zip(selection["indices"], selection["scores"]):
+            item = candidates[index]
+            item["cross_score"] = float(score)
+            # Attach the reference URL
+            item["url"] = get_reference_url(item["reference"])
+            results.append(item)
+    return results, selection
+
+def rerank_prefix(candidates, doc_ords, deadline):
+    """
+    The candidates the cross-encoder can score before the deadline: all of them,
+    or the RERANK_MIN_CANDIDATES or more closest by vector distance, in their
+    original order. Returns (candidates, doc_ords, truncated).
+    """
+    available = deadline.remaining() - RERANK_RESERVE_SECONDS
+    if cross_encode_cost.seconds(len(candidates)) <= available:
+        return candidates, doc_ords, False
+    keep = max(RERANK_MIN_CANDIDATES, cross_encode_cost.units_within(max(0.0, available)))
+    if keep >= len(candidates):
+        return candidates, doc_ords, False
+    closest = sorted(sorted(range(len(candidates)), key=lambda i: candidates[i]["distance"], reverse=True)[:keep])
+    logging.info(f"Cross-encoding {keep} of {len(candidates)} candidates, {available:.3f}s left")
+    return [candidates[i] for i in closest], [doc_ords[i] for i in closest], True
+
+def build_response(question_text, llm_query, query_date, top_5_final, total_time, degradations=None):
+    if not top_5_final:
+        top_5_final = [{
+            "content": "We could not find any relevant content related to your query.",
+            "distance": "N/A",
+            "source": "N/A",
+            "page": "N/A",
+            "reference": "N/A",
+            "date": "N/A",
+            "url": "N/A"
+        }]
+    return {
+        "question": question_text,
+        "llm_query": llm_query,
+        "query_date": query_date,
+        "retrieved_results": top_5_final,
+        "time": total_time,
+        "degradations": degradations or [],
+    }
+
+async def cached_response(question):
+    """Exact then near-duplicate response cache lookup. Returns (cached response or None, question vector)."""
+    cache_month = strftime("%Y-%m", gmtime())
+    question_vector = None
+    cached = None
+    if response_cache_usable(question):
+        date_window = question_date_window(question)
+        near = response_cache.near_enabled and date_window is not None
+        cached = response_cache.get_exact(question.question, cache_month, near)
+        if cached is None and near:
+            question_vector = await aemb_text(ResponseCache.normalize(question.question))
+            cached = response_cache.get_similar(question_vector, cache_month, date_window)
+    return cached, question_vector
+
+async def search_question(question: Question, client_ip: str, deadline: Deadline = None):
+    """Retrieval and reranking behind /search-topN and /answer."""
     start_time = time.time()
+    deadline = deadline or Deadline(REQUEST_DEADLINE_SECONDS)
+    degradations = []
     request_time = datetime.utcnow().isoformat()
 
-    llm_query = clarify_query(question.question).strip()
+    # Repeated and near-duplicate questions are answered from the response cache
+    cache_month = strftime("%Y-%m", gmtime())
+    with stage_timer.span("cache_lookup"):
+        cached, question_vector = await cached_response(question)
+    if cached is not None:
+        logging.info(f"Response cache hit for question: {question.question}")
+        return {**cached, "question": question.question, "time": time.time() - start_time}
 
-    try:
-        query_date = fetch_date(llm_query).strip()
-        query_min_date = fetch_min_date(llm_query).strip()
-        query_duration = abs(months_since(query_min_date,query_date))
-        window_size = max(24,6 + min(18, query_duration))
-        logging.info(f"Query min date: {query_min_date}, max date: {query_date}, Query duration is {query_duration}")
-    except:
-        query_date = 'today'
-        window_size = 24
-    months_after = int(max(1,min(window_size,2)))
-    months_before = max(1,window_size - months_after)
-    milvus_date_filter = build_range_around_date(query_date, months_before, months_after)["filter"]
-
-    client_ip = request.client.host  # Get client IP address
+    with stage_timer.span("preprocess"):
+        llm_query, query_date, window_size = await preprocess_query(question.question, deadline, degradations)
+    date_range = query_date_range(query_date, window_size)
 
     logging.info(f"Received request from {client_ip} at {request_time}")
     logging.info(f"Question Asked: {question.question}")
@@ -492,37 +877,48 @@ async def search_topN_milvus(request: Request, question: Question):
 
         # Start embedding generation
         embed_start = time.time()
-        query_vector = emb_text(model, llm_query)#; logging.info(query_vector)
+        query_vector = await aemb_text(llm_query)#; logging.info(query_vector)
         embed_time = time.time() - embed_start
+        stage_timer.observe("embed", embed_time)
 
         logging.info(f"Embedding generation time: {embed_time:.4f} seconds")
 
-        # Search in Milvus
+        # Search the primary and relaxed date windows in Milvus, concurrently
         search_start = time.time()
-        search_res = get_search_results(
-            milvus_client, CPI_V5_COLLECTION_NAME, query_vector, ["content", "source", "id", "page", "reference", "date"],
-            milvus_date_filter
-        )
+        overrides = question.search_overrides()
+        windows = search_windows(date_range, window_size, overrides.get("limit"))
+        timeout = deadline.timeout(MILVUS_MIN_TIMEOUT_SECONDS)
+        loop = asyncio.get_running_loop()
+        search_res = await asyncio.gather(*(
+            loop.run_in_executor(milvus_executor, search_window, [query_vector], window, overrides, timeout)
+            for window in windows
+        ))
+        window_hits = [res[0] if res else [] for res in search_res]
+        merged_hits = merge_hits(window_hits)
         search_time = time.time() - search_start
+        stage_timer.observe("search", search_time)
         logging.info(f"Milvus search execution time: {search_time:.4f} seconds")
-        logging.info(f"Document search date filter: {milvus_date_filter}")
+        logging.info(f"Document search date filters: {[window[0] for window in windows]}, "
+                     f"hits per window: {[len(hits) for hits in window_hits]}")
 
-        if not search_res or not search_res[0]:
+        if not merged_hits:
             logging.warning("No results found for query")
             raise HTTPException(status_code=404, detail="No results found")
 
-        # Retrieve the top results
-        top_15 = [
-            {
-                "content": result["entity"]["content"],
-                "distance": result["distance"],
-                "source": result["entity"]["source"],
-                "page": result["entity"]["page"],
-                "reference": result["entity"]["reference"],
-                "date": result["entity"]["date"]
-            }
-            for result in search_res[0]
-        ]
+        retrieval_metrics["search_seconds"].observe(search_time)
+        retrieval_metrics["search_payload_bytes"].observe(estimate_payload_bytes(merged_hits))
+        retrieval_metrics["candidates"].observe(len(merged_hits))
+        retrieval_metrics["relaxed_candidates"].observe(len(merged_hits) - len(window_hits[0]))
+
+        # Drop candidates no date window can select, then fetch the rest in one get
+        with stage_timer.span("prune"):
+            hits, doc_ords, rerank_window = prune_hits(merged_hits, date_range, window_size)
+        entities = (fetch_entities([hit["id"] for hit in hits], deadline.timeout(MILVUS_MIN_TIMEOUT_SECONDS))
+                    if TWO_PHASE_RETRIEVAL else None)
+        top_15, doc_ords = build_candidates(hits, doc_ords, entities)
+        top_15, doc_ords, truncated = rerank_prefix(top_15, doc_ords, deadline)
+        if truncated:
+            degradations.append("rerank_prefix")
 
         # Log Top 15
         logging.info("Top 100 sources before reranking:")
@@ -534,106 +930,284 @@ async def search_topN_milvus(request: Request, question: Question):
 
         #  Rerank with CrossEncoder
         pairs = [(llm_query, item["content"]) for item in top_15]
-        scores = cross_encoder.predict(pairs)
-        # Let's assume each item in top_15 has a "date" field
-        #date_boosts = [0.5 * months_since(item["date"],query_date) for item in top_15]
-        deltas   = [(months_since(item["date"],query_date)) for item in top_15] # Signed deltas, positive = older and negative = newer than query date
-        if min(deltas) > 0:
-            # Date is too recent, we do not have matching documents
-            maxdelta = min(deltas)
-        else:
-            # We have at least one document matching the query date
-            if max(deltas) < 0:
-                # Date is too old, we do not have documents that old
-                maxdelta = max(deltas)
-            else:
-                maxdelta = 0
-        maxdelta += 0.5*window_size
-        mindelta = maxdelta - window_size
-        chunks_found = False
-        chunk_attempt = 0
-        top_5_final = []
-        while ((not chunks_found) and (chunk_attempt < 2) and (len(top_5_final) < 3)):
-            chunk_attempt += 1
-            logging.info("Deltas being used: " + str([mindelta,maxdelta]))
-            #logging.info("Computed deltas")
-            #logging.info(deltas)
-            date_boosts = [0 if maxdelta >= deltas[xx] >= mindelta else 25 for xx in range(len(deltas))]
-
-            # Add boosted scores to the cross_encoder scores
-            #logging.info("Original scores: " + str(scores))
-            final_scores = [s - boost for s, boost in zip(scores, date_boosts)]
-            #logging.info("Modified scores: " + str(final_scores))
-
-            # Now rerank based on the final boosted score
-            reranked = sorted(
-            zip(top_15, final_scores),
-            key=lambda x: x[1],
-            reverse=True
-            )
-
-            # Top 5 with cross_score filtering
-            top_5_final = []
-            content_concat = []
-            cross_thresh = 3.0
-            best_relevance = cross_thresh
-            for item, score in reranked[:6]:
-                item["cross_score"] = float(score)
-                if (item["cross_score"] > cross_thresh) and (item["cross_score"] >= 0.9*best_relevance):  # Only include results where cross_score > threshold
-                    # Attach the reference URL
-                    item["url"] = get_reference_url(item["reference"])
-                    top_5_final.append(item)
-                    content_concat += item["content"]
-                    #best_relevance = max(best_relevance,item["cross_score"])
-
-            if not top_5_final:
-                logging.warning("Not enough valid results found in current attempt: (" + str(len(top_5_final)) + "/5). Relaxing cross score and deltas ..")
-                mindelta += 6
-                maxdelta += 6
-            else:
-                chunks_found = True
+        cross_start = time.perf_counter()
+        with stage_timer.span("cross_encode"):
+            scores = await cross_batcher.submit(pairs) if pairs else []
+        cross_encode_cost.observe(time.perf_counter() - cross_start, len(pairs))
+        top_5_final, selection = select_top_results(top_15, scores, doc_ords, date_range, window_size, rerank_window)
 
         # Check if no valid results with cross_score > 0 were found
 
         if not top_5_final:
             logging.warning("No valid results with cross_score > 0")
-            total_time = time.time() - start_time
-            logging.info(f"Total processing time: {total_time:.4f} seconds")
-            return {
-                "question": question.question,
-                "llm_query": llm_query,
-                "query_date": query_date,
-                "retrieved_results": [{
-                    "content": "We could not find any relevant content related to your query.",
-                    "distance": "N/A",
-                    "source": "N/A",
-                    "page": "N/A",
-                    "reference": "N/A",
-                    "date": "N/A",
-                    "url": "N/A"
-                }],
-                "time": total_time,
-            }
         else:
             # Log Top 5
             logging.info("Top 5 results after reranking:")
             for i, res in enumerate(top_5_final, start=1):
                 logging.info(
                     f"{i}. Content: {res['content'][:200]}..., Page: {res['page']}, "
-                    f"Source: {res['source']}, Reference: {res['reference']}, Date: {item['date']}, Distance: {res['distance']:.4f}, Cross Score: {res['cross_score']:.4f}"
+                    f"Source: {res['source']}, Reference: {res['reference']}, Date: {res['date']}, Distance: {res['distance']:.4f}, Cross Score: {res['cross_score']:.4f}"
                 )
-            total_time = time.time() - start_time
-            logging.info(f"Total processing time: {total_time:.4f} seconds")
-            return {
-                "question": question.question,
-                "llm_query": llm_query,
-                "query_date": query_date,
-                "retrieved_results": top_5_final,
-                "time": total_time,
-            }
-
+        total_time = time.time() - start_time
+        logging.info(f"Total processing time: {total_time:.4f} seconds")
+        response = build_response(question.question, llm_query, query_date, top_5_final, total_time, degradations)
+        record_degradations(degradations)
+        if not degradations:
+            cache_response(question, cache_month, question_vector, response, date_range)
+        return response
 
     except Exception as e:
         error_message = f"Error processing request: {str(e)}"
         logging.error(error_message, exc_info=True)
-        raise HTTPException(status_code=500, detail=error_message)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_message)
+
+# Search API Endpoint
+@app.post("/search-topN")
+async def search_topN_milvus(request: Request, question: Question, api_key: str = Depends(verify_api_key)):
+    deadline = Deadline(REQUEST_DEADLINE_SECONDS)  # Time queued for admission counts against it
+    with request_trace("search"):
+        async with admitted(request, api_key):
+            return await search_question(question, request.client.host, deadline)
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def synthesis_tokens(question: str, results: List[Dict]):
+    """
+    Async iterator over stream_synthesis, which runs on the LLM pool. Tokens are
+    handed over as Gemini produces them; if the consumer goes away (client
+    disconnect) the worker stops at the next chunk.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for text in stream_synthesis(question, results, stop):
+                loop.call_soon_threadsafe(queue.put_nowait, text)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    loop.run_in_executor(llm_executor, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # The worker notices at its next chunk; nothing waits for it
+
+# Answer API Endpoint: the reranked results are sent as soon as retrieval is done
+# (time to first byte is retrieval latency), then the synthesized answer streams
+# in as Server-Sent Events:
+#
+#     event: results  data: the /search-topN response
+#     event: token    data: {"text": "..."}  (repeated)
+#     event: done     data: {"answer": "<full text or null>", "time": ...}
+#     event: error    data: {"detail": "..."}  (instead of done if synthesis fails)
+@app.post("/answer")
+async def answer(request: Request, question: Question, api_key: str = Depends(verify_api_key)):
+    start_time = time.time()
+    deadline = Deadline(REQUEST_DEADLINE_SECONDS)
+    # Retrieval errors are still plain HTTP errors: nothing has been streamed yet.
+    # Only retrieval holds an admission slot; the synthesis stream waits on Gemini.
+    with request_trace("answer"):
+        async with admitted(request, api_key):
+            response = await search_question(question, request.client.host, deadline)
+    results = [result for result in response["retrieved_results"] if result["reference"] != "N/A"]
+
+    async def events():
+        with request_trace("answer_stream"):
+            async for event in answer_events():
+                yield event
+
+    async def answer_events():
+        yield sse_event("results", response)
+        if not results:
+            yield sse_event("done", {"answer": None, "time": time.time() - start_time})
+            return
+        parts = []
+        synthesis_start = time.time()
+        try:
+            async for text in synthesis_tokens(question.question, results):
+                if not parts:
+                    stage_timer.observe("synthesis_first_token", time.time() - synthesis_start)
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            logging.error(f"Answer synthesis failed: {e}", exc_info=True)
+            yield sse_event("error", {"detail": f"Error synthesizing answer: {str(e)}"})
+            return
+        stage_timer.observe("synthesis", time.time() - synthesis_start)
+        total_time = time.time() - start_time
+        logging.info(f"Answer streamed in {total_time:.4f} seconds")
+        yield sse_event("done", {"answer": "".join(parts), "time": total_time})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Batch search: questions share the Gemini pool, embedding batches, one Milvus
+# search per distinct date window and partition set, one get for all survivors
+# and coalesced cross-encoder predicts. A batch holds a single admission slot, so
+# it is kept small, runs at most BATCH_PREPROCESS_CONCURRENCY Gemini
+# preprocessings at a time and gets its own deadline.
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", 64))
+BATCH_SEARCH_MAX_VECTORS = int(os.getenv("BATCH_SEARCH_MAX_VECTORS", 64))  # per Milvus search request
+BATCH_PREPROCESS_CONCURRENCY = int(os.getenv("BATCH_PREPROCESS_CONCURRENCY", 8))
+BATCH_DEADLINE_SECONDS = float(os.getenv("BATCH_DEADLINE_SECONDS", 30))
+
+class QuestionBatch(BaseModel):
+    questions: List[str]
+    ef: Optional[int] = Field(None, ge=1, le=4096)
+    limit: Optional[int] = Field(None, ge=1, le=1024)
+    group_size: Optional[int] = Field(None, ge=1, le=64)
+
+@app.post("/search-topN/batch")
+async def search_topN_batch(request: Request, batch: QuestionBatch, api_key: str = Depends(verify_api_key)):
+    deadline = Deadline(BATCH_DEADLINE_SECONDS)
+    with request_trace("batch"):
+        async with admitted(request, api_key):
+            return await search_batch(batch, deadline)
+
+async def search_batch(batch: QuestionBatch, deadline: Deadline = None):
+    """
+    Runs /search-topN for every question in one call. Results come back in the
+    order of the questions, each in the /search-topN response shape, or as
+    {"question", "error", "status_code"} when that question failed; a failure in
+    one question's preprocessing, search, fetch or rerank only fails the
+    questions it touched.
+    """
+    start_time = time.time()
+    deadline = deadline or Deadline(BATCH_DEADLINE_SECONDS)
+    if not batch.questions:
+        raise HTTPException(status_code=422, detail="questions must not be empty")
+    if len(batch.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    overrides = {"ef": batch.ef, "limit": batch.limit, "group_size": batch.group_size}
+    questions = [Question(question=text, **overrides) for text in batch.questions]
+    results = [None] * len(questions)
+    cache_month = strftime("%Y-%m", gmtime())
+    loop = asyncio.get_running_loop()
+
+    lookups = await asyncio.gather(*(cached_response(question) for question in questions))
+    pending = []
+    for i, (cached, _) in enumerate(lookups):
+        if cached is not None:
+            results[i] = {**cached, "question": questions[i].question, "time": time.time() - start_time}
+        else:
+            pending.append(i)
+    logging.info(f"Batch of {len(questions)} questions, {len(questions) - len(pending)} answered from the response cache")
+
+    # Gemini preprocessing runs on llm_executor, embeddings through embed_batcher
+    preprocess_slots = asyncio.Semaphore(BATCH_PREPROCESS_CONCURRENCY)
+    degradations = [[] for _ in pending]
+
+    async def prepare(slot):
+        async with preprocess_slots:
+            llm_query, query_date, window_size = await preprocess_query(
+                questions[pending[slot]].question, deadline, degradations[slot])
+        return (llm_query, query_date, window_size), await aemb_text(llm_query)
+
+    errors = {}
+    preprocessed, vectors, date_ranges = [None] * len(pending), [None] * len(pending), [None] * len(pending)
+    for slot, outcome in enumerate(await asyncio.gather(*(prepare(slot) for slot in range(len(pending))),
+                                                        return_exceptions=True)):
+        if isinstance(outcome, BaseException):
+            logging.error(f"Batch preprocessing failed for {questions[pending[slot]].question!r}: {outcome!r}")
+            errors[slot] = f"Error processing request: {str(outcome)}"
+            continue
+        preprocessed[slot], vectors[slot] = outcome
+        date_ranges[slot] = query_date_range(preprocessed[slot][1], preprocessed[slot][2])
+
+    # Questions with the same date window (primary or relaxed) search together in
+    # multi-vector requests
+    search_overrides = questions[0].search_overrides()
+    query_windows = [search_windows(date_range, preprocessed[slot][2], search_overrides.get("limit"))
+                     if date_range is not None else [] for slot, date_range in enumerate(date_ranges)]
+    groups = {}
+    for slot, windows in enumerate(query_windows):
+        for position, window in enumerate(windows):
+            groups.setdefault(window, []).append((slot, position))
+
+    timeout = deadline.timeout(MILVUS_MIN_TIMEOUT_SECONDS)
+    requests = []
+    for window, members in groups.items():
+        for chunk_start in range(0, len(members), BATCH_SEARCH_MAX_VECTORS):
+            chunk = members[chunk_start:chunk_start + BATCH_SEARCH_MAX_VECTORS]
+            requests.append((chunk, loop.run_in_executor(
+                milvus_executor, search_window, [vectors[slot] for slot, _ in chunk], window, search_overrides,
+                timeout)))
+    search_start = time.time()
+    window_hits = [[[] for _ in windows] for windows in query_windows]
+    for chunk, future in requests:
+        try:
+            for (slot, position), hits in zip(chunk, await future):
+                window_hits[slot][position] = hits
+        except Exception as e:
+            logging.error(f"Batch search request for {len(chunk)} queries failed: {e}", exc_info=True)
+            errors.update((slot, f"Error processing request: {str(e)}") for slot, _ in chunk)
+    logging.info(f"Batch search: {len(pending)} queries in {len(requests)} Milvus requests, {time.time() - search_start:.4f} seconds")
+
+    hit_lists = [merge_hits(hits) for hits in window_hits]
+    pruned = []
+    for slot, hits in enumerate(hit_lists):
+        if hits and slot not in errors:
+            retrieval_metrics["search_payload_bytes"].observe(estimate_payload_bytes(hits))
+            retrieval_metrics["candidates"].observe(len(hits))
+            retrieval_metrics["relaxed_candidates"].observe(len(hits) - len(window_hits[slot][0]))
+            pruned.append(prune_hits(hits, date_ranges[slot], preprocessed[slot][2]))
+        else:
+            pruned.append(None)
+    entities = None
+    if TWO_PHASE_RETRIEVAL:
+        try:
+            entities = await loop.run_in_executor(
+                None, fetch_entities, [hit["id"] for entry in pruned if entry for hit in entry[0]],
+                deadline.timeout(MILVUS_MIN_TIMEOUT_SECONDS))
+        except Exception as e:
+            logging.error(f"Batch fetch failed: {e}", exc_info=True)
+            for slot, entry in enumerate(pruned):
+                if entry:
+                    errors[slot] = f"Error processing request: {str(e)}"
+                    pruned[slot] = None
+
+    candidate_lists = [build_candidates(entry[0], entry[1], entities) if entry else ([], []) for entry in pruned]
+    pair_lists = [[(preprocessed[slot][0], item["content"]) for item in candidates]
+                  for slot, (candidates, _) in enumerate(candidate_lists)]
+    # The micro-batcher packs these into predict calls of up to CROSS_ENCODER_BATCH_MAX_PAIRS pairs
+    score_lists = await asyncio.gather(*(cross_batcher.submit(pairs) if pairs else asyncio.sleep(0, result=[])
+                                         for pairs in pair_lists), return_exceptions=True)
+
+    for slot, i in enumerate(pending):
+        question = questions[i]
+        if isinstance(score_lists[slot], BaseException) and slot not in errors:
+            logging.error(f"Batch rerank failed for {question.question!r}: {score_lists[slot]!r}")
+            errors[slot] = f"Error processing request: {str(score_lists[slot])}"
+        if slot in errors:
+            results[i] = {"question": question.question, "error": errors[slot], "status_code": 500}
+            continue
+        if not hit_lists[slot]:
+            results[i] = {"question": question.question, "error": "No results found", "status_code": 404}
+            continue
+        llm_query, query_date, window_size = preprocessed[slot]
+        candidates, doc_ords = candidate_lists[slot]
+        top_5_final, _ = select_top_results(candidates, score_lists[slot], doc_ords, date_ranges[slot], window_size,
+                                            pruned[slot][2])
+        response = build_response(question.question, llm_query, query_date, top_5_final, time.time() - start_time,
+                                  degradations[slot])
+        record_degradations(degradations[slot])
+        if not degradations[slot]:
+            cache_response(question, cache_month, lookups[i][1], response, date_ranges[slot])
+        results[i] = response
+
+    total_time = time.time() - start_time
+    logging.info(f"Batch of {len(questions)} questions processed in {total_time:.4f} seconds")
+    return {"results": results, "time": total_time}
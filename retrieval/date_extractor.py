@@ -0,0 +1,212 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# Rule-based fast path in front of fetch_date / fetch_min_date. Resolves the
+# explicit periods that make up most of our questions without a Gemini call and
+# returns None when it cannot, so the caller falls back to the LLM.
+
+MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7, "aug": 8,
+    "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15,
+    "eighteen": 18, "twenty": 20, "thirty": 30, "couple of": 2, "few": 3,
+}
+
+UNIT_MONTHS = {"month": 1, "quarter": 3, "year": 12, "decade": 120}
+
+_MONTH = r"(?P<month>" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")"
+_NUMBER = r"(?P<n>\d{1,2}|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")"
+_FY = r"FY\s*'?(?P<fy>\d{4}|\d{2})(?:\s*[-–/]\s*(?P<fy_end>\d{4}|\d{2}))?"
+
+MONTH_YEAR_RE = re.compile(r"\b" + _MONTH + r"\.?,?\s*(?:'(?P<yy>\d{2})\b|(?P<year>(?:19|20)\d{2})\b)", re.IGNORECASE)
+QUARTER_RE = re.compile(r"\bQ(?P<q>[1-4])\s*(?:of\s+)?(?:" + _FY + r"|(?P<year>(?:19|20)\d{2})(?:\s*[-–/]\s*(?P<year_end>\d{4}|\d{2}))?)", re.IGNORECASE)
+HALF_RE = re.compile(r"\bH(?P<h>[12])\s*(?:of\s+)?(?:" + _FY + r"|(?P<year>(?:19|20)\d{2})(?:\s*[-–/]\s*(?P<year_end>\d{4}|\d{2}))?)", re.IGNORECASE)
+FY_RE = re.compile(r"\b" + _FY + r"\b", re.IGNORECASE)
+SPLIT_YEAR_RE = re.compile(r"\b(?P<start>(?:19|20)\d{2})\s*[-–/]\s*(?P<end>(?:19|20)?\d{2})\b")
+# A bare 19xx/20xx is only read as a calendar year after a date cue ("in 2023",
+# "since 2019", "calendar year 2024", "between 2019 and 2021"); "top 2000 companies"
+# is left to the LLM
+_YEAR_CUE = r"(?:\b(?:in|for|of|during|since|from|after|before|between|to|till|until|through|by|and|or|vs\.?|versus|(?:calendar\s+)?year)\s+|\bCY\s*)"
+YEAR_RE = re.compile(_YEAR_CUE + r"(?P<year>(?:19|20)\d{2})\b", re.IGNORECASE)
+RELATIVE_RE = re.compile(r"\b(?P<kind>last|past|previous|preceding|recent|trailing)\s+(?:" + _NUMBER + r"\s+)?(?P<unit>month|quarter|year|decade)s?\b", re.IGNORECASE)
+SINCE_RE = re.compile(r"\b(?:since|from|after)\s*$", re.IGNORECASE)
+UNTIL_RE = re.compile(r"\b(?:to|till|until|through|and)\s*$", re.IGNORECASE)
+LATEST_RE = re.compile(r"\b(?:latest|current|currently|today|now|this month|most recent|recently)\b", re.IGNORECASE)
+
+
+def month_ordinal(year: int, month: int) -> int:
+    """Integer month index (year*12+month), so month differences are plain subtraction."""
+    return year * 12 + month
+
+
+def ordinal_to_date(ordinal: int) -> str:
+    """Inverse of month_ordinal, formatted the way Milvus stores dates ('%B %Y')."""
+    year, month = divmod(ordinal - 1, 12)
+    return datetime(year, month + 1, 1).strftime("%B %Y")
+
+
+def date_to_ordinal(date_str: str) -> Optional[int]:
+    """Month ordinal of a '%B %Y' date string ('today' is the current month); None if unparseable."""
+    if date_str == 'today':
+        today = datetime.today()
+        return month_ordinal(today.year, today.month)
+    return _parse_month_ordinal(date_str)
+
+
+@lru_cache(maxsize=4096)
+def _parse_month_ordinal(date_str: str) -> Optional[int]:
+    try:
+        date_obj = datetime.strptime(date_str.strip(), '%B %Y')
+    except (ValueError, AttributeError):
+        return None
+    return month_ordinal(date_obj.year, date_obj.month)
+
+
+def _full_year(value: str, century_from: int = 2000) -> int:
+    return int(value) if len(value) == 4 else century_from + int(value)
+
+
+def _fiscal_start_year(match) -> int:
+    # FY25 / FY2025 is April 2024 - March 2025; FY 2024-25 names the start year explicitly
+    if match.group("fy_end"):
+        return _full_year(match.group("fy"))
+    return _full_year(match.group("fy")) - 1
+
+
+def _period_start_year(match) -> int:
+    # "Q3 2022" and "H1 2024-25" are read as Indian fiscal years starting in April of that year
+    if match.group("fy"):
+        return _fiscal_start_year(match)
+    return int(match.group("year"))
+
+
+def _fiscal_span(start_year: int, first_month: int, length: int) -> Tuple[int, int]:
+    # first_month counts from April (0 = April)
+    start = month_ordinal(start_year, 4) + first_month
+    return start, start + length - 1
+
+
+def _scan(text: str, current: int):
+    """
+    Yields (position, start_ordinal, end_ordinal, is_relative) for every period found in text,
+    in the order they appear.
+    Matched spans are blanked out so e.g. the year in "Q3 2022" is not read twice.
+    """
+    spans = []
+
+    def consume(regex, handler, group=0):
+        # group is the part of the match that names the period; a leading cue is left in place
+        nonlocal text
+        for match in regex.finditer(text):
+            period = handler(match)
+            if period is None:
+                continue
+            start = match.start(group)
+            spans.append((start, period))
+            text = text[:start] + " " * (match.end() - start) + text[match.end():]
+
+    def month_year(match):
+        year = int(match.group("year")) if match.group("year") else _full_year(match.group("yy"))
+        ordinal = month_ordinal(year, MONTHS[match.group("month").lower()])
+        return ordinal, ordinal, False
+
+    def quarter(match):
+        start, end = _fiscal_span(_period_start_year(match), 3 * (int(match.group("q")) - 1), 3)
+        return start, end, False
+
+    def half(match):
+        start, end = _fiscal_span(_period_start_year(match), 6 * (int(match.group("h")) - 1), 6)
+        return start, end, False
+
+    def fiscal_year(match):
+        start, end = _fiscal_span(_fiscal_start_year(match), 0, 12)
+        return start, end, False
+
+    def split_year(match):
+        start_year = int(match.group("start"))
+        end_year = _full_year(match.group("end"), start_year // 100 * 100)
+        if end_year != start_year + 1:
+            return None
+        start, end = _fiscal_span(start_year, 0, 12)
+        return start, end, False
+
+    def year(match):
+        year = int(match.group("year"))
+        return month_ordinal(year, 1), month_ordinal(year, 12), False
+
+    def relative(match):
+        unit = UNIT_MONTHS[match.group("unit").lower()]
+        kind = match.group("kind").lower()
+        n = match.group("n")
+        if n is not None:
+            count = int(n) if n.isdigit() else NUMBER_WORDS[n.lower()]
+            return current - count * unit, current, True
+        if kind in ("last", "previous", "preceding"):
+            # Previous full period before the current month
+            if unit == 1:
+                return current - 1, current - 1, False
+            if unit == 3:
+                # Indian fiscal quarters start in April, July, October and January
+                quarter_start = current - (current - month_ordinal(0, 4)) % 3
+                return quarter_start - 3, quarter_start - 1, False
+            if unit == 12:
+                year = (current - 1) // 12 - 1
+                return month_ordinal(year, 1), month_ordinal(year, 12), False
+        return current - unit, current, True
+
+    consume(RELATIVE_RE, relative)
+    consume(QUARTER_RE, quarter)
+    consume(HALF_RE, half)
+    consume(FY_RE, fiscal_year)
+    consume(MONTH_YEAR_RE, month_year)
+    consume(SPLIT_YEAR_RE, split_year)
+    consume(YEAR_RE, year, "year")
+
+    for position, (start, end, is_relative) in sorted(spans, key=lambda x: x[0]):
+        yield position, start, end, is_relative
+
+
+def extract_date_range(query: str, today: Optional[datetime] = None) -> Optional[Tuple[str, str]]:
+    """
+    Resolves the earliest and latest date referenced by a query, in the same form
+    fetch_min_date / fetch_date return ('%B %Y' or 'today').
+
+    Returns (min_date, max_date), or None when no period could be resolved and the
+    caller should ask the LLM instead.
+    """
+    today = today or datetime.today()
+    current = month_ordinal(today.year, today.month)
+
+    periods = list(_scan(query, current))
+    if not periods:
+        if LATEST_RE.search(query):
+            return "today", "today"
+        return None
+
+    start = min(p[1] for p in periods)
+    end = max(p[2] for p in periods)
+    open_ended = any(p[3] for p in periods)
+
+    # "since June 2023" / "from June 2023" with nothing after it runs up to today
+    if len(periods) == 1 and SINCE_RE.search(query[:periods[0][0]]):
+        open_ended = True
+    elif len(periods) == 1 and UNTIL_RE.search(query[:periods[0][0]]):
+        return None
+
+    if start > current:
+        return None
+    if end > current:
+        end = current
+        open_ended = True
+
+    max_date = "today" if open_ended else ordinal_to_date(end)
+    min_date = "today" if start == current and open_ended else ordinal_to_date(start)
+    return min_date, max_date
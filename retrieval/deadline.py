@@ -0,0 +1,49 @@
+import threading
+import time
+
+
+class Deadline:
+    """
+    Time budget of one request, started when it arrives (before admission), and
+    handed to every stage so each can tell how much of the budget is left.
+    """
+
+    def __init__(self, budget_seconds: float):
+        self.budget = budget_seconds
+        self.start = time.monotonic()
+        self.expires = self.start + budget_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def until(self, share: float) -> float:
+        """Seconds left before share (0..1) of the whole budget has been spent."""
+        return max(0.0, self.start + share * self.budget - time.monotonic())
+
+    def timeout(self, floor: float = 0.0) -> float:
+        """remaining(), but at least floor: for calls that are worth finishing even when late."""
+        return max(floor, self.remaining())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+
+class CostEstimate:
+    """Moving average of the seconds one unit of work takes, e.g. one cross-encoder pair."""
+
+    def __init__(self, initial_seconds_per_unit: float, smoothing: float = 0.1):
+        self.seconds_per_unit = initial_seconds_per_unit
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float, units: int):
+        if units <= 0:
+            return
+        with self.lock:
+            self.seconds_per_unit += self.smoothing * (seconds / units - self.seconds_per_unit)
+
+    def seconds(self, units: int) -> float:
+        return units * self.seconds_per_unit
+
+    def units_within(self, seconds: float) -> int:
+        return int(seconds / self.seconds_per_unit) if self.seconds_per_unit > 0 else 1 << 30
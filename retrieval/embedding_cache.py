@@ -0,0 +1,204 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+class SqliteStore:
+    """
+    Minimal key -> bytes store on SQLite, used as the on-disk tier of our caches.
+    Safe to share between threads; writes go through WAL so readers don't block.
+    """
+
+    def __init__(self, path: str, table: str = "cache"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.table = table
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_created_at ON {table} (created_at)")
+
+    def get(self, key: str):
+        """Returns (value, created_at) or None."""
+        with self.lock:
+            row = self.conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return row
+
+    def put(self, key: str, value: bytes, created_at: Optional[float] = None):
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, created_at or time.time()),
+            )
+
+    def delete(self, key: str):
+        with self.lock:
+            self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def prune(self, max_entries: int = None, older_than: float = None) -> int:
+        """Drops expired rows and, past max_entries, the oldest ones. Returns rows removed."""
+        removed = 0
+        with self.lock:
+            if older_than is not None:
+                removed += self.conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (older_than,)).rowcount
+            if max_entries is not None:
+                removed += self.conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (max_entries,),
+                ).rowcount
+        return removed
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+
+    The memory tier is an LRU bounded by the total size of the stored vectors
+    (max_bytes) with a TTL per entry. Misses fall through to an optional SQLite
+    tier (path) that survives restarts; disk hits are promoted back into memory.
+    Keys are namespaced by model name so switching models never returns stale vectors.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float = None, path: str = None,
+                 namespace: str = "", max_disk_entries: int = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self.max_disk_entries = max_disk_entries
+        self.disk = SqliteStore(path, table="embeddings") if path else None
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (vector, expires_at)
+        self.bytes = 0
+        self.puts = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.expirations = 0
+
+    def _key(self, text: str) -> str:
+        return f"{self.namespace}\x00{text}"
+
+    def _expires_at(self, created_at: float):
+        return created_at + self.ttl_seconds if self.ttl_seconds else None
+
+    def _remember(self, key: str, vector: np.ndarray, expires_at):
+        # Caller holds self.lock
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[0].nbytes
+        if vector.nbytes > self.max_bytes:
+            return
+        self.entries[key] = (vector, expires_at)
+        self.bytes += vector.nbytes
+        while self.bytes > self.max_bytes:
+            _, (evicted, _) = self.entries.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        vector = self.get_memory(text)
+        if vector is None:
+            vector = self.get_disk(text)
+        return vector
+
+    def get_memory(self, text: str) -> Optional[np.ndarray]:
+        """Memory tier only; a miss is not counted, since get_disk comes next."""
+        key = self._key(text)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                vector, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self.entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return vector
+                del self.entries[key]
+                self.bytes -= vector.nbytes
+                self.expirations += 1
+        return None
+
+    def get_disk(self, text: str) -> Optional[np.ndarray]:
+        """Disk tier lookup after a memory miss; hits are promoted into memory. Does SQLite I/O."""
+        key = self._key(text)
+        now = time.time()
+        if self.disk is not None:
+            row = self.disk.get(key)
+            if row is not None:
+                value, created_at = row
+                expires_at = self._expires_at(created_at)
+                if expires_at is None or expires_at > now:
+                    vector = np.frombuffer(value, dtype=np.float32)
+                    with self.lock:
+                        self._remember(key, vector, expires_at)
+                        self.disk_hits += 1
+                    return vector
+                self.disk.delete(key)
+                with self.lock:
+                    self.expirations += 1
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, text: str, vector) -> np.ndarray:
+        vector = self.remember(text, vector)
+        self.persist(text, vector)
+        return vector
+
+    def remember(self, text: str, vector) -> np.ndarray:
+        """Memory tier only; persist writes the vector to disk."""
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        with self.lock:
+            self._remember(self._key(text), vector, self._expires_at(time.time()))
+        return vector
+
+    def persist(self, text: str, vector: np.ndarray):
+        """Writes the vector to the disk tier and prunes it every 1000 writes. Does SQLite I/O."""
+        if self.disk is None:
+            return
+        now = time.time()
+        with self.lock:
+            self.puts += 1
+            prune = self.puts % 1000 == 0
+        self.disk.put(self._key(text), vector.tobytes(), now)
+        if prune:
+            older_than = now - self.ttl_seconds if self.ttl_seconds else None
+            removed = self.disk.prune(self.max_disk_entries, older_than)
+            with self.lock:
+                self.disk_evictions += removed
+
+    def stats(self) -> dict:
+        with self.lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+                "expirations": self.expirations,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
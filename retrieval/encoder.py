@@ -1,25 +1,58 @@
-import streamlit as st
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from sentence_transformers import SentenceTransformer
+from embedding_cache import EmbeddingCache
+from batching import MicroBatcher
+from inference_backend import BI_ENCODER_NAME, INFERENCE_BACKEND, load_model
 
-# Load the sentence transformer model once
-@st.cache_resource
+MODEL_NAME = BI_ENCODER_NAME  # or any other pre-trained model you prefer
+
+# Load the sentence transformer model once, on the configured inference backend
+@lru_cache(maxsize=None)
 def get_sentence_transformer():
-    return SentenceTransformer('sentence-transformers/all-mpnet-base-v2')  # or any other pre-trained model you prefer
+    return load_model(SentenceTransformer, MODEL_NAME)
 
 model = get_sentence_transformer()
 
-# Cache for embeddings
-@st.cache_resource
+# Cache for embeddings: bounded LRU in memory, SQLite on disk so it survives redeploys
+@lru_cache(maxsize=None)
 def get_embedding_cache():
-    return {}
+    return EmbeddingCache(
+        max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+        ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", 30 * 24 * 3600)),
+        path=os.getenv("EMBEDDING_CACHE_PATH", "cache/embedding_cache.sqlite3") or None,
+        namespace=f"{MODEL_NAME}:{INFERENCE_BACKEND}",
+        max_disk_entries=int(os.getenv("EMBEDDING_CACHE_MAX_DISK_ENTRIES", 500000)),
+    )
 
 embedding_cache = get_embedding_cache()
 
+# The disk tier's SQLite reads and writes run here instead of on the event loop
+cache_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-cache")
+
 def emb_text(client, text: str):
-    if text in embedding_cache:
-        return embedding_cache[text]
-    else:
+    embedding = embedding_cache.get(text)
+    if embedding is None:
         # Use the sentence transformer model to encode the text
-        embedding = client.encode(text)
-        embedding_cache[text] = embedding
-        return embedding
\ No newline at end of file
+        embedding = embedding_cache.put(text, client.encode(text))
+    return embedding
+
+# Concurrent requests share one batched encode call
+embed_batcher = MicroBatcher(
+    "embed",
+    lambda texts: list(model.encode(texts, batch_size=len(texts))),
+    max_batch_size=int(os.getenv("EMBED_BATCH_MAX_SIZE", 32)),
+    max_wait_ms=float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", 5)),
+)
+
+async def aemb_text(text: str):
+    embedding = embedding_cache.get_memory(text)
+    if embedding is None:
+        embedding = await asyncio.get_running_loop().run_in_executor(cache_executor, embedding_cache.get_disk, text)
+    if embedding is None:
+        embedding = embedding_cache.remember(text, await embed_batcher.submit(text))
+        # Nobody waits for the write-back
+        cache_executor.submit(embedding_cache.persist, text, embedding)
+    return embedding
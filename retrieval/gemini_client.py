@@ -0,0 +1,227 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import lru_cache
+from time import strftime, gmtime
+
+from embedding_cache import SqliteStore
+from metrics import Histogram, LATENCY_BUCKETS
+
+# Upper bound on one Gemini call, applied by the HTTP client and to callers
+# waiting on a coalesced call
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", 30))
+
+
+@lru_cache(maxsize=None)
+def get_genai_client():
+    """
+    One process-wide Gemini client, so every call reuses its pooled HTTP connections.
+    With GEMINI_STUB=true a local stub stands in for the API (no network, no key).
+    """
+    if os.getenv("GEMINI_STUB", "false").lower() == "true":
+        return StubGeminiClient()
+    from google import genai
+    from google.genai import types
+
+    return genai.Client(api_key=os.getenv("GOOGLE_API_KEY"),
+                        http_options=types.HttpOptions(timeout=int(GEMINI_TIMEOUT_SECONDS * 1000)))
+
+
+class LLMCallCache:
+    """
+    Durable memo for deterministic (temperature 0) Gemini calls.
+
+    Keys are (function, prompt version, curdate, inputs), so a prompt change only
+    needs a version bump and relative dates never leak across months. Results are
+    held in a small in-memory LRU in front of a SQLite store that survives restarts.
+    Concurrent identical calls are coalesced: only the first one reaches Gemini and
+    the rest wait for its result, for at most wait_timeout seconds. The SQLite
+    store is pruned of expired rows, and past max_disk_entries of the oldest ones,
+    every 1000 writes.
+    """
+
+    def __init__(self, path: str = None, ttl_seconds: float = None, memory_entries: int = 4096,
+                 max_disk_entries: int = None, wait_timeout: float = None):
+        self.disk = SqliteStore(path, table="llm_calls") if path else None
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.wait_timeout = wait_timeout
+        self.memory = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.puts = 0
+
+    def _counters(self, function: str) -> dict:
+        # Caller holds self.lock
+        if function not in self.counters:
+            self.counters[function] = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0,
+                                       "latency": Histogram(LATENCY_BUCKETS)}
+        return self.counters[function]
+
+    @staticmethod
+    def make_key(function: str, version: int, inputs) -> str:
+        payload = json.dumps([function, version, inputs], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+        if self.disk is not None:
+            row = self.disk.get(key)
+            if row is not None:
+                value, created_at = row
+                if not self.ttl_seconds or created_at + self.ttl_seconds > time.time():
+                    value = value.decode("utf-8") if isinstance(value, bytes) else value
+                    self._remember(key, value)
+                    return value
+        return None
+
+    def _remember(self, key: str, value: str):
+        with self.lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def _persist(self, key: str, value: str):
+        if self.disk is None:
+            return
+        now = time.time()
+        self.disk.put(key, value.encode("utf-8"), now)
+        with self.lock:
+            self.puts += 1
+            prune = self.puts % 1000 == 0
+        if prune:
+            self.disk.prune(self.max_disk_entries, now - self.ttl_seconds if self.ttl_seconds else None)
+
+    def call(self, function: str, version: int, inputs, fn) -> str:
+        key = self.make_key(function, version, inputs)
+        start = time.perf_counter()
+
+        value = self._lookup(key)
+        if value is not None:
+            with self.lock:
+                counters = self._counters(function)
+                counters["hits"] += 1
+            counters["latency"].observe(time.perf_counter() - start)
+            return value
+
+        with self.lock:
+            counters = self._counters(function)
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+                counters["misses"] += 1
+            else:
+                counters["coalesced"] += 1
+
+        if not leader:
+            return future.result(timeout=self.wait_timeout)
+
+        try:
+            value = fn()
+        except Exception as e:
+            with self.lock:
+                counters["errors"] += 1
+                del self.inflight[key]
+            future.set_exception(e)
+            raise
+
+        # Empty (e.g. blocked) responses are returned but never cached
+        if value:
+            self._remember(key, value)
+            self._persist(key, value)
+        with self.lock:
+            del self.inflight[key]
+        future.set_result(value)
+        counters["latency"].observe(time.perf_counter() - start)
+        return value
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                function: {
+                    "hits": c["hits"],
+                    "misses": c["misses"],
+                    "coalesced": c["coalesced"],
+                    "errors": c["errors"],
+                    "hit_ratio": (c["hits"] + c["coalesced"]) / max(1, c["hits"] + c["coalesced"] + c["misses"]),
+                    "latency_seconds": c["latency"].snapshot(),
+                }
+                for function, c in self.counters.items()
+            }
+
+
+llm_cache = LLMCallCache(
+    path=os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite3") or None,
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", 31 * 24 * 3600)),
+    memory_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", 4096)),
+    max_disk_entries=int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", 100000)),
+    wait_timeout=GEMINI_TIMEOUT_SECONDS,
+)
+
+
+def memoized_llm_call(function: str, version: int):
+    """
+    Memoizes a Gemini helper through llm_cache. Bump version whenever the prompt
+    changes so old answers are not served for the new prompt.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            curdate = strftime("%Y-%m", gmtime())
+            return llm_cache.call(function, version, [curdate, *args], lambda: fn(*args))
+        return wrapper
+    return decorator
+
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _StubModels:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+
+    def _answer(self, config, contents) -> str:
+        instruction = str(getattr(config, "system_instruction", "") or "")
+        if "date extractor" in instruction:
+            return "today"
+        if isinstance(contents, str):
+            return contents
+        return json.dumps(contents, default=str)
+
+    def generate_content(self, model, config=None, contents=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        return _StubResponse(self._answer(config, contents))
+
+    def generate_content_stream(self, model, config=None, contents=None):
+        self.calls += 1
+        text = self._answer(config, contents)
+        for i in range(0, len(text), 16):
+            time.sleep(self.delay / 10)
+            yield _StubResponse(text[i:i + 16])
+
+
+class StubGeminiClient:
+    """
+    Local stand-in for genai.Client: echoes the contents back (the date extractor
+    prompts get 'today') after GEMINI_STUB_DELAY_SECONDS, and counts calls.
+    """
+
+    def __init__(self, delay: float = None):
+        self.models = _StubModels(float(os.getenv("GEMINI_STUB_DELAY_SECONDS", 0.05)) if delay is None else delay)
+
@@ -0,0 +1,165 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+from sentence_transformers import SentenceTransformer, CrossEncoder
+
+# Selectable CPU inference backend for the bi-encoder and the cross-encoder.
+#   torch: full-precision PyTorch (the original setup)
+#   onnx:  ONNX Runtime with dynamic int8 quantization, exported on first use
+
+BI_ENCODER_NAME = 'sentence-transformers/all-mpnet-base-v2'
+CROSS_ENCODER_NAME = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+# Unset leaves the runtime's own default, which matters when several uvicorn
+# workers share the machine; set it to split the cores between them explicitly
+INFERENCE_INTRA_OP_THREADS = int(os.getenv("INFERENCE_INTRA_OP_THREADS", 0)) or None
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "cache/onnx")
+ONNX_QUANTIZATION = os.getenv("ONNX_QUANTIZATION", "avx2")  # arm64, avx2, avx512 or avx512_vnni
+
+
+def onnx_model_dir(model_name: str) -> str:
+    return os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+
+
+def quantized_file_name() -> str:
+    return f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx"
+
+
+def _require_onnx():
+    try:
+        import onnxruntime  # noqa: F401
+        import optimum.onnxruntime  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError(
+            "INFERENCE_BACKEND=onnx needs onnxruntime and optimum: pip install 'sentence-transformers[onnx]'"
+        ) from e
+
+
+def export_quantized(model_cls, model_name: str) -> str:
+    """Exports model_name to ONNX and writes a dynamically int8-quantized copy next to it."""
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    local_dir = onnx_model_dir(model_name)
+    logging.info(f"Exporting {model_name} to quantized ONNX ({ONNX_QUANTIZATION}) in {local_dir}")
+    model = model_cls(model_name, device="cpu", backend="onnx")
+    model.save_pretrained(local_dir)
+    export_dynamic_quantized_onnx_model(model, quantization_config=ONNX_QUANTIZATION, model_name_or_path=local_dir)
+    return local_dir
+
+
+def _onnx_session_options():
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    if INFERENCE_INTRA_OP_THREADS:
+        options.intra_op_num_threads = INFERENCE_INTRA_OP_THREADS
+    options.inter_op_num_threads = 1
+    return options
+
+
+def load_model(model_cls, model_name: str, backend: str = None):
+    """Loads a SentenceTransformer or CrossEncoder on CPU with the requested backend."""
+    backend = backend or INFERENCE_BACKEND
+    if backend == "torch":
+        if INFERENCE_INTRA_OP_THREADS:
+            import torch
+
+            torch.set_num_threads(INFERENCE_INTRA_OP_THREADS)
+        return model_cls(model_name, device="cpu")
+    if backend == "onnx":
+        _require_onnx()
+        local_dir = onnx_model_dir(model_name)
+        if not os.path.exists(os.path.join(local_dir, quantized_file_name())):
+            export_quantized(model_cls, model_name)
+        return model_cls(
+            local_dir,
+            device="cpu",
+            backend="onnx",
+            model_kwargs={
+                "file_name": quantized_file_name(),
+                "provider": "CPUExecutionProvider",
+                "session_options": _onnx_session_options(),
+            },
+        )
+    raise ValueError(f"Unknown INFERENCE_BACKEND {backend!r}, expected 'torch' or 'onnx'")
+
+
+def _top_k_overlap(a, b, k=5):
+    top_a = set(np.argsort(-np.asarray(a), kind="stable")[:k])
+    top_b = set(np.argsort(-np.asarray(b), kind="stable")[:k])
+    return len(top_a & top_b) / max(1, min(k, len(a)))
+
+
+def parity_check(cases, backend: str = "onnx") -> dict:
+    """
+    Compares `backend` against the PyTorch path on (query, passages) cases.
+
+    Reports cross-encoder score drift, bi-encoder embedding cosine, top-5 overlap
+    of both rankings, and the time each backend spent.
+    """
+    report = {"backend": backend, "quantization": ONNX_QUANTIZATION, "threads": INFERENCE_INTRA_OP_THREADS, "cases": len(cases)}
+
+    for label, model_cls, model_name in (("cross_encoder", CrossEncoder, CROSS_ENCODER_NAME),
+                                         ("bi_encoder", SentenceTransformer, BI_ENCODER_NAME)):
+        reference_model = load_model(model_cls, model_name, "torch")
+        candidate_model = load_model(model_cls, model_name, backend)
+        drifts, overlaps, cosines = [], [], []
+        timings = {"torch": 0.0, backend: 0.0}
+
+        for case in cases:
+            query, passages = case["query"], case["passages"]
+            outputs = {}
+            for name, model in (("torch", reference_model), (backend, candidate_model)):
+                start = time.perf_counter()
+                if label == "cross_encoder":
+                    outputs[name] = np.asarray(model.predict([(query, p) for p in passages]), dtype=np.float32)
+                else:
+                    outputs[name] = model.encode([query] + passages, normalize_embeddings=True)
+                timings[name] += time.perf_counter() - start
+
+            if label == "cross_encoder":
+                drifts.append(np.abs(outputs["torch"] - outputs[backend]))
+                overlaps.append(_top_k_overlap(outputs["torch"], outputs[backend]))
+            else:
+                ref, cand = outputs["torch"], outputs[backend]
+                cosines.append(np.sum(ref * cand, axis=1))
+                overlaps.append(_top_k_overlap(ref[1:] @ ref[0], cand[1:] @ cand[0]))
+
+        result = {
+            "top5_overlap_mean": float(np.mean(overlaps)),
+            "top5_overlap_min": float(np.min(overlaps)),
+            "seconds": timings,
+            "speedup": timings["torch"] / timings[backend] if timings[backend] else None,
+        }
+        if drifts:
+            drift = np.concatenate(drifts)
+            result.update({"score_drift_mean": float(drift.mean()), "score_drift_p99": float(np.percentile(drift, 99)),
+                           "score_drift_max": float(drift.max())})
+        if cosines:
+            cosine = np.concatenate(cosines)
+            result.update({"embedding_cosine_mean": float(cosine.mean()), "embedding_cosine_min": float(cosine.min())})
+        report[label] = result
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export quantized ONNX models or check their parity with PyTorch.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("export", help="Export both models to quantized ONNX under ONNX_MODEL_DIR")
+    parity = subparsers.add_parser("parity", help="Compare the ONNX backend against PyTorch")
+    parity.add_argument("cases", help='JSONL file with {"query": ..., "passages": [...]} per line')
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_quantized(SentenceTransformer, BI_ENCODER_NAME)
+        export_quantized(CrossEncoder, CROSS_ENCODER_NAME)
+    else:
+        with open(args.cases) as f:
+            cases = [json.loads(line) for line in f if line.strip()]
+        print(json.dumps(parity_check(cases), indent=2))
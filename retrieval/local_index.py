@@ -0,0 +1,454 @@
+"""
+In-process replica of the chunk collection, so searches skip the round trip to
+Milvus (SEARCH_BACKEND=local in the retrieval service).
+
+A snapshot is a directory of flat files written by `export` and memory-mapped
+read-only by the service, so every worker process on the box shares one copy
+through the page cache:
+
+    manifest.json                    rows, dim, dtype, nlist, source collection
+    vectors.npy                      (rows, dim) float32 or float16, L2-normalized,
+                                     rows grouped by IVF list
+    centroids.npy                    (nlist, dim) float32 IVF list centroids
+    list_offsets.npy                 rows of list i are [offsets[i], offsets[i + 1])
+    ids.npy, date_ords.npy, pages.npy
+                                     int64 columns (date_ord NO_DATE = null)
+    <column>.offsets.npy, <column>.bin
+                                     UTF-8 string columns: reference, source, date, content
+    reference_codes.npy              int32 reference of each row, for grouping
+    id_order.npy                     rows sorted by id, for get()
+
+    python local_index.py export --collection <name> --out /data/local_index [--nlist N] [--dtype float16]
+    python local_index.py check /data/local_index   # recall against exact search
+
+export writes a new snapshot directory under --out and then repoints
+<out>/CURRENT at it; running services pick it up within
+LOCAL_INDEX_REFRESH_SECONDS and drop the old mapping once in-flight searches
+are done with it.
+
+LocalIndex implements the part of MilvusClient the retrieval service uses
+(search with a date_ord range filter and group-by reference, get by id and
+list_partitions), with the same result shapes.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", 32))
+LOCAL_INDEX_REFRESH_SECONDS = float(os.getenv("LOCAL_INDEX_REFRESH_SECONDS", 60))
+LOCAL_INDEX_KEEP_SNAPSHOTS = 2
+NO_DATE = -1
+STRING_COLUMNS = ["reference", "source", "date", "content"]
+EXPORT_FIELDS = ["id", "vector", "reference", "source", "page", "date", "date_ord", "content"]
+CURRENT = "CURRENT"
+
+# The only filters the retrieval service sends: a date_ord range, or nothing
+_RANGE_FILTER = re.compile(r"^\s*date_ord\s*>=\s*(-?\d+)\s+and\s+date_ord\s*<=\s*(-?\d+)\s*$")
+
+
+def parse_date_filter(expression):
+    """(start_ord, end_ord) of a 'date_ord >= A and date_ord <= B' filter, None for no filter."""
+    if not expression:
+        return None
+    match = _RANGE_FILTER.match(expression)
+    if match is None:
+        raise ValueError(f"Local index only supports date_ord range filters, got: {expression!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+class _StringColumn:
+    def __init__(self, directory: str, name: str):
+        self.offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r")
+        path = os.path.join(directory, f"{name}.bin")
+        self.data = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.empty(0, np.uint8)
+
+    def __getitem__(self, row: int) -> str:
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+
+class _StringColumnWriter:
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+        self.file = open(os.path.join(directory, f"{name}.bin"), "wb")
+        self.offsets = [0]
+
+    def append(self, value):
+        data = (value or "").encode("utf-8")
+        self.file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self):
+        self.file.close()
+        np.save(os.path.join(self.directory, f"{self.name}.offsets.npy"), np.asarray(self.offsets, dtype=np.int64))
+
+
+class Snapshot:
+    """One read-only, memory-mapped snapshot directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+        self.vectors = load("vectors")
+        self.centroids = np.asarray(load("centroids"), dtype=np.float32)
+        self.list_offsets = np.asarray(load("list_offsets"))
+        self.ids = load("ids")
+        self.date_ords = load("date_ords")
+        self.pages = load("pages")
+        self.reference_codes = load("reference_codes")
+        self.id_order = load("id_order")
+        self.strings = {name: _StringColumn(directory, name) for name in STRING_COLUMNS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def entity(self, row: int, fields) -> dict:
+        entity = {}
+        for field in fields:
+            if field in self.strings:
+                entity[field] = self.strings[field][row]
+            elif field == "page":
+                entity[field] = int(self.pages[row])
+            elif field == "date_ord":
+                date_ord = int(self.date_ords[row])
+                entity[field] = None if date_ord == NO_DATE else date_ord
+            elif field == "id":
+                entity[field] = int(self.ids[row])
+        return entity
+
+    def _probe(self, query: np.ndarray, lists, date_range):
+        rows, scores = [], []
+        for index in lists:
+            start, end = int(self.list_offsets[index]), int(self.list_offsets[index + 1])
+            if start == end:
+                continue
+            if date_range is None:
+                list_rows = np.arange(start, end)
+                vectors = self.vectors[start:end]
+            else:
+                date_ords = self.date_ords[start:end]
+                list_rows = start + np.flatnonzero((date_ords >= date_range[0]) & (date_ords <= date_range[1]))
+                if not len(list_rows):
+                    continue
+                vectors = self.vectors[list_rows]
+            rows.append(list_rows)
+            scores.append(np.asarray(vectors, dtype=np.float32) @ query)
+        if not rows:
+            return np.empty(0, np.int64), np.empty(0, np.float32)
+        return np.concatenate(rows), np.concatenate(scores)
+
+    def _group(self, rows, scores, limit: int, group_size: int):
+        """
+        Milvus group-by-reference on the probed rows: the limit references with the
+        best hits, each with up to group_size hits, groups ordered by their best
+        hit. Returns the selected rows (in that order) and the number of groups.
+        """
+        order = np.argsort(-scores, kind="stable")
+        _, first, inverse = np.unique(self.reference_codes[rows[order]], return_index=True, return_inverse=True)
+        chosen = np.zeros(len(first), dtype=bool)
+        chosen[np.argsort(first, kind="stable")[:limit]] = True
+        # Rank of each hit within its group: hits of a group are in score order after a stable sort
+        by_group = np.argsort(inverse, kind="stable")
+        positions = np.arange(len(inverse))
+        run_start = np.r_[True, inverse[by_group][1:] != inverse[by_group][:-1]]
+        rank_in_group = np.empty(len(inverse), dtype=np.int64)
+        rank_in_group[by_group] = positions - np.maximum.accumulate(np.where(run_start, positions, 0))
+        keep = np.flatnonzero(chosen[inverse] & (rank_in_group < group_size))
+        keep = keep[np.lexsort((keep, first[inverse[keep]]))]
+        return order[keep], int(chosen.sum())
+
+    def search_one(self, query, limit: int, group_size, date_range, nprobe: int):
+        """
+        Rows and cosine scores of the IVF search, grouped by reference (group_size
+        hits each) unless group_size is None. Returns (rows, scores).
+        """
+        query = _normalize(query)
+        nlist = len(self.centroids)
+        list_order = np.argsort(-(self.centroids @ query))
+        rows = np.empty(0, np.int64)
+        scores = np.empty(0, np.float32)
+        probed = 0
+        nprobe = max(1, min(nprobe, nlist))
+        while True:
+            new_rows, new_scores = self._probe(query, list_order[probed:nprobe], date_range)
+            rows, scores = np.concatenate([rows, new_rows]), np.concatenate([scores, new_scores])
+            probed = nprobe
+            if not len(rows):
+                selected, groups = np.empty(0, np.int64), 0
+            elif group_size is None:
+                selected = np.argsort(-scores, kind="stable")[:limit]
+                groups = len(selected)
+            else:
+                selected, groups = self._group(rows, scores, limit, group_size)
+            # A narrow date window can leave the nearest lists nearly empty: widen until limit groups or all lists
+            if groups >= limit or probed >= nlist:
+                return rows[selected], scores[selected]
+            nprobe = min(nlist, nprobe * 2)
+
+    def rows_for_ids(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        sorted_ids = self.ids[self.id_order]
+        positions = np.clip(np.searchsorted(sorted_ids, ids), 0, max(0, len(sorted_ids) - 1))
+        found = len(sorted_ids) > 0
+        return [int(self.id_order[p]) if found and sorted_ids[p] == i else None for p, i in zip(positions, ids)]
+
+
+class LocalIndex:
+    """
+    MilvusClient stand-in over the snapshot <root>/CURRENT points at. Searches
+    are IVF: the nprobe lists nearest the query (search_params "nprobe", default
+    LOCAL_INDEX_NPROBE) are scored exactly; "ef" is accepted and ignored.
+    """
+
+    def __init__(self, root: str, nprobe: int = LOCAL_INDEX_NPROBE,
+                 refresh_seconds: float = LOCAL_INDEX_REFRESH_SECONDS):
+        self.root = root
+        self.nprobe = nprobe
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.checked_at = 0.0
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> Snapshot:
+        """Reopens the snapshot if CURRENT changed (checked at most every refresh_seconds)."""
+        now = time.monotonic()
+        if not force and now - self.checked_at < self.refresh_seconds:
+            return self.snapshot
+        with self.lock:
+            self.checked_at = now
+            with open(os.path.join(self.root, CURRENT), encoding="utf-8") as f:
+                name = f.read().strip()
+            directory = os.path.join(self.root, name)
+            if self.snapshot is None or self.snapshot.directory != directory:
+                self.snapshot = Snapshot(directory)
+                logging.info(f"Local index: opened {directory} ({len(self.snapshot)} chunks)")
+        return self.snapshot
+
+    def using_database(self, name):
+        pass
+
+    def list_partitions(self, collection_name):
+        return ["_default"]
+
+    def search(self, collection_name, data, limit, search_params=None, output_fields=None, group_by_field=None,
+               group_size=1, strict_group_size=False, filter=None, partition_names=None, timeout=None, **kwargs):
+        if group_by_field not in (None, "reference"):
+            raise ValueError(f"Local index can only group by reference, got {group_by_field!r}")
+        snapshot = self.refresh()
+        date_range = parse_date_filter(filter)
+        nprobe = ((search_params or {}).get("params") or {}).get("nprobe", self.nprobe)
+        fields = [field for field in (output_fields or []) if field != "id"]
+        results = []
+        for query in data:
+            rows, scores = snapshot.search_one(query, limit, None if group_by_field is None else group_size or 1,
+                                               date_range, nprobe)
+            results.append([{"id": int(snapshot.ids[row]), "distance": float(score), "entity": snapshot.entity(row, fields)}
+                            for row, score in zip(rows, scores)])
+        return results
+
+    def get(self, collection_name, ids, output_fields=None, timeout=None, **kwargs):
+        snapshot = self.refresh()
+        fields = [field for field in (output_fields or []) if field != "id"]
+        return [{"id": int(snapshot.ids[row]), **snapshot.entity(row, fields)}
+                for row in snapshot.rows_for_ids(ids) if row is not None]
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, sample_size: int = None, seed: int = 0):
+    """Spherical k-means centroids on a sample of the (normalized) vectors."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), sample_size or nlist * 64)
+    sample = _normalize(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.bincount(labels, minlength=nlist) == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]  # Reseed empty lists
+        centroids = _normalize(sums)
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        labels[start:start + batch_size] = np.argmax(_normalize(vectors[start:start + batch_size]) @ centroids.T, axis=1)
+    return labels
+
+
+def write_snapshot(directory: str, batches, nlist: int = None, dtype: str = "float32", source: str = "",
+                   batch_size: int = 65536) -> dict:
+    """
+    Builds a snapshot from batches of row dicts (EXPORT_FIELDS). Rows are staged
+    on disk in arrival order, clustered, then rewritten in IVF list order, so
+    memory stays bounded by the small metadata columns.
+    """
+    os.makedirs(directory)
+    staging = os.path.join(directory, "staging")
+    os.makedirs(staging)
+    raw_vectors = open(os.path.join(staging, "vectors.f32"), "wb")
+    raw_content = _StringColumnWriter(staging, "content")
+    columns = {"id": [], "date_ord": [], "page": [], "reference": [], "source": [], "date": []}
+    dim = None
+    for batch in batches:
+        for row in batch:
+            vector = np.asarray(row["vector"], dtype=np.float32)
+            dim = dim or len(vector)
+            raw_vectors.write(vector.tobytes())
+            raw_content.append(row.get("content"))
+            columns["id"].append(row["id"])
+            columns["date_ord"].append(NO_DATE if row.get("date_ord") is None else row["date_ord"])
+            columns["page"].append(row.get("page") or 0)
+            for name in ["reference", "source", "date"]:
+                columns[name].append(row.get(name) or "")
+    raw_vectors.close()
+    raw_content.close()
+    rows = len(columns["id"])
+    if not rows:
+        raise ValueError("Nothing to snapshot")
+
+    vectors = np.memmap(os.path.join(staging, "vectors.f32"), dtype=np.float32, mode="r", shape=(rows, dim))
+    nlist = max(1, min(rows, nlist or int(np.sqrt(rows))))
+    centroids = train_ivf(vectors, nlist)
+    labels = assign_lists(vectors, centroids, batch_size)
+    permutation = np.argsort(labels, kind="stable")
+
+    out = np.lib.format.open_memmap(os.path.join(directory, "vectors.npy"), mode="w+", dtype=np.dtype(dtype),
+                                    shape=(rows, dim))
+    for start in range(0, rows, batch_size):
+        out[start:start + batch_size] = _normalize(vectors[permutation[start:start + batch_size]]).astype(dtype)
+    out.flush()
+    del out
+    np.save(os.path.join(directory, "centroids.npy"), centroids)
+    np.save(os.path.join(directory, "list_offsets.npy"),
+            np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))]).astype(np.int64))
+
+    ids = np.asarray(columns["id"], dtype=np.int64)[permutation]
+    np.save(os.path.join(directory, "ids.npy"), ids)
+    np.save(os.path.join(directory, "id_order.npy"), np.argsort(ids, kind="stable"))
+    np.save(os.path.join(directory, "date_ords.npy"), np.asarray(columns["date_ord"], dtype=np.int64)[permutation])
+    np.save(os.path.join(directory, "pages.npy"), np.asarray(columns["page"], dtype=np.int64)[permutation])
+    _, reference_codes = np.unique(np.asarray(columns["reference"], dtype=object)[permutation].astype(str),
+                                   return_inverse=True)
+    np.save(os.path.join(directory, "reference_codes.npy"), reference_codes.astype(np.int32))
+    for name in ["reference", "source", "date"]:
+        writer = _StringColumnWriter(directory, name)
+        for row in permutation:
+            writer.append(columns[name][row])
+        writer.close()
+    content = _StringColumn(staging, "content")
+    writer = _StringColumnWriter(directory, "content")
+    for row in permutation:
+        writer.append(content[row])
+    writer.close()
+    del vectors, content
+    shutil.rmtree(staging)
+
+    manifest = {"rows": rows, "dim": dim, "dtype": dtype, "nlist": nlist, "source": source,
+                "created_at": datetime.utcnow().isoformat()}
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def publish(root: str, name: str, keep: int = LOCAL_INDEX_KEEP_SNAPSHOTS):
+    """Points <root>/CURRENT at the snapshot and drops all but the newest keep snapshots."""
+    tmp_path = os.path.join(root, f"{CURRENT}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp_path, os.path.join(root, CURRENT))
+    snapshots = sorted(entry for entry in os.listdir(root) if entry.startswith("snapshot_"))
+    for old in snapshots[:-keep]:
+        if old != name:
+            shutil.rmtree(os.path.join(root, old))
+
+
+def export(milvus_client, collection_name: str, root: str, nlist: int = None, dtype: str = "float32",
+           batch_size: int = 1000) -> dict:
+    """Snapshots the collection (or alias) into a new directory under root and publishes it."""
+    iterator = milvus_client.query_iterator(collection_name=collection_name, batch_size=batch_size,
+                                            output_fields=EXPORT_FIELDS)
+
+    def batches():
+        while True:
+            batch = iterator.next()
+            if not batch:
+                iterator.close()
+                return
+            yield batch
+
+    os.makedirs(root, exist_ok=True)
+    name = f"snapshot_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    try:
+        manifest = write_snapshot(os.path.join(root, name), batches(), nlist, dtype, collection_name)
+    except BaseException:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        raise
+    publish(root, name)
+    return {"snapshot": name, **manifest}
+
+
+def check_recall(root: str, queries: int = 200, limit: int = 50, group_size: int = 4, nprobe: int = LOCAL_INDEX_NPROBE,
+                 seed: int = 0) -> dict:
+    """Grouped-hit recall and latency of the IVF search against exact search, using stored vectors as queries."""
+    index = LocalIndex(root, nprobe=nprobe)
+    snapshot = index.snapshot
+    rng = np.random.default_rng(seed)
+    all_lists = len(snapshot.centroids)
+    recalls, latencies = [], []
+    for row in rng.choice(len(snapshot), min(queries, len(snapshot)), replace=False):
+        query = np.asarray(snapshot.vectors[row], dtype=np.float32)
+        start = time.perf_counter()
+        rows, _ = snapshot.search_one(query, limit, group_size, None, nprobe)
+        latencies.append((time.perf_counter() - start) * 1000)
+        truth, _ = snapshot.search_one(query, limit, group_size, None, all_lists)
+        recalls.append(len(set(rows.tolist()) & set(truth.tolist())) / max(1, len(truth)))
+    return {"queries": len(recalls), "nprobe": nprobe, "nlist": all_lists, "recall": float(np.mean(recalls)),
+            "p50_ms": float(np.percentile(latencies, 50)), "p99_ms": float(np.percentile(latencies, 99))}
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Snapshot a Milvus collection into a local index")
+    export_parser.add_argument("--collection", default=os.getenv("CPI_V5_COLLECTION_NAME"))
+    export_parser.add_argument("--out", default=os.getenv("LOCAL_INDEX_DIR", "cache/local_index"))
+    export_parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default sqrt(rows))")
+    export_parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    check_parser = subparsers.add_parser("check", help="Recall and latency of the IVF search against exact search")
+    check_parser.add_argument("root", nargs="?", default=os.getenv("LOCAL_INDEX_DIR", "cache/local_index"))
+    check_parser.add_argument("--nprobe", type=int, default=LOCAL_INDEX_NPROBE)
+    check_parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from milvus_utils_crossencoder_v5 import get_milvus_client
+
+        client = get_milvus_client(uri=os.getenv("MILVUS_ENDPOINT"), token=os.getenv("MILVUS_TOKEN"))
+        print(json.dumps(export(client, args.collection, args.out, args.nlist, args.dtype), indent=2))
+    else:
+        print(json.dumps(check_recall(args.root, args.queries, nprobe=args.nprobe), indent=2))
@@ -0,0 +1,134 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Histogram:
+    """Fixed-bucket histogram; cheap enough to observe on every request."""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(self.buckets + [float("inf")], counts):
+            cumulative += bucket_count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"buckets": buckets, "sum": total, "count": count, "mean": total / count if count else 0.0}
+
+
+SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+BYTES_BUCKETS = [1024 * 2 ** i for i in range(14)]  # 1 KiB .. 8 MiB
+
+
+class StageTimer:
+    """
+    Latency histogram per named stage, plus the stage times of the current request.
+    A request collects its own {stage: seconds} inside trace(); spans and observe()
+    feed both. Tasks created inside a trace (asyncio.gather) share it; executor
+    threads do not, so time blocking work from the coroutine that awaits it.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.current = contextvars.ContextVar("stage_trace", default=None)
+
+    def histogram(self, stage: str) -> Histogram:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(stage, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, stage: str, seconds: float):
+        self.histogram(stage).observe(seconds)
+        trace = self.current.get()
+        if trace is not None:
+            trace[stage] = trace.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def trace(self):
+        trace = {}
+        token = self.current.set(trace)
+        try:
+            yield trace
+        finally:
+            self.current.reset(token)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            histograms = dict(self.histograms)
+        return {stage: histogram.snapshot() for stage, histogram in sorted(histograms.items())}
+
+
+class PrometheusText:
+    """Builds a Prometheus text exposition (format 0.0.4) from counters, gauges and Histogram snapshots."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self.families = {}
+
+    def _family(self, name: str, kind: str, help_text: str):
+        name = self.prefix + name
+        if name not in self.families:
+            self.families[name] = (kind, help_text, [])
+        return name, self.families[name][2]
+
+    @staticmethod
+    def _labels(labels) -> str:
+        if not labels:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in labels.values())
+        return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+    def sample(self, name: str, value, labels=None, kind: str = "gauge", help_text: str = ""):
+        name, lines = self._family(name, kind, help_text)
+        lines.append(f"{name}{self._labels(labels)} {float(value)}")
+
+    def histogram(self, name: str, snapshot: dict, labels=None, help_text: str = ""):
+        """snapshot: Histogram.snapshot() output (cumulative buckets, sum, count)."""
+        name, lines = self._family(name, "histogram", help_text)
+        labels = dict(labels or {})
+        for bound, count in snapshot["buckets"].items():
+            lines.append(f"{name}_bucket{self._labels({**labels, 'le': bound})} {count}")
+        lines.append(f"{name}_sum{self._labels(labels)} {snapshot['sum']}")
+        lines.append(f"{name}_count{self._labels(labels)} {snapshot['count']}")
+
+    def render(self) -> str:
+        out = []
+        for name, (kind, help_text, lines) in self.families.items():
+            if help_text:
+                out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
@@ -1,34 +1,130 @@
-import streamlit as st
+import os
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
 from pymilvus import MilvusClient
 
+EMBEDDING_DIM = 768  # all-mpnet-base-v2
+
+# The loader puts each chunk in the partition of its month (m_YYYYMM); undated
+# chunks and collections loaded before partitioning use _default.
+PARTITION_PREFIX = "m_"
+DEFAULT_PARTITION = "_default"
+PARTITION_CACHE_TTL_SECONDS = float(os.getenv("MILVUS_PARTITION_CACHE_TTL_SECONDS", 60))
+
+_partition_cache = {}
+_compression_cache = {}
+_partition_cache_lock = threading.Lock()
+
+# HNSW build parameters, and the search-time settings get_search_results uses
+# unless a request overrides them. ef is the HNSW candidate list size: higher
+# means better recall and slower searches; Milvus needs ef >= limit.
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+SEARCH_EF = int(os.getenv("MILVUS_SEARCH_EF", 128))
+SEARCH_LIMIT = int(os.getenv("MILVUS_SEARCH_LIMIT", 50))
+SEARCH_GROUP_SIZE = int(os.getenv("MILVUS_SEARCH_GROUP_SIZE", 4))
+
+# Optional compressed copy of the embeddings (int8 or binary), chosen when the
+# loader creates a collection (VECTOR_COMPRESSION in loader/milvus_utils.py, which
+# owns the collection schema and indexes). The ANN index is then built on the
+# compressed field, and the float32 vector field is memory-mapped with a FLAT
+# index so it no longer has to stay resident.
+# Searches read the level from the collection's schema (collection_compression),
+# run on the compressed index for RESCORE_OVERSAMPLE x limit references with
+# RESCORE_OVERSAMPLE x group_size hits each, and rescore those candidates by exact
+# cosine on their float vectors before regrouping down to limit.
+# compression_eval.py measures what each level costs.
+COMPRESSED_FIELDS = {"int8": "vector_int8", "binary": "vector_bin"}
+RESCORE_OVERSAMPLE = float(os.getenv("RESCORE_OVERSAMPLE", 3))
+SEARCH_NPROBE = int(os.getenv("MILVUS_SEARCH_NPROBE", 64))
 
-@st.cache_resource
+
+@lru_cache(maxsize=None)
 def get_milvus_client(uri: str, token: str = None) -> MilvusClient:
     client = MilvusClient(uri=uri, token=token)
     client.using_database("tata_db")  # Switch to tata_db
     return client
 
 
-def create_collection(
-    milvus_client: MilvusClient, collection_name: str, dim: int, drop_old: bool = True
-):
-    if milvus_client.has_collection(collection_name) and drop_old:
-        milvus_client.drop_collection(collection_name)
-    if milvus_client.has_collection(collection_name):
-        raise RuntimeError(
-            f"Collection {collection_name} already exists. Set drop_old=True to create a new one instead."
-        )
-    return milvus_client.create_collection(
-        collection_name=collection_name,
-        dimension=dim,
-        metric_type="COSINE",
-        consistency_level="Strong",
-        auto_id=True,
-    )
+def compress_vectors(vectors, compression: str) -> list:
+    """
+    Values for the compressed vector field. int8 scales each vector by its own
+    largest component (cosine ignores the scale); binary keeps the sign bits,
+    packed 8 per byte, which HAMMING distance compares. Queries have to be encoded
+    the way the loader encodes documents (compress_vectors in loader/milvus_utils.py).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if compression == "int8":
+        scale = 127.0 / np.maximum(np.abs(vectors).max(axis=1, keepdims=True), 1e-12)
+        return list(np.rint(vectors * scale).astype(np.int8))
+    if compression == "binary":
+        return [row.tobytes() for row in np.packbits(vectors > 0, axis=1)]
+    raise ValueError(f"Unknown vector compression {compression!r}")
+
+
+def partition_name(date_ord) -> str:
+    if date_ord is None:
+        return DEFAULT_PARTITION
+    year, month = divmod(date_ord - 1, 12)
+    return f"{PARTITION_PREFIX}{year:04d}{month + 1:02d}"
+
+
+def list_partitions_cached(milvus_client, collection_name, ttl_seconds=PARTITION_CACHE_TTL_SECONDS):
+    """list_partitions, refreshed at most every ttl_seconds so searches skip the round trip."""
+    now = time.monotonic()
+    with _partition_cache_lock:
+        cached = _partition_cache.get(collection_name)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+    partitions = frozenset(milvus_client.list_partitions(collection_name))
+    with _partition_cache_lock:
+        _partition_cache[collection_name] = (now + ttl_seconds, partitions)
+    return partitions
+
+
+def collection_compression(milvus_client, collection_name, ttl_seconds=PARTITION_CACHE_TTL_SECONDS) -> str:
+    """
+    Compression level the collection (or the one its alias points to) was created
+    with, read from its schema and cached like the partition list.
+    """
+    now = time.monotonic()
+    with _partition_cache_lock:
+        cached = _compression_cache.get(collection_name)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+    names = {field["name"] for field in milvus_client.describe_collection(collection_name)["fields"]}
+    compression = next((level for level, field in COMPRESSED_FIELDS.items() if field in names), "none")
+    with _partition_cache_lock:
+        _compression_cache[collection_name] = (now + ttl_seconds, compression)
+    return compression
+
+
+def clear_partition_cache():
+    """Forgets the cached partition lists and compression levels, e.g. after an alias swap."""
+    with _partition_cache_lock:
+        _partition_cache.clear()
+        _compression_cache.clear()
+
+
+def window_partitions(milvus_client, collection_name, start_ord, end_ord):
+    """
+    Partitions a [start_ord, end_ord] month window has to search: the existing
+    month partitions it covers plus _default. None when the collection is not
+    partitioned by month, i.e. search everything.
+    """
+    available = list_partitions_cached(milvus_client, collection_name)
+    if not any(name.startswith(PARTITION_PREFIX) for name in available):
+        return None
+    names = [name for name in map(partition_name, range(start_ord, end_ord + 1)) if name in available]
+    return names + [DEFAULT_PARTITION]
 
 
 def get_search_results(milvus_client, collection_name, query_vector, output_fields=["id", "source", "page", "content", "reference", "date"],
-                       date_filter = None):     # e.g., "2024-12-31"):
+                       date_filter = None, partition_names = None, ef = None, limit = None, group_size = None,
+                       timeout = None, compression = None):
     # Build filter expression
     #start_date = "December 2023"
     #end_date = "February 2024"
@@ -40,16 +136,117 @@ def get_search_results(milvus_client, collection_name, query_vector, output_fiel
     #filter_expr = " and ".join(filters) if filters else None
     #filter_expr = '''date == "December 2023" or date == "January 2024" or date == "February 2024"'''
 
+    return search_many(milvus_client, collection_name, [query_vector], output_fields, date_filter, partition_names,
+                       ef, limit, group_size, timeout, compression)
+
+
+def search_many(milvus_client, collection_name, query_vectors, output_fields, date_filter=None, partition_names=None,
+                ef=None, limit=None, group_size=None, timeout=None, compression=None):
+    """
+    Multi-vector get_search_results: one request, one hit list per query vector,
+    all under the same filter. compression defaults to the collection's own level.
+    """
+    limit = limit or SEARCH_LIMIT
+    compression = compression or collection_compression(milvus_client, collection_name)
+    if compression != "none":
+        return rescored_search(milvus_client, collection_name, query_vectors, output_fields, date_filter,
+                               partition_names, ef, limit, group_size or SEARCH_GROUP_SIZE, timeout, compression)
     search_res = milvus_client.search(
         collection_name=collection_name,
-        data=[query_vector],
-        limit=50,
-        search_params={"metric_type": "COSINE", "params": {'M': 16,
-        'efConstruction': 200}},  # Using COSINE metric for embeddings
+        data=list(query_vectors),
+        limit=limit,
+        search_params={"metric_type": "COSINE", "params": {"ef": max(ef or SEARCH_EF, limit)}},  # Using COSINE metric for embeddings
         output_fields=output_fields, # Use valid field names here
         group_by_field='reference',
-        group_size=4,
+        group_size=group_size or SEARCH_GROUP_SIZE,
+        strict_group_size=False,
+        filter=date_filter,
+        partition_names=partition_names,
+        timeout=timeout,
+    )
+    return search_res
+
+
+def rescored_search(milvus_client, collection_name, query_vectors, output_fields, date_filter, partition_names,
+                    ef, limit, group_size, timeout, compression):
+    """
+    search_many on a compressed collection: a grouped search of the compressed
+    field with both limit and group_size scaled by RESCORE_OVERSAMPLE, one get of
+    the candidates' float vectors, then exact cosine against the query, regrouped
+    to the best limit references. The group size is oversampled too because the
+    compressed scores also misorder the chunks within a reference. Hits come back
+    as dicts with the same id/distance/entity keys.
+    """
+    coarse_limit = max(limit, int(limit * RESCORE_OVERSAMPLE))
+    coarse_group_size = max(group_size, int(group_size * RESCORE_OVERSAMPLE))
+    if compression == "int8":
+        search_params = {"metric_type": "COSINE", "params": {"ef": max(ef or SEARCH_EF, coarse_limit)}}
+    else:
+        search_params = {"metric_type": "HAMMING", "params": {"nprobe": SEARCH_NPROBE}}
+    queries = np.asarray(query_vectors, dtype=np.float32)
+    search_res = milvus_client.search(
+        collection_name=collection_name,
+        data=compress_vectors(queries, compression),
+        anns_field=COMPRESSED_FIELDS[compression],
+        limit=coarse_limit,
+        search_params=search_params,
+        output_fields=list(dict.fromkeys([*output_fields, "reference"])),
+        group_by_field='reference',
+        group_size=coarse_group_size,
         strict_group_size=False,
-        filter=date_filter
+        filter=date_filter,
+        partition_names=partition_names,
+        timeout=timeout,
     )
-    return search_res
\ No newline at end of file
+    # Queries of one request often share candidates: each float vector is read once
+    ids = dict.fromkeys(hit["id"] for hits in search_res for hit in hits)
+    vectors = fetch_by_ids(milvus_client, collection_name, ids, ["vector"], timeout)
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    return [rescore_hits(hits, query, vectors, output_fields, limit, group_size)
+            for hits, query in zip(search_res, queries)]
+
+
+def rescore_hits(hits, query, vectors, output_fields, limit, group_size):
+    """
+    Exact cosine of hits against their float vectors (rows by id), grouped (best
+    reference first) like the Milvus search. Hits whose row is gone are dropped.
+    """
+    hits = [hit for hit in hits if hit["id"] in vectors]
+    if not hits:
+        return []
+    matrix = np.asarray([vectors[hit["id"]]["vector"] for hit in hits], dtype=np.float32)
+    scores = matrix @ query / np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+    groups = {}
+    for index in np.argsort(-scores, kind="stable"):
+        entity = hits[index]["entity"]
+        group = groups.get(entity.get("reference"))
+        if group is None:
+            if len(groups) == limit:
+                continue
+            group = groups[entity.get("reference")] = []
+        if len(group) < group_size:
+            group.append({"id": hits[index]["id"], "distance": float(scores[index]),
+                          "entity": {field: entity[field] for field in output_fields if field in entity}})
+    return [hit for group in groups.values() for hit in group]
+
+
+def fetch_by_ids(milvus_client, collection_name, ids, output_fields, timeout=None):
+    """Second phase of two-phase retrieval: one bulk get for the surviving candidates, keyed by id."""
+    if not ids:
+        return {}
+    rows = milvus_client.get(collection_name=collection_name, ids=list(ids), output_fields=output_fields, timeout=timeout)
+    return {row["id"]: row for row in rows}
+
+
+def estimate_payload_bytes(rows) -> int:
+    """
+    Approximate wire size of search hits or get rows: UTF-8 length of strings,
+    8 bytes per number. pymilvus does not expose the response size itself.
+    """
+    total = 0
+    for row in rows:
+        for value in (row.get("entity") or row).values():
+            total += len(value.encode("utf-8")) if isinstance(value, str) else 8
+        if "entity" in row:
+            total += 16  # id and distance of a search hit
+    return total
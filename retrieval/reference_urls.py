@@ -0,0 +1,138 @@
+import os
+import re
+from functools import lru_cache
+
+# Reference title -> landing page URL.
+#
+# Rules are tried in order and the first match wins, exactly like the elif chain
+# this replaces, so order still matters when two rules can match the same title.
+# Each entry is (pattern, url[, flags]); patterns are matched from the start of the
+# reference (re.match). To add a source, add a row here.
+UNKNOWN_URL = "Unknown Url"
+
+REFERENCE_URL_RULES = [
+    (r"Inflation Expectations Survey of Households \w+ \d{4}", "https://website.rbi.org.in/web/rbi/statistics/survey?category=24927098&categoryName=Inflation%20Expectations%20Survey%20of%20House-holds%20-%20Bi-monthly"),
+    (r"Monetary Policy Report \w+ \d{4}", "https://website.rbi.org.in/web/rbi/publications/articles?category=24927873"),
+    (r"Minutes of the Monetary Policy Committee Meeting \w+ \d{4}", "https://website.rbi.org.in/web/rbi/press-releases?q=%22Minutes+of+the+Monetary+Policy+Committee+Meeting%22"),
+    (r"CPI Press Release \w+ \d{4}", "https://www.mospi.gov.in/archive/press-release?field_press_release_category_tid=120"),
+    (r"Economic Survey \d{4} ?- ?\d{4}", "https://www.indiabudget.gov.in/economicsurvey/allpes.php"),
+    (r"IIP Press Release \w+ \d{4}", "https://www.mospi.gov.in/archive/press-release?field_press_release_category_tid=121"),
+    (r"Monthly Economic Report \w+ \d{4}", "https://dea.gov.in/monthly-economic-report-table"),
+    (r"RBI Bulletin \w+ \d{4}", "https://rbi.org.in/Scripts/BS_ViewBulletin.aspx"),
+    (r"RBI State Finances \w+ \d{4}", "https://rbi.org.in/Scripts/AnnualPublications.aspx?head=State%20Finances%20:%20A%20Study%20of%20Budgets"),
+    (r"RBI Handbook of Statistics On Indian States \w+ \d{4}", "https://rbi.org.in/Scripts/AnnualPublications.aspx?head=Handbook+of+Statistics+on+Indian+States"),
+    (r"RBI Publications - Annual \d{4}", "https://rbi.org.in/Scripts/Publications.aspx?publication=Annual"),
+    (r"RBI Publications - Half Yearly \w+ \d{4}", "https://rbi.org.in/Scripts/Publications.aspx?publication=HalfYearly"),
+    (r"RBI Publications - Monthly \w+ \d{4}", "https://rbi.org.in/Scripts/Publications.aspx?publication=Monthly"),
+    (r".*Survey of Professional Forecasters on Macroeconomic Indicators", "https://rbi.org.in/Scripts/Publications.aspx?publication=BiMonthly", re.DOTALL),  # substring match
+    (r"RBI Publications Biennial \w+ \d{4}", "https://rbi.org.in/Scripts/Publications.aspx?publication=Biennial"),
+    (r"Sources of Variation in India’s Foreign Exchange Reserves RBI Publications - Quaterly \w+ \w+ \d{4}", "https://rbi.org.in/Scripts/Publications.aspx?publication=Quarterly"),
+    (r".+ - RBI Notifications \w+ \d{1,2}, \d{4}", "https://rbi.org.in/Scripts/NotificationUser.aspx"),
+    (r"RBI - Occasional Papers - Vol\. \d{2}, No\. ?\d(?:,|:)? ?[A-Za-z]+ \d{1,2}, \d{4}", "https://rbi.org.in/Scripts/HalfYearlyPublications.aspx?head=Occasional+Papers"),
+    (r"RBI WPS \(DEPR\): \d{2}/\d{4}: .+", "https://rbi.org.in/Scripts/PublicationsView.aspx?head=Working%20Papers"),
+    (r"Measuring Productivity at the Industry Level – The India KLEMS Database \w+ \d{1,2}, \d{4}", "https://rbi.org.in/Scripts/KLEMS.aspx"),
+    (r"RBI Publications - Weekly \d{1,2} \w+ \d{4}", "https://rbi.org.in/Scripts/Publications.aspx?publication=Weekly"),
+    (r"RBI Publications - Reports .+ \d{1,2} \w+ \d{4}", "https://rbi.org.in/Scripts/Publications.aspx?publication=Reports"),
+    (r"RBI Speeches - .+", "https://rbi.org.in/Scripts/BS_ViewSpeeches.aspx"),
+    (r"DRG Study No\. \d{1,3}: .+ \w+ \d{1,2}, \d{4}", "https://rbi.org.in/Scripts/Occas_DRG_Studies.aspx"),
+    (r".+ Press Release \w+ \d{1,2}, \d{4}", "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"),
+    (r"Lending and Deposit Rates of Scheduled Commercial Banks – \w+ \d{4}", "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"),
+    (r"Monthly Data on India’s International Trade in Services.+", "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"),
+    (r"Scheduled Banks’ Statement of Position in India as on .+", "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"),
+    (r"Sectoral Deployment of Bank Credit – \w+ \d{4}", "https://rbi.org.in/Scripts/BS_PressReleaseDisplay.aspx"),
+    (r"(THE\s+)?[A-Z][A-Za-z ’()\-]+(Act|Code), \d{4}", "https://rbi.org.in/Scripts/Act.aspx"),
+    (r".+Act, \d{4}", "https://rbi.org.in/Scripts/Act.aspx"),
+    (r".*Scheme, \d{4}$", "https://rbi.org.in/Scripts/Schemes.aspx"),
+    (r".*Regulations, \d{4}$", "https://rbi.org.in/Scripts/Regulations.aspx"),
+    (r".*Rules, \d{4}$", "https://rbi.org.in/Scripts/Rules.aspx"),
+    (r"(Edited\s+)?Transcript of the Reserve Bank of India’s Post-Monetary Policy Press Conference: \w+ \d{1,2}, \d{4}", "https://rbi.org.in/Scripts/BS_SpeechesView.aspx", re.IGNORECASE),
+    (r"Edited transcript of Reserve Bank of India’s Governor Press Conference with Media: \w+ \d{1,2}, \d{4}", "https://rbi.org.in/Scripts/BS_SpeechesView.aspx", re.IGNORECASE),
+    (r"(Fireside chat|Panel Discussion) with Governor.*on \w+ \d{1,2}, \d{4}", "https://rbi.org.in/Scripts/BS_SpeechesView.aspx", re.IGNORECASE),
+    (r"Interview of Governor.*on \w+ \d{1,2}, \d{4}", "https://rbi.org.in/Scripts/BS_SpeechesView.aspx", re.IGNORECASE),
+    (r"Master Direction(s)?( –| -)? .+", "https://rbi.org.in/Scripts/BS_ViewMasterDirections.aspx", re.IGNORECASE),
+    (r".*(Draft|draft|DRAFT).*(Circular|Direction|Guideline|Framework|Regulation|Instruction).* \w+ \d{1,2}, \d{4}", "https://rbi.org.in/Scripts/DraftNotificationsGuildelines.aspx"),
+    (r"Master Circular(s)?( –|-)? (on )?.+ \w+ \d{1,2}, \d{4}", "https://rbi.org.in/Scripts/BS_ViewMasterCirculardetails.aspx", re.IGNORECASE),
+    (r".+ -? ?PIB \d{1,2} \w+ \d{4}", "https://pib.gov.in/PressReleseDetail.aspx?PRID=2089308&reg=3&lang=1", re.IGNORECASE),
+    (r"MSME ANNUAL REPORT( \d{4}-\d{2})?$", "https://www.msme.gov.in/relatedlinks/annual-report-ministry-micro-small-and-medium-enterprises", re.IGNORECASE),
+    (r"Ministry Wise Procurement \d{4}-\d{2}", "https://sambandh.msme.gov.in/MinistryWisesReport.aspx"),
+    (r"RBI Report On Trend And Progress Of Banking In India \d{4}-\d{2}", "https://www.rbi.org.in/Scripts/AnnualPublications.aspx?head=Trend+and+Progress+of+Banking+in+India"),
+    (r"\d+-Year GST Statistical Report", "https://tutorial.gst.gov.in/offlineutilities/gst_statistics/6YearReport.pdf", re.IGNORECASE),
+    (r"India Budget \d{4}-\d{4}", "https://www.indiabudget.gov.in/doc/Budget_Speech.pdf", re.IGNORECASE),
+    (r"Udyog Aadhar Registeration \d{4}-\d{4}", "https://www.dcmsme.gov.in/uampublication.aspx", re.IGNORECASE),
+    (r"Udyog Aadhar Registeration \w+ \d{4}", "https://www.dcmsme.gov.in/uampublication.aspx", re.IGNORECASE),
+    (r"MALAYSIA DEVELOPMENT EXPERIENCE SME \w+ \d{4}", "https://documents1.worldbank.org/curated/en/504361583989615623/pdf/Malaysia-s-Experience-with-the-Small-and-Medium-Sized-Enterprises-Masterplan-Lessons-Learned.pdf", re.IGNORECASE),
+    (r"Malaysian SME Program Efficiency Review \w+ \d{4}", "https://documents1.worldbank.org/curated/en/099255003152238688/pdf/P17014606709a70f50856d0799328fb7040.pdf", re.IGNORECASE),
+]
+
+
+def _leading_literal(pattern: str) -> str:
+    """Literal text every match of pattern must start with (may be empty)."""
+    literal = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            if i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                literal.append(pattern[i + 1])
+                i += 2
+                continue
+            break
+        if char in ".^$*+?{}[]()|":
+            break
+        literal.append(char)
+        i += 1
+    # A trailing quantifier makes the last literal character optional
+    if literal and i < len(pattern) and pattern[i] in "?*{":
+        literal.pop()
+    return "".join(literal)
+
+
+def _compile_rules(rules):
+    """
+    Precompiles the rule table and builds the dispatch index.
+
+    Rules whose pattern starts with a literal word are indexed by that word, so a
+    reference only tries the rules that could possibly match its first word plus
+    the rules that start with a wildcard. Wildcard rules like '.+ Press Release ...'
+    also get a substring that must be present before the regex is run.
+    """
+    compiled = []
+    by_word, by_word_nocase, wildcard = {}, {}, []
+    for index, rule in enumerate(rules):
+        pattern, url = rule[0], rule[1]
+        flags = rule[2] if len(rule) > 2 else 0
+        regex = re.compile(pattern, flags)
+
+        prefix = _leading_literal(pattern)
+        required = None
+        if " " in prefix:
+            word = prefix.split(" ", 1)[0]
+            if flags & re.IGNORECASE:
+                by_word_nocase.setdefault(word.casefold(), []).append(index)
+            else:
+                by_word.setdefault(word, []).append(index)
+        else:
+            wildcard.append(index)
+            if re.match(r"\.[+*]", pattern) and not flags & re.IGNORECASE:
+                required = _leading_literal(pattern[2:]) or None
+        compiled.append((regex, url, required))
+    return compiled, by_word, by_word_nocase, wildcard
+
+
+COMPILED_RULES, RULES_BY_WORD, RULES_BY_WORD_NOCASE, WILDCARD_RULES = _compile_rules(REFERENCE_URL_RULES)
+
+
+@lru_cache(maxsize=1024)
+def _candidate_rules(word: str):
+    return tuple(sorted(RULES_BY_WORD.get(word, []) + RULES_BY_WORD_NOCASE.get(word.casefold(), []) + WILDCARD_RULES))
+
+
+@lru_cache(maxsize=int(os.getenv("REFERENCE_URL_CACHE_SIZE", 4096)))
+def get_reference_url(ref: str) -> str:
+    for index in _candidate_rules(ref.split(" ", 1)[0]):
+        regex, url, required = COMPILED_RULES[index]
+        if required is not None and required not in ref:
+            continue
+        if regex.match(ref):
+            return url
+    return UNKNOWN_URL  # Default if no match
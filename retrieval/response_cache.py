@@ -0,0 +1,157 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ResponseCache:
+    """
+    Cache of /search-topN responses in front of the whole pipeline.
+
+    Exact tier: keyed on the normalized question plus the current month, since
+    clarify_query resolves relative dates against it.
+    Near-duplicate tier: reuses a cached response from the same month when the
+    question embedding is within similarity_threshold (cosine) of a cached one
+    and both questions resolve to the same date window. Questions that only
+    differ in their date ("CPI May 2024" / "CPI May 2023") embed almost
+    identically, so entries whose window is unknown (date_window None) are
+    never served as near hits.
+
+    Entries expire after ttl_seconds, the least recently used ones are evicted
+    past max_entries, and invalidate_months drops every entry whose date window
+    overlaps months the loader has just (re)ingested.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 6 * 3600, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (question, month) -> entry dict
+        self.matrix = None            # stacked embeddings of self.entries, rebuilt lazily
+        self.matrix_keys = []
+
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        question = re.sub(r"\s+", " ", question.strip().lower())
+        return question.rstrip(" ?.!")
+
+    @property
+    def near_enabled(self) -> bool:
+        return 0 < self.similarity_threshold <= 1
+
+    def _expire(self, now: float):
+        # Caller holds self.lock
+        expired = [key for key, entry in self.entries.items() if entry["expires_at"] <= now]
+        for key in expired:
+            del self.entries[key]
+        if expired:
+            self.expirations += len(expired)
+            self.matrix = None
+
+    def get_exact(self, question: str, month: str, near: bool = True):
+        """Exact tier lookup; near=False counts a miss right away since get_similar won't be tried."""
+        key = (self.normalize(question), month)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["expires_at"] > time.time():
+                self.entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry["response"]
+            if not (near and self.near_enabled):
+                self.misses += 1
+        return None
+
+    def get_similar(self, embedding, month: str, date_window):
+        """Best cached response for the month and date window within the similarity threshold, or None."""
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self.lock:
+            self._expire(time.time())
+            if self.matrix is None:
+                self.matrix_keys = [key for key, entry in self.entries.items() if entry["embedding"] is not None]
+                if self.matrix_keys:
+                    self.matrix = np.stack([self.entries[key]["embedding"] for key in self.matrix_keys])
+            if self.matrix is not None:
+                similarities = self.matrix @ query
+                for index in np.argsort(-similarities):
+                    if similarities[index] < self.similarity_threshold:
+                        break
+                    key = self.matrix_keys[index]
+                    if key[1] == month and date_window is not None and self.entries[key]["date_window"] == date_window:
+                        self.entries.move_to_end(key)
+                        self.near_hits += 1
+                        return self.entries[key]["response"]
+            self.misses += 1
+        return None
+
+    def put(self, question: str, month: str, embedding, response: dict, window_start: int, window_end: int,
+            date_window=None):
+        key = (self.normalize(question), month)
+        if embedding is not None:
+            # Entries without an embedding can only be served by the exact tier
+            embedding = np.asarray(embedding, dtype=np.float32)
+            embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        with self.lock:
+            self.entries[key] = {
+                "response": response,
+                "embedding": embedding,
+                "window": (window_start, window_end),
+                "date_window": date_window,
+                "expires_at": time.time() + self.ttl_seconds,
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.matrix = None
+
+    def invalidate_months(self, ordinals) -> int:
+        """Drops entries whose date window contains any of the given month ordinals."""
+        ordinals = sorted(set(ordinals))
+        with self.lock:
+            stale = [
+                key for key, entry in self.entries.items()
+                if any(entry["window"][0] <= o <= entry["window"][1] for o in ordinals)
+            ]
+            for key in stale:
+                del self.entries[key]
+            if stale:
+                self.invalidations += len(stale)
+                self.matrix = None
+        return len(stale)
+
+    def clear(self) -> int:
+        with self.lock:
+            removed = len(self.entries)
+            self.entries.clear()
+            self.matrix = None
+            self.invalidations += removed
+        return removed
+
+    def stats(self) -> dict:
+        with self.lock:
+            hits = self.exact_hits + self.near_hits
+            lookups = hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "similarity_threshold": self.similarity_threshold,
+            }
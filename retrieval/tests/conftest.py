@@ -0,0 +1,34 @@
+import importlib
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+# The service modules import each other as top-level modules (the Dockerfile runs from retrieval/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Module-level caches stay in memory instead of creating cache/*.sqlite3 under the working directory
+os.environ.setdefault("LLM_CACHE_PATH", "")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+
+API_KEY = "test-key"
+
+
+@pytest.fixture(scope="session")
+def service(tmp_path_factory):
+    """
+    The service module, imported without a Milvus server or model downloads (tests
+    fake the stages they drive). Skipped when the service's dependencies are missing.
+    """
+    for module in ("pymilvus", "sentence_transformers", "google.genai", "dateutil"):
+        pytest.importorskip(module)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("service"))  # log file and caches
+        for name, value in {"ACQ_API_KEY": API_KEY, "GEMINI_STUB": "true", "CPI_V5_COLLECTION_NAME": "test",
+                            "MILVUS_ENDPOINT": "http://localhost:19530"}.items():
+            patch.setenv(name, value)
+        patch.setattr("pymilvus.MilvusClient", mock.MagicMock())
+        patch.setattr("sentence_transformers.SentenceTransformer", mock.MagicMock())
+        patch.setattr("sentence_transformers.CrossEncoder", mock.MagicMock())
+        yield importlib.import_module("cpi_top5_results_v5_vm_experimental_citeurl")
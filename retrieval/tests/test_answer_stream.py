@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import API_KEY
+
+QUESTION = "What was CPI inflation in March 2024?"
+RESPONSE = {
+    "question": QUESTION,
+    "retrieved_results": [{"content": "CPI inflation was 4.9%", "reference": "CPI Press Release April 2024",
+                           "date": "March 2024", "url": "Unknown Url"}],
+}
+
+
+@pytest.fixture
+def fake_retrieval(service, monkeypatch):
+    async def search_question(question, client_ip, deadline=None):
+        return RESPONSE
+
+    monkeypatch.setattr(service, "search_question", search_question)
+
+
+def fake_synthesis(service, monkeypatch, tokens, error=None):
+    def stream_synthesis(question, results, stop=None):
+        yield from tokens
+        if error is not None:
+            raise error
+
+    monkeypatch.setattr(service, "stream_synthesis", stream_synthesis)
+
+
+def read_events(service):
+    client = TestClient(service.app)
+    response = client.post("/answer", json={"question": QUESTION}, headers={"access_token": API_KEY})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def test_results_then_tokens_then_done(service, fake_retrieval, monkeypatch):
+    fake_synthesis(service, monkeypatch, ["CPI inflation ", "was 4.9%."])
+    events = read_events(service)
+
+    assert [event for event, _ in events] == ["results", "token", "token", "done"]
+    assert events[0][1]["retrieved_results"] == RESPONSE["retrieved_results"]
+    assert [data["text"] for event, data in events if event == "token"] == ["CPI inflation ", "was 4.9%."]
+    assert events[-1][1]["answer"] == "CPI inflation was 4.9%."
+
+
+def test_error_event_when_synthesis_fails(service, fake_retrieval, monkeypatch):
+    fake_synthesis(service, monkeypatch, ["CPI inflation "], error=RuntimeError("quota exceeded"))
+    events = read_events(service)
+
+    assert [event for event, _ in events] == ["results", "token", "error"]
+    assert "quota exceeded" in events[-1][1]["detail"]
+
+
+def test_client_disconnect_stops_synthesis(service, fake_retrieval, monkeypatch):
+    seen = {"stopped": threading.Event()}
+
+    def stream_synthesis(question, results, stop=None):
+        seen["stop"] = stop
+        for _ in range(500):
+            if stop.is_set():
+                seen["stopped"].set()
+                return
+            yield "token "
+            time.sleep(0.01)
+
+    monkeypatch.setattr(service, "stream_synthesis", stream_synthesis)
+
+    async def request():
+        body = json.dumps({"question": QUESTION}).encode()
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        first_token = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await first_token.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and b"event: token" in message.get("body", b""):
+                first_token.set()
+
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+                 "scheme": "http", "path": "/answer", "raw_path": b"/answer", "root_path": "", "query_string": b"",
+                 "headers": [(b"content-type", b"application/json"), (b"access_token", API_KEY.encode())],
+                 "client": ("127.0.0.1", 50000), "server": ("testserver", 80)}
+        await asyncio.wait_for(service.app(scope, receive, send), timeout=5)
+
+    asyncio.run(request())
+    assert seen["stop"].is_set()
+    assert seen["stopped"].wait(timeout=2)
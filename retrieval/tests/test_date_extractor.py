@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+
+from date_extractor import extract_date_range
+
+TODAY = datetime(2025, 6, 15)
+
+
+# Few-shot examples from the fetch_date prompt, plus the common phrasings the
+# extractor is expected to handle
+@pytest.mark.parametrize("query, expected", [
+    ("CPI report for December 2024", ("December 2024", "December 2024")),
+    ("What was the inflation rate in June 2023?", ("June 2023", "June 2023")),
+    ("Give me the latest IIP data", ("today", "today")),
+    ("Tell me the GDP growth over the last five years", ("June 2020", "today")),
+    ("What happened in Q3 2022?", ("October 2022", "December 2022")),
+    ("What was the inflation rate H1 FY25?", ("April 2024", "September 2024")),
+    ("IIP growth in the last six months", ("December 2024", "today")),
+    ("GDP growth since June 2023", ("June 2023", "today")),
+    ("CPI inflation from Feb 2025 to April 2025", ("February 2025", "April 2025")),
+    ("Fiscal deficit in FY 2023-24", ("April 2023", "March 2024")),
+    ("Economic Survey 2022-23 on employment", ("April 2022", "March 2023")),
+    ("Bank credit growth in Q1 FY26", ("April 2025", "June 2025")),
+    ("What did RBI say about inflation in the last quarter?", ("January 2025", "March 2025")),
+    ("Tell me about the long term trend in exports", None),
+])
+def test_resolves_corpus(query, expected):
+    assert extract_date_range(query, today=TODAY) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("CPI inflation in 2023", ("January 2023", "December 2023")),
+    ("Retail inflation during calendar year 2024", ("January 2024", "December 2024")),
+    ("GDP growth since 2019", ("January 2019", "today")),
+    ("Exports between 2019 and 2021", ("January 2019", "December 2021")),
+])
+def test_resolves_years_with_a_date_cue(query, expected):
+    assert extract_date_range(query, today=TODAY) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "top 2000 companies by CPI weight",
+    "List the 1999 items in the CPI basket",
+    "Inflation for households earning 2000 rupees a month",
+    "Index value 2010 base revision",
+])
+def test_bare_numbers_go_to_the_llm(query):
+    assert extract_date_range(query, today=TODAY) is None
@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import gemini_client
+from gemini_client import LLMCallCache, StubGeminiClient, memoized_llm_call
+
+QUERY = "CPI in May 2025"
+
+
+def clarify(cache, stub, version=1):
+    return cache.call("clarify_query", version, ["2025-06", QUERY],
+                      lambda: stub.models.generate_content("stub", contents=QUERY).text)
+
+
+def test_concurrent_identical_calls_reach_the_api_once():
+    stub = StubGeminiClient(delay=0.2)
+    cache = LLMCallCache()
+    start = threading.Barrier(20)
+
+    def call(_):
+        start.wait()
+        return clarify(cache, stub)
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(call, range(20)))
+
+    assert results == [QUERY] * 20
+    assert stub.models.calls == 1
+    stats = cache.stats()["clarify_query"]
+    assert stats["misses"] == 1
+    assert stats["coalesced"] + stats["hits"] == 19
+
+
+def test_result_survives_a_new_cache_instance(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite3")
+    stub = StubGeminiClient(delay=0)
+    assert clarify(LLMCallCache(path=path), stub) == QUERY
+
+    reopened = LLMCallCache(path=path)
+    assert clarify(reopened, stub) == QUERY
+    assert stub.models.calls == 1
+    assert reopened.stats()["clarify_query"]["hits"] == 1
+
+
+def test_version_bump_misses(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite3")
+    stub = StubGeminiClient(delay=0)
+    clarify(LLMCallCache(path=path), stub, version=1)
+
+    reopened = LLMCallCache(path=path)
+    clarify(reopened, stub, version=2)
+    assert stub.models.calls == 2
+    assert reopened.stats()["clarify_query"]["misses"] == 1
+
+
+def test_memoized_llm_call_keys_on_the_version(monkeypatch):
+    monkeypatch.setattr(gemini_client, "llm_cache", LLMCallCache())
+    stub = StubGeminiClient(delay=0)
+
+    def ask(query):
+        return stub.models.generate_content("stub", contents=query).text
+
+    v1 = memoized_llm_call("ask", version=1)(ask)
+    v2 = memoized_llm_call("ask", version=2)(ask)
+    assert v1(QUERY) == v1(QUERY) == QUERY
+    assert stub.models.calls == 1
+    assert v2(QUERY) == QUERY
+    assert stub.models.calls == 2
+
+
+def test_empty_responses_are_not_cached():
+    cache = LLMCallCache()
+    calls = []
+
+    def blocked():
+        calls.append(1)
+        return ""
+
+    cache.call("clarify_query", 1, [QUERY], blocked)
+    cache.call("clarify_query", 1, [QUERY], blocked)
+    assert len(calls) == 2
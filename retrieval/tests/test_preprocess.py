@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+from deadline import Deadline
+
+QUESTION = "CPI inflation in March 2024"
+
+
+def test_timeouts_fall_back_without_a_degradations_list(service, monkeypatch):
+    def slow_clarify(query):
+        time.sleep(0.5)
+        return "clarified"
+
+    monkeypatch.setattr(service, "clarify_query", slow_clarify)
+    llm_query, query_date, window_size = asyncio.run(service.preprocess_query(QUESTION, Deadline(0.1)))
+    assert llm_query == QUESTION
+    assert query_date == "March 2024"
+
+
+def test_timeouts_are_recorded(service, monkeypatch):
+    def slow(query):
+        time.sleep(0.5)
+        return "today"
+
+    monkeypatch.setattr(service, "clarify_query", slow)
+    monkeypatch.setattr(service, "fetch_date", slow)
+    monkeypatch.setattr(service, "fetch_min_date", slow)
+    degradations = []
+    _, query_date, window_size = asyncio.run(
+        service.preprocess_query("Tell me about the trend in exports", Deadline(0.1), degradations))
+    assert degradations == ["raw_query", "default_dates"]
+    assert (query_date, window_size) == ("today", 24)
@@ -0,0 +1,83 @@
+import re
+
+import pytest
+
+from check_reference_urls import legacy_get_reference_url
+from reference_urls import REFERENCE_URL_RULES, UNKNOWN_URL, get_reference_url
+
+# One reference per rule of REFERENCE_URL_RULES, in the same order
+RULE_REFERENCES = [
+    "Inflation Expectations Survey of Households March 2024",
+    "Monetary Policy Report April 2024",
+    "Minutes of the Monetary Policy Committee Meeting June 2024",
+    "CPI Press Release May 2024",
+    "Economic Survey 2023 - 2024",
+    "IIP Press Release May 2024",
+    "Monthly Economic Report May 2024",
+    "RBI Bulletin June 2024",
+    "RBI State Finances December 2023",
+    "RBI Handbook of Statistics On Indian States November 2023",
+    "RBI Publications - Annual 2024",
+    "RBI Publications - Half Yearly June 2024",
+    "RBI Publications - Monthly May 2024",
+    "Results of the Survey of Professional Forecasters on Macroeconomic Indicators",
+    "RBI Publications Biennial March 2024",
+    "Sources of Variation in India’s Foreign Exchange Reserves RBI Publications - Quaterly April June 2024",
+    "Priority Sector Lending - RBI Notifications June 12, 2024",
+    "RBI - Occasional Papers - Vol. 44, No. 1: June 20, 2024",
+    "RBI WPS (DEPR): 05/2024: Monetary Transmission in India",
+    "Measuring Productivity at the Industry Level – The India KLEMS Database July 1, 2024",
+    "RBI Publications - Weekly 14 June 2024",
+    "RBI Publications - Reports Financial Stability Report 27 June 2024",
+    "RBI Speeches - Governor's address at the annual conference",
+    "DRG Study No. 51: Inflation Dynamics in India March 15, 2024",
+    "Money Supply Press Release June 12, 2024",
+    "Lending and Deposit Rates of Scheduled Commercial Banks – May 2024",
+    "Monthly Data on India’s International Trade in Services for May 2024",
+    "Scheduled Banks’ Statement of Position in India as on June 14, 2024",
+    "Sectoral Deployment of Bank Credit – April 2024",
+    "THE BANKING REGULATION Act, 1949",
+    "the reserve bank of india Act, 1934",
+    "Payment Schemes Scheme, 2024",
+    "Foreign Exchange Management Regulations, 2024",
+    "Government Securities Rules, 2024",
+    "Transcript of the Reserve Bank of India’s Post-Monetary Policy Press Conference: June 7, 2024",
+    "Edited transcript of Reserve Bank of India’s Governor Press Conference with Media: April 5, 2024",
+    "Fireside chat with Governor at the Global Fintech Fest on August 30, 2024",
+    "Interview of Governor with a business daily on June 10, 2024",
+    "Master Direction – Know Your Customer (KYC) Direction, 2016",
+    "Draft Circular on Digital Lending Guidelines June 21, 2024",
+    "Master Circular – Basel III Capital Regulations April 1, 2024",
+    "Cabinet approves new scheme - PIB 12 June 2024",
+    "MSME ANNUAL REPORT 2023-24",
+    "Ministry Wise Procurement 2023-24",
+    "RBI Report On Trend And Progress Of Banking In India 2023-24",
+    "6-Year GST Statistical Report",
+    "India Budget 2024-2025",
+    "Udyog Aadhar Registeration 2019-2020",
+    "Udyog Aadhar Registeration March 2020",
+    "MALAYSIA DEVELOPMENT EXPERIENCE SME March 2020",
+    "Malaysian SME Program Efficiency Review June 2022",
+]
+
+UNMATCHED_REFERENCES = [
+    "Annual Report of an unrelated agency",
+    "CPI Press Release",
+    "",
+]
+
+
+def test_every_rule_has_a_reference():
+    assert len(RULE_REFERENCES) == len(REFERENCE_URL_RULES)
+
+
+@pytest.mark.parametrize("rule, ref", list(zip(REFERENCE_URL_RULES, RULE_REFERENCES)))
+def test_rule_matches_like_the_legacy_chain(rule, ref):
+    pattern, flags = rule[0], rule[2] if len(rule) > 2 else 0
+    assert re.match(pattern, ref, flags)
+    assert get_reference_url(ref) == legacy_get_reference_url(ref) != UNKNOWN_URL
+
+
+@pytest.mark.parametrize("ref", UNMATCHED_REFERENCES)
+def test_unmatched_reference_falls_through(ref):
+    assert get_reference_url(ref) == legacy_get_reference_url(ref) == UNKNOWN_URL
@@ -0,0 +1,26 @@
+import numpy as np
+
+from response_cache import ResponseCache
+
+MONTH = "2025-06"
+MAY_2024 = ("May 2024", "May 2024")
+
+
+def cache_with_entry(date_window):
+    cache = ResponseCache(similarity_threshold=0.95)
+    cache.put("CPI inflation May 2024", MONTH, np.ones(8), {"answer": "may-2024"}, 0, 1, date_window)
+    return cache
+
+
+def test_near_hit_needs_the_same_date_window():
+    cache = cache_with_entry(MAY_2024)
+    close = np.ones(8) + 0.01
+    assert cache.get_similar(close, MONTH, MAY_2024) == {"answer": "may-2024"}
+    assert cache.get_similar(close, MONTH, ("May 2023", "May 2023")) is None
+    assert cache.get_similar(close, MONTH, None) is None
+
+
+def test_entries_without_a_date_window_are_exact_only():
+    cache = cache_with_entry(None)
+    assert cache.get_similar(np.ones(8), MONTH, None) is None
+    assert cache.get_exact("cpi inflation may 2024?", MONTH) == {"answer": "may-2024"}